@@ -0,0 +1,277 @@
+import argparse
+import gzip
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+from datetime import datetime
+from typing import Dict, Optional
+
+try:
+    import zstandard
+except ImportError:  # optional dependency, gzip is used without it
+    zstandard = None
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+DEFAULT_STORE_PATH = 'store'
+
+# Artifact kinds and the loose-file suffixes process_first_url has always used
+ARTIFACT_SUFFIXES = {
+    'screenshot': '.png',
+    'full_page': '_full.png',
+    'metadata': '_metadata.json',
+    'raw_html': '_raw.html',
+}
+# PNGs are already compressed, so they are stored as-is
+UNCOMPRESSED_KINDS = {'screenshot', 'full_page'}
+
+CODEC_EXTENSIONS = {'zstd': '.zst', 'gzip': '.gz', 'none': ''}
+
+def default_codec() -> str:
+    return 'zstd' if zstandard is not None else 'gzip'
+
+def compress(data: bytes, codec: str) -> bytes:
+    if codec == 'zstd':
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    if codec == 'gzip':
+        return gzip.compress(data, compresslevel=6)
+    return data
+
+def decompress(data: bytes, codec: str) -> bytes:
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd-compressed artifacts")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == 'gzip':
+        return gzip.decompress(data)
+    return data
+
+class ArtifactStore:
+    """Content-addressed, compressed artifact storage with a SQLite index.
+
+    Blobs are keyed by the SHA-256 of their uncompressed bytes and sharded as
+    objects/ab/cd/<hash><ext>, so identical HTML or screenshots are stored
+    once. The index maps (site, timestamp, kind) to a blob hash.
+    """
+
+    def __init__(self, root: str = DEFAULT_STORE_PATH, codec: Optional[str] = None):
+        self.root = root
+        self.codec = codec or default_codec()
+        os.makedirs(os.path.join(root, 'objects'), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(root, 'index.db'), check_same_thread=False)
+        self._conn.executescript('''
+            CREATE TABLE IF NOT EXISTS blobs (
+                hash TEXT PRIMARY KEY,
+                codec TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                stored_size INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS artifacts (
+                site TEXT NOT NULL,
+                timestamp TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                hash TEXT NOT NULL REFERENCES blobs (hash),
+                created_at TEXT NOT NULL,
+                PRIMARY KEY (site, timestamp, kind)
+            );
+            CREATE INDEX IF NOT EXISTS idx_artifacts_hash ON artifacts (hash);
+            CREATE TABLE IF NOT EXISTS aliases (
+                site TEXT NOT NULL,
+                timestamp TEXT NOT NULL,
+                source_timestamp TEXT NOT NULL,
+                PRIMARY KEY (site, timestamp)
+            );
+            CREATE TABLE IF NOT EXISTS artifact_links (
+                site TEXT NOT NULL,
+                timestamp TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                source_timestamp TEXT NOT NULL,
+                PRIMARY KEY (site, timestamp, kind)
+            );
+        ''')
+        self._conn.commit()
+
+    def _blob_path(self, blob_hash: str, codec: str) -> str:
+        return os.path.join(self.root, 'objects', blob_hash[:2], blob_hash[2:4],
+                            blob_hash + CODEC_EXTENSIONS[codec])
+
+    def put_blob(self, data: bytes, codec: Optional[str] = None) -> str:
+        """Store bytes if not already present and return their hash."""
+        blob_hash = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            if self._conn.execute('SELECT 1 FROM blobs WHERE hash = ?', (blob_hash,)).fetchone():
+                return blob_hash
+
+        codec = codec or self.codec
+        stored = compress(data, codec)
+        path = self._blob_path(blob_hash, codec)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temp file first so a crash never leaves a partial blob
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, 'wb') as f:
+            f.write(stored)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._conn.execute('INSERT OR IGNORE INTO blobs (hash, codec, size, stored_size) VALUES (?, ?, ?, ?)',
+                               (blob_hash, codec, len(data), len(stored)))
+            self._conn.commit()
+        return blob_hash
+
+    def get_blob(self, blob_hash: str) -> bytes:
+        with self._lock:
+            row = self._conn.execute('SELECT codec FROM blobs WHERE hash = ?', (blob_hash,)).fetchone()
+        if row is None:
+            raise KeyError(blob_hash)
+        with open(self._blob_path(blob_hash, row[0]), 'rb') as f:
+            return decompress(f.read(), row[0])
+
+    def put_artifact(self, site: str, timestamp: str, kind: str, data: bytes,
+                     codec: Optional[str] = None) -> str:
+        """Store one artifact of a capture and index it. Returns the blob hash."""
+        if codec is None and kind in UNCOMPRESSED_KINDS:
+            codec = 'none'
+        blob_hash = self.put_blob(data, codec)
+        self._index(site, timestamp, kind, blob_hash)
+        return blob_hash
+
+    def put_file(self, site: str, timestamp: str, kind: str, path: str, remove: bool = False,
+                 codec: Optional[str] = None) -> str:
+        """Store an artifact from a file, optionally deleting the loose file afterwards."""
+        with open(path, 'rb') as f:
+            blob_hash = self.put_artifact(site, timestamp, kind, f.read(), codec)
+        if remove:
+            os.remove(path)
+        return blob_hash
+
+    def _index(self, site: str, timestamp: str, kind: str, blob_hash: str):
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO artifacts (site, timestamp, kind, hash, created_at) VALUES (?, ?, ?, ?, ?)',
+                (site, timestamp, kind, blob_hash, datetime.now().isoformat()))
+            self._conn.commit()
+
+    def link(self, site: str, timestamp: str, source_timestamp: str):
+        """Record an unchanged capture as an alias of an earlier one.
+
+        The alias is resolved on lookup, so it can be recorded before the
+        earlier capture's artifacts have been stored.
+        """
+        with self._lock:
+            self._conn.execute('INSERT OR REPLACE INTO aliases (site, timestamp, source_timestamp) VALUES (?, ?, ?)',
+                               (site, timestamp, source_timestamp))
+            self._conn.commit()
+
+    def link_artifact(self, site: str, timestamp: str, kind: str, source_timestamp: str):
+        """Record that one artifact of a capture is the same as an earlier
+        capture's (e.g. a screenshot that looks the same). Resolved on lookup
+        like link()."""
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO artifact_links (site, timestamp, kind, source_timestamp) VALUES (?, ?, ?, ?)',
+                (site, timestamp, kind, source_timestamp))
+            self._conn.commit()
+
+    def resolve(self, site: str, timestamp: str) -> str:
+        """Return the timestamp whose artifacts a capture uses."""
+        with self._lock:
+            row = self._conn.execute('SELECT source_timestamp FROM aliases WHERE site = ? AND timestamp = ?',
+                                     (site, timestamp)).fetchone()
+        return row[0] if row else timestamp
+
+    def artifacts(self, site: str, timestamp: str) -> Dict[str, str]:
+        """Return {kind: blob hash} for one capture."""
+        timestamp = self.resolve(site, timestamp)
+        with self._lock:
+            rows = self._conn.execute('SELECT kind, hash FROM artifacts WHERE site = ? AND timestamp = ?',
+                                      (site, timestamp)).fetchall()
+            links = self._conn.execute('SELECT kind, source_timestamp FROM artifact_links WHERE site = ? AND timestamp = ?',
+                                       (site, timestamp)).fetchall()
+        artifacts = dict(rows)
+        for kind, source_timestamp in links:
+            if kind not in artifacts:
+                blob_hash = self.artifacts(site, source_timestamp).get(kind)
+                if blob_hash:
+                    artifacts[kind] = blob_hash
+        return artifacts
+
+    def get_artifact(self, site: str, timestamp: str, kind: str) -> Optional[bytes]:
+        """Return an artifact's bytes, or None if the capture has no such artifact."""
+        blob_hash = self.artifacts(site, timestamp).get(kind)
+        return self.get_blob(blob_hash) if blob_hash else None
+
+    def latest_timestamp(self, site: str, kind: Optional[str] = None) -> Optional[str]:
+        """Return the most recent capture timestamp stored for a site."""
+        query = 'SELECT MAX(timestamp) FROM artifacts WHERE site = ?'
+        params = [site]
+        if kind:
+            query += ' AND kind = ?'
+            params.append(kind)
+        with self._lock:
+            return self._conn.execute(query, params).fetchone()[0]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            blobs, size, stored = self._conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(stored_size), 0) FROM blobs').fetchone()
+            artifacts = self._conn.execute('SELECT COUNT(*) FROM artifacts').fetchone()[0]
+        return {'artifacts': artifacts, 'blobs': blobs, 'bytes': size, 'stored_bytes': stored}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+LOOSE_FILE = re.compile(r'^(?P<site>[^_]+)_(?P<timestamp>\d{14})(?P<suffix>\.png|_full\.png|_metadata\.json|_raw\.html)$')
+
+def import_directory(store: ArtifactStore, directory: str, remove: bool = False) -> int:
+    """Move loose screenshots/ files into the store. Returns the number imported."""
+    kinds_by_suffix = {suffix: kind for kind, suffix in ARTIFACT_SUFFIXES.items()}
+    imported = 0
+    for name in sorted(os.listdir(directory)):
+        match = LOOSE_FILE.match(name)
+        if not match:
+            continue
+        kind = kinds_by_suffix[match.group('suffix')]
+        store.put_file(match.group('site'), match.group('timestamp'), kind,
+                       os.path.join(directory, name), remove=remove)
+        imported += 1
+    return imported
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage the compressed artifact store')
+    parser.add_argument('--store', default=DEFAULT_STORE_PATH, help='Store directory')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    import_parser = subparsers.add_parser('import', help='Import loose files from a screenshots directory')
+    import_parser.add_argument('directory', nargs='?', default='screenshots')
+    import_parser.add_argument('--remove', action='store_true', help='Delete loose files once stored')
+    export_parser = subparsers.add_parser('export', help='Write one artifact to a file')
+    export_parser.add_argument('site')
+    export_parser.add_argument('timestamp')
+    export_parser.add_argument('kind', help="Artifact kind, e.g. 'screenshot', 'metadata' or 'w640.webp'")
+    export_parser.add_argument('output')
+    subparsers.add_parser('stats', help='Show artifact and storage totals')
+    args = parser.parse_args()
+
+    store = ArtifactStore(args.store)
+    if args.command == 'import':
+        count = import_directory(store, args.directory, args.remove)
+        logging.info(f"Imported {count} files from {args.directory}")
+    elif args.command == 'export':
+        data = store.get_artifact(args.site, args.timestamp, args.kind)
+        if data is None:
+            kinds = ', '.join(sorted(store.artifacts(args.site, args.timestamp))) or 'none'
+            raise SystemExit(f"No {args.kind} stored for {args.site} {args.timestamp} (stored: {kinds})")
+        with open(args.output, 'wb') as f:
+            f.write(data)
+    stats = store.stats()
+    logging.info(f"{stats['artifacts']} artifacts in {stats['blobs']} blobs, "
+                 f"{stats['bytes'] / 1_000_000:.1f} MB stored as {stats['stored_bytes'] / 1_000_000:.1f} MB")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+import argparse
+import json
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from cdx_fetcher import CDXFetcher
+from instrumentation import METRICS, enable_event_log
+from wayback_scraper import (
+    NEWS_SITES,
+    build_cdx_params,
+    create_fetcher,
+    generate_timestamps,
+    plan_date_ranges,
+    resolve_snapshots,
+    save_results,
+)
+
+def load_checkpoint(path: str) -> Dict[Tuple[str, str], Dict]:
+    """Load completed (site, timestamp) records from an append-only JSONL checkpoint."""
+    completed = {}
+    if not os.path.exists(path):
+        return completed
+
+    with open(path, 'r') as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A crash mid-write can leave a truncated final line
+                logging.warning(f"Skipping malformed checkpoint line {line_number} in {path}")
+                continue
+            completed[(record['site'], record['target'])] = record
+    return completed
+
+def append_records(f, records: List[Dict]):
+    """Append records to the checkpoint and flush them to disk."""
+    for record in records:
+        f.write(json.dumps(record) + '\n')
+    f.flush()
+    os.fsync(f.fileno())
+
+def run_backfill(timestamps: List[str], checkpoint_path: str, sites: List[str] = NEWS_SITES,
+                 fetcher: Optional[CDXFetcher] = None) -> Dict[Tuple[str, str], Dict]:
+    """Resolve snapshots for every site and timestamp, streaming results to the
+    checkpoint and skipping anything a previous run already completed."""
+    completed = load_checkpoint(checkpoint_path)
+    fetcher = fetcher or create_fetcher()
+
+    jobs = {}
+    pending_targets: Dict[Tuple[str, str, str], List[str]] = {}
+    for site in sites:
+        for start, end, targets in plan_date_ranges(timestamps):
+            remaining = [ts for ts in targets if (site, ts) not in completed]
+            if remaining:
+                jobs[(site, start, end)] = build_cdx_params(site, start, end)
+                pending_targets[(site, start, end)] = remaining
+
+    skipped = len(sites) * len(timestamps) - sum(len(t) for t in pending_targets.values())
+    logging.info(f"Backfilling {len(timestamps)} timestamps for {len(sites)} sites: "
+                 f"{skipped} already checkpointed, {len(jobs)} CDX ranges to query")
+
+    today = datetime.now(timezone.utc).strftime('%Y%m%d')
+    with open(checkpoint_path, 'a') as f:
+        for (site, start, end), rows in fetcher.iter_fetch(jobs):
+            targets = pending_targets[(site, start, end)]
+            resolved = resolve_snapshots(rows, targets)
+            records = [
+                {'site': site, 'target': target, **snapshot}
+                for target, snapshot in sorted(resolved.items())
+            ]
+            # A past range with no captures will not get any, so record that
+            # rather than query it again on every restart
+            if not resolved and end[:8] < today:
+                records = [{'site': site, 'target': target, 'url': None} for target in targets]
+            append_records(f, records)
+            for record in records:
+                completed[(site, record['target'])] = record
+            logging.info(f"Checkpointed {len(records)} snapshots for {site} ({start}-{end})")
+
+    return completed
+
+def build_results(completed: Dict[Tuple[str, str], Dict], timestamps: List[str],
+                  sites: List[str] = NEWS_SITES) -> Dict:
+    """Convert checkpoint records to the wayback_snapshots_*.json layout."""
+    results = {}
+    for site in sites:
+        results[site] = {}
+        for timestamp in timestamps:
+            record = completed.get((site, timestamp))
+            if record and record['url']:
+                results[site][timestamp] = {
+                    'url': record['url'],
+                    'timestamp': record['timestamp'],
+                    'digest': record.get('digest')
+                }
+    return results
+
+def parse_date(value: str) -> datetime:
+    return datetime.strptime(value, '%Y%m%d')
+
+def main():
+    parser = argparse.ArgumentParser(description='Backfill Wayback snapshots over a date range')
+    parser.add_argument('start', type=parse_date, help='First day to backfill (YYYYMMDD)')
+    parser.add_argument('end', type=parse_date, help='Last day to backfill (YYYYMMDD)')
+    parser.add_argument('--start-hour', type=int, default=6, help='First capture hour of each day')
+    parser.add_argument('--end-hour', type=int, default=21, help='Last capture hour of each day')
+    parser.add_argument('--interval-hours', type=int, default=3, help='Hours between captures')
+    parser.add_argument('--checkpoint', help='Checkpoint JSONL path (default: backfill_START_END.jsonl)')
+    parser.add_argument('--metrics-log', metavar='PATH', help='Write structured JSON timing events to PATH')
+    args = parser.parse_args()
+
+    if args.end < args.start:
+        parser.error('end date must not be before start date')
+    if args.interval_hours < 1:
+        parser.error('--interval-hours must be at least 1')
+
+    span = f"{args.start.strftime('%Y%m%d')}_{args.end.strftime('%Y%m%d')}"
+    checkpoint_path = args.checkpoint or f'backfill_{span}.jsonl'
+    timestamps = generate_timestamps(args.start, args.end, args.start_hour,
+                                     args.end_hour, args.interval_hours)
+
+    if args.metrics_log:
+        enable_event_log(args.metrics_log)
+
+    logging.info(f"Starting backfill {span}, checkpointing to {checkpoint_path}")
+    completed = run_backfill(timestamps, checkpoint_path)
+
+    save_results(build_results(completed, timestamps), f'wayback_snapshots_{span}.json')
+    METRICS.log_summary()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+import argparse
+import os
+import sys
+import timeit
+import unicodedata
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic_pages import HEADLINES
+from headline_extractors import CLEAN_TEXT_REPLACEMENTS, NYTHeadlineExtractor, clean_text
+
+def legacy_clean_text(text):
+    """clean_text as it was before the module-level replacements and fast path"""
+    if not text:
+        return text
+    replacements = {
+        '\u2018': "'",
+        '\u2019': "'",
+        '\u201C': '"',
+        '\u201D': '"',
+        '\u2013': '-',
+        '\u2014': '--',
+    }
+    for old, new in replacements.items():
+        text = text.replace(old, new)
+    text = unicodedata.normalize('NFKC', text)
+    return ' '.join(text.split())
+
+def build_corpus(size: int):
+    """Mix of Unicode and plain ASCII headlines, each repeated like kickers across snapshots"""
+    ascii_headlines = [legacy_clean_text(h).encode('ascii', 'ignore').decode() for h in HEADLINES]
+    base = [f'  {h}  ' for h in HEADLINES + ascii_headlines]
+    return [base[i % len(base)] + (f' {i % 200}' if i % 3 else '') for i in range(size)]
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare clean_text implementations')
+    parser.add_argument('--size', type=int, default=20000, help='Strings per run')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.size)
+    memoized = NYTHeadlineExtractor().clean_text
+    translate_table = str.maketrans(dict(CLEAN_TEXT_REPLACEMENTS))
+
+    def translate_clean_text(text):
+        """Variant using str.translate, kept for comparison"""
+        if not text:
+            return text
+        if text.isascii():
+            return ' '.join(text.split())
+        text = unicodedata.normalize('NFKC', text.translate(translate_table))
+        return ' '.join(text.split())
+
+    mismatches = [text for text in corpus
+                  if clean_text(text) != legacy_clean_text(text) or memoized(text) != legacy_clean_text(text)]
+    if mismatches:
+        print(f"OUTPUT DIFFERS for {len(mismatches)} strings, e.g. {mismatches[0]!r}")
+        sys.exit(1)
+
+    candidates = [
+        ('legacy replace loop', legacy_clean_text),
+        ('str.translate table', translate_clean_text),
+        ('ASCII fast path', clean_text),
+        ('fast path + memoized', memoized),
+    ]
+    baseline = None
+    for name, func in candidates:
+        best = min(timeit.repeat(lambda: [func(text) for text in corpus], number=1, repeat=args.repeat))
+        rate = len(corpus) / best
+        baseline = baseline or rate
+        print(f"{name:22} {rate / 1000:9.1f}k strings/s  ({rate / baseline:.1f}x)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+import argparse
+import os
+import sys
+import time
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic_pages import build_pages
+from headline_extractors import available_parsers, get_extractor, make_soup
+
+BASE_URL = 'https://web.archive.org/web/20240410060000/'
+
+def load_pages(paths: List[str]) -> Dict[str, str]:
+    """Load saved {site}_{timestamp}_raw.html files keyed by file name."""
+    pages = {}
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            pages[os.path.basename(path)] = f.read()
+    return pages
+
+def site_for(name: str) -> str:
+    return name.split('_')[0]
+
+def bench(pages: Dict[str, str], parsers: List[str], repeat: int) -> bool:
+    """Time parse and extraction per parser; return True if all outputs match html.parser."""
+    equivalent = True
+    for name, html in pages.items():
+        site = site_for(name)
+        extractor = get_extractor(site)
+        if not extractor:
+            print(f"{name}: no extractor for {site}, skipping")
+            continue
+
+        url = BASE_URL + 'https://www.' + site + '/'
+        reference = extractor.extract_headlines(make_soup(html, 'html.parser'), url)
+        print(f"{name} ({len(html) / 1_000_000:.2f} MB, {len(reference)} headlines)")
+        for parser in parsers:
+            parse_times, extract_times = [], []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                soup = make_soup(html, parser)
+                parsed = time.perf_counter()
+                headlines = extractor.extract_headlines(soup, url)
+                parse_times.append(parsed - start)
+                extract_times.append(time.perf_counter() - parsed)
+
+            same = headlines == reference
+            equivalent = equivalent and same
+            print(f"  {parser:12} parse {min(parse_times) * 1000:8.1f} ms  "
+                  f"extract {min(extract_times) * 1000:7.1f} ms  "
+                  f"{'same output' if same else 'OUTPUT DIFFERS'}")
+
+            # Same backend restricted to the elements the extractor declares
+            if extractor.parse_only is None or parser == 'html5lib':
+                continue
+            strained_times = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                headlines = extractor.extract_headlines(extractor.parse(html, parser), url)
+                strained_times.append(time.perf_counter() - start)
+            same = headlines == reference
+            equivalent = equivalent and same
+            print(f"  {parser + '+strain':16} parse+extract {min(strained_times) * 1000:7.1f} ms  "
+                  f"{'same output' if same else 'OUTPUT DIFFERS'}")
+    return equivalent
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare HTML parser backends for headline extraction')
+    parser.add_argument('html_files', nargs='*',
+                        help='Saved {site}_{timestamp}_raw.html pages (default: synthetic pages)')
+    parser.add_argument('--parsers', nargs='+', default=available_parsers())
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    if args.html_files:
+        pages = load_pages(args.html_files)
+    else:
+        pages = {f'{site}_synthetic': html for site, html in build_pages().items()}
+
+    if not bench(pages, args.parsers, args.repeat):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+import argparse
+import gzip
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from http_client import fetch_text
+from process_first_url import find_latest_snapshot_file
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+def fixture_path(site: str, timestamp: str, directory: str = FIXTURES_DIR) -> str:
+    return os.path.join(directory, f'{site}_{timestamp}_raw.html.gz')
+
+def record(snapshot_file: str, per_site: int, directory: str = FIXTURES_DIR) -> int:
+    """Download the first per_site archived pages of each site in a snapshot file."""
+    with open(snapshot_file, 'r') as f:
+        data = json.load(f)
+
+    os.makedirs(directory, exist_ok=True)
+    recorded = 0
+    for site, snapshots in data.items():
+        for timestamp, snapshot in list(snapshots.items())[:per_site]:
+            path = fixture_path(site, timestamp, directory)
+            if os.path.exists(path):
+                continue
+            html = fetch_text(snapshot['url'])
+            with gzip.open(path, 'wt', encoding='utf-8') as f:
+                f.write(html)
+            print(f"Recorded {site} {timestamp} ({len(html) / 1_000_000:.2f} MB)")
+            recorded += 1
+    return recorded
+
+def main():
+    parser = argparse.ArgumentParser(description='Record archived homepages as benchmark fixtures')
+    parser.add_argument('snapshot_file', nargs='?', help='Snapshot file (default: most recent)')
+    parser.add_argument('--per-site', type=int, default=1, help='Pages to record per site')
+    args = parser.parse_args()
+
+    count = record(args.snapshot_file or find_latest_snapshot_file(), args.per_site)
+    print(f"Recorded {count} new fixtures in {FIXTURES_DIR}")
+
+if __name__ == '__main__':
+    main()
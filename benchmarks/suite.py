@@ -0,0 +1,204 @@
+import argparse
+import glob
+import gzip
+import json
+import logging
+import os
+import platform
+import re
+import sys
+import tempfile
+import threading
+import time
+import timeit
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from artifact_store import ArtifactStore
+from benchmarks.bench_clean_text import build_corpus
+from benchmarks.record_fixtures import FIXTURES_DIR
+from benchmarks.synthetic_pages import build_pages
+from headline_extractors import available_parsers, clean_text, get_extractor
+from pipeline import build_pipeline
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+# A metric regresses when it is this much worse than its baseline
+DEFAULT_TOLERANCE = 0.25
+BASE_URL = 'https://web.archive.org/web/20240410060000/'
+
+FIXTURE_FILE = re.compile(r'^(?P<site>[^_]+)_(?P<timestamp>\d{14})_raw\.html\.gz$')
+
+def load_corpus(directory: str = FIXTURES_DIR) -> Tuple[str, Dict[str, str]]:
+    """Return ('fixtures', pages) from recorded fixtures (one page per site),
+    or ('synthetic', pages) when none have been recorded."""
+    pages = {}
+    for path in sorted(glob.glob(os.path.join(directory, '*_raw.html.gz'))):
+        match = FIXTURE_FILE.match(os.path.basename(path))
+        if match and match.group('site') not in pages:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                pages[match.group('site')] = f.read()
+    if pages:
+        return 'fixtures', pages
+    return 'synthetic', build_pages()
+
+def bench_pages(pages: Dict[str, str], repeat: int, parser: Optional[str] = None) -> Dict[str, float]:
+    """Parse and extraction time (best of repeat) and peak memory for each page."""
+    results = {}
+    for site, html in pages.items():
+        extractor = get_extractor(site)
+        url = BASE_URL + 'https://www.' + site + '/'
+        parse_times, extract_times = [], []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            soup = extractor.parse(html, parser)
+            parsed = time.perf_counter()
+            extractor.extract_headlines(soup, url)
+            parse_times.append(parsed - start)
+            extract_times.append(time.perf_counter() - parsed)
+        results[f'{site}.parse_ms'] = min(parse_times) * 1000
+        results[f'{site}.extract_ms'] = min(extract_times) * 1000
+
+        # Measured separately since tracing allocations slows everything down
+        tracemalloc.start()
+        extractor.extract_headlines(extractor.parse(html, parser), url)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results[f'{site}.peak_memory_mb'] = peak / 1_000_000
+    return results
+
+def bench_clean_text(size: int, repeat: int) -> Dict[str, float]:
+    """Throughput of the uncached clean_text over a mix of Unicode and ASCII headlines."""
+    corpus = build_corpus(size)
+    best = min(timeit.repeat(lambda: [clean_text(text) for text in corpus], number=1, repeat=repeat))
+    return {'clean_text.strings_per_s': len(corpus) / best}
+
+class StubArchiveHandler(BaseHTTPRequestHandler):
+    """Serves the corpus page for /web/<timestamp>/https://www.<site>/"""
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        match = re.match(r'^/web/\d{14}/https://www\.([^/]+)/$', self.path)
+        body = self.server.pages.get(match.group(1)) if match else None
+        if body is None:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def bench_pipeline(pages: Dict[str, str], captures_per_site: int, parser: Optional[str] = None) -> Dict[str, float]:
+    """End-to-end fetch/parse/extract/store throughput against a local stub archive."""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubArchiveHandler)
+    server.pages = {site: html.encode('utf-8') for site, html in pages.items()}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f'http://127.0.0.1:{server.server_port}/web'
+
+    jobs = [{'site': site, 'timestamp': f'20240410{hour:02d}0000', 'url': f'{base}/20240410{hour:02d}0000/https://www.{site}/'}
+            for site in pages for hour in range(captures_per_site)]
+    try:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            store = ArtifactStore(os.path.join(tmpdir, 'store'))
+            pipeline = build_pipeline(screenshots=False, dedup=False, store=store, parser=parser)
+            start = time.perf_counter()
+            summaries = pipeline.run(jobs)
+            elapsed = time.perf_counter() - start
+            store.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    extracted = next(s for s in summaries if s['stage'] == 'extract')['processed']
+    if extracted != len(jobs):
+        raise RuntimeError(f"Pipeline extracted {extracted} of {len(jobs)} pages")
+    return {'pipeline.pages_per_s': len(jobs) / elapsed}
+
+def higher_is_better(metric: str) -> bool:
+    return metric.endswith('_per_s')
+
+def compare(results: Dict[str, float], baseline: Dict[str, float],
+            tolerance: float = DEFAULT_TOLERANCE) -> List[str]:
+    """Return a description of every metric worse than its baseline by more than tolerance."""
+    regressions = []
+    for metric, value in results.items():
+        expected = baseline.get(metric)
+        if not expected:
+            continue
+        change = (expected - value) / expected if higher_is_better(metric) else (value - expected) / expected
+        if change > tolerance:
+            regressions.append(f"{metric}: {value:.3f} vs baseline {expected:.3f} ({change:+.0%} worse)")
+    return regressions
+
+def load_baseline(path: str, corpus: str) -> Optional[Dict[str, float]]:
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        baselines = json.load(f)
+    entry = baselines.get(corpus)
+    return entry['metrics'] if entry else None
+
+def save_baseline(path: str, corpus: str, results: Dict[str, float]):
+    baselines = {}
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            baselines = json.load(f)
+    baselines[corpus] = {
+        'machine': f'{platform.machine()} {platform.python_implementation()} {platform.python_version()}',
+        'recorded': time.strftime('%Y-%m-%d'),
+        'metrics': {metric: round(value, 4) for metric, value in sorted(results.items())},
+    }
+    with open(path, 'w') as f:
+        json.dump(baselines, f, indent=2)
+
+def run(repeat: int = 3, clean_text_size: int = 20000, captures_per_site: int = 8,
+        directory: str = FIXTURES_DIR, parser: Optional[str] = None) -> Tuple[str, Dict[str, float]]:
+    corpus, pages = load_corpus(directory)
+    results = bench_pages(pages, repeat, parser)
+    results.update(bench_clean_text(clean_text_size, repeat))
+    results.update(bench_pipeline(pages, captures_per_site, parser))
+    return corpus, results
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the benchmark suite and check it against stored baselines')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--captures-per-site', type=int, default=8, help='Pipeline jobs per site')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    # The stored baselines were measured with the fastest installed backend
+    parser.add_argument('--parser', choices=available_parsers(), default=available_parsers()[0],
+                        help='HTML parser backend (default: fastest installed)')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='Allowed slowdown before a metric counts as a regression')
+    parser.add_argument('--save-baseline', action='store_true', help='Store these results as the new baseline')
+    args = parser.parse_args()
+
+    # Keep the pipeline's per-page logging out of the report
+    logging.getLogger().setLevel(logging.WARNING)
+    corpus, results = run(args.repeat, captures_per_site=args.captures_per_site, parser=args.parser)
+    baseline = load_baseline(args.baseline, corpus) or {}
+    print(f"Corpus: {corpus}")
+    for metric, value in sorted(results.items()):
+        reference = f"  (baseline {baseline[metric]:.3f})" if metric in baseline else ''
+        print(f"  {metric:40} {value:12.3f}{reference}")
+
+    if args.save_baseline:
+        save_baseline(args.baseline, corpus, results)
+        print(f"Baseline saved to {args.baseline}")
+        return
+
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if regressions:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
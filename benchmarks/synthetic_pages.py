@@ -0,0 +1,82 @@
+import random
+from typing import Dict
+
+# Headlines with the typographic punctuation real homepages use
+HEADLINES = [
+    "‘Unprecedented’ storm batters coast as officials urge evacuations",
+    "Senate passes spending bill — what’s in it for you",
+    "Markets rally after Fed signals pause on rate hikes",
+    "“We will rebuild,” mayor says after flooding",
+    "Live updates: Election results 2024–2025",
+    "How a small town became the center of a national debate",
+    "Café owners brace for new tariffs on imported goods",
+    "Scientists discover ﬁrst-of-its-kind deep sea species",
+]
+
+def _filler(rng: random.Random, blocks: int) -> str:
+    """Navigation, scripts and promo markup that the extractors must skip over"""
+    parts = []
+    for i in range(blocks):
+        words = ' '.join(' '.join(rng.choice(HEADLINES).split()[:4]) for _ in range(3))
+        parts.append(
+            f'<div class="zone zone-{i}"><nav><ul>'
+            + ''.join(f'<li><a href="/section/{i}/{j}">Section {j}</a></li>' for j in range(8))
+            + f'</ul></nav><script>window.__data_{i} = {{"id": {i}, "items": [{",".join(str(j) for j in range(40))}]}};</script>'
+            f'<div class="promo"><img src="/img/{i}.jpg" alt="{words}"><p>{words}</p></div></div>'
+        )
+    return ''.join(parts)
+
+def cnn_page(rng: random.Random, stories: int, blocks: int) -> str:
+    cards = []
+    for i in range(stories):
+        kind = 'container_lead-package__link' if i % 2 == 0 else 'container_lead-plus-headlines-with-images__link'
+        cards.append(
+            f'<div class="card"><a class="container__link container__link--type-article {kind}" '
+            f'href="/2024/04/10/politics/story-{i}/index.html">'
+            f'<span class="container__headline-text">{rng.choice(HEADLINES)} {i}</span></a></div>'
+        )
+    return f'<html><head><title>CNN</title></head><body>{_filler(rng, blocks)}<main>{"".join(cards)}</main>{_filler(rng, blocks)}</body></html>'
+
+def foxnews_page(rng: random.Random, stories: int, blocks: int) -> str:
+    articles = []
+    for i in range(stories):
+        articles.append(
+            f'<article class="article story-{i}"><div class="kicker"><span class="kicker-text">LIVE</span></div>'
+            f'<h3 class="title"><a href="/politics/story-{i}">{rng.choice(HEADLINES)} {i}</a></h3>'
+            f'<p class="dek">{rng.choice(HEADLINES)}</p></article>'
+        )
+    return f'<html><body>{_filler(rng, blocks)}<main>{"".join(articles)}</main>{_filler(rng, blocks)}</body></html>'
+
+def nytimes_page(rng: random.Random, stories: int, blocks: int) -> str:
+    sections = []
+    for i in range(stories):
+        sections.append(
+            f'<section class="story-wrapper"><a href="/2024/04/10/us/story-{i}.html">'
+            f'<div><p class="indicate-hover">{rng.choice(HEADLINES)} {i}</p></div></a>'
+            f'<p class="summary-class">{rng.choice(HEADLINES)}</p></section>'
+        )
+    return f'<html><body>{_filler(rng, blocks)}<main>{"".join(sections)}</main>{_filler(rng, blocks)}</body></html>'
+
+def washingtonpost_page(rng: random.Random, stories: int, blocks: int) -> str:
+    items = []
+    for i in range(stories):
+        items.append(
+            f'<div class="story-headline"><h2><a href="https://web.archive.org/web/20240410060000/'
+            f'https://www.washingtonpost.com/politics/2024/04/10/story-{i}/">{rng.choice(HEADLINES)} {i}</a></h2></div>'
+        )
+    return f'<html><body>{_filler(rng, blocks)}<main>{"".join(items)}</main>{_filler(rng, blocks)}</body></html>'
+
+PAGE_BUILDERS = {
+    'cnn.com': cnn_page,
+    'foxnews.com': foxnews_page,
+    'nytimes.com': nytimes_page,
+    'washingtonpost.com': washingtonpost_page,
+}
+
+def build_pages(stories: int = 60, blocks: int = 800, seed: int = 0) -> Dict[str, str]:
+    """Build one deterministic homepage per supported site.
+
+    The default size (roughly 1.3 MB per page) is in the range of real
+    archived news homepages.
+    """
+    return {site: builder(random.Random(seed), stories, blocks) for site, builder in PAGE_BUILDERS.items()}
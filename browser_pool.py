@@ -0,0 +1,327 @@
+import asyncio
+import logging
+import os
+import threading
+from concurrent.futures import Future
+from typing import Optional, Tuple
+
+from playwright.async_api import async_playwright
+
+from instrumentation import METRICS
+from resource_blocking import BlockProfile, BlockStats, get_block_profile
+from warc_archive import WarcIndex, WarcWriter
+from process_first_url import (
+    BROWSER_ARGS,
+    DEVICE_SCALE_FACTOR,
+    NAVIGATION_TIMEOUT_MS,
+    VIEWPORT,
+    screenshot_paths,
+)
+
+class PooledPage:
+    """A browser context and page plus the number of jobs it has served.
+    Both are None for a pool slot whose page could not be replaced."""
+
+    def __init__(self, context, page):
+        self.context = context
+        self.page = page
+        self.jobs = 0
+        # Blocking profile of the site currently being captured
+        self.profile: Optional[BlockProfile] = None
+        # URL currently answered from HTML fetched earlier, not the network
+        self.served_url: Optional[str] = None
+        # (site, timestamp) whose page is being fetched by the browser for extraction
+        self.capture: Optional[Tuple[str, str]] = None
+
+class BrowserService:
+    """Long-lived headless Chromium serving screenshot jobs from a pool of pages.
+
+    The browser runs on its own asyncio event loop in a background thread, so
+    jobs can be submitted from ordinary (threaded) code with submit() or
+    screenshot(). Each page is closed and replaced with a fresh context after
+    max_jobs_per_page jobs to bound memory growth.
+
+    With block_resources, ads, trackers, media and the Wayback banner are
+    blocked according to each site's profile in resource_blocking.
+
+    With a warc_writer, every response the browser receives (stylesheets,
+    scripts, images, redirects, ...) is archived, and a rendered page is
+    indexed under its capture like one fetched with requests. With replay, every request is answered
+    from that WARC index and anything missing is aborted, so pages render
+    without touching the network.
+    """
+
+    def __init__(self, pool_size: int = 2, max_jobs_per_page: int = 25,
+                 block_resources: bool = False, warc_writer: Optional[WarcWriter] = None,
+                 replay: Optional[WarcIndex] = None):
+        self.pool_size = pool_size
+        self.max_jobs_per_page = max_jobs_per_page
+        self.block_resources = block_resources
+        self.warc_writer = warc_writer
+        self.replay = replay
+        self.block_stats = BlockStats()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._playwright = None
+        self._browser = None
+        self._pages: Optional[asyncio.Queue] = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def start(self):
+        """Launch the browser and fill the page pool."""
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='browser-service', daemon=True)
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._start(), self._loop).result()
+        logging.info(f"Browser service started with {self.pool_size} pages")
+
+    def stop(self):
+        """Close every page, the browser and the event loop."""
+        if self._loop is None:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._stop(), self._loop).result()
+        finally:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+            self._loop = None
+        if self.block_resources:
+            self.block_stats.log_summary()
+        logging.info("Browser service stopped")
+
+    def submit(self, url: str, site: str, timestamp: str, html: Optional[str] = None,
+               return_content: bool = False) -> Future:
+        """Queue a screenshot job. The future resolves to (ok, content).
+
+        If html is given, the navigation request for url is answered from it
+        instead of the network, so a page already fetched is not downloaded
+        again. If return_content is set, content is the rendered DOM.
+        """
+        return asyncio.run_coroutine_threadsafe(
+            self._screenshot(url, site, timestamp, html, return_content), self._loop)
+
+    def screenshot(self, url: str, site: str, timestamp: str, html: Optional[str] = None) -> bool:
+        """Take a screenshot of the archived page, blocking until it is saved."""
+        ok, _ = self.submit(url, site, timestamp, html).result()
+        return ok
+
+    def render(self, url: str, site: str, timestamp: str) -> Optional[str]:
+        """Screenshot the archived page and return its rendered HTML, or None on failure."""
+        ok, content = self.submit(url, site, timestamp, return_content=True).result()
+        return content if ok else None
+
+    async def _start(self):
+        self._playwright = await async_playwright().start()
+        self._browser = await self._playwright.chromium.launch(headless=True, args=BROWSER_ARGS)
+        self._pages = asyncio.Queue()
+        for _ in range(self.pool_size):
+            await self._pages.put(await self._new_page())
+
+    async def _stop(self):
+        while self._pages is not None and not self._pages.empty():
+            pooled = self._pages.get_nowait()
+            await self._close_page(pooled)
+        try:
+            await self._browser.close()
+        except Exception as e:
+            logging.warning(f"Error closing browser: {str(e)}")
+        await self._playwright.stop()
+
+    async def _new_page(self) -> PooledPage:
+        context = await self._browser.new_context(
+            viewport=VIEWPORT,
+            device_scale_factor=DEVICE_SCALE_FACTOR
+        )
+        page = await context.new_page()
+        page.set_default_navigation_timeout(NAVIGATION_TIMEOUT_MS)
+        page.set_default_timeout(NAVIGATION_TIMEOUT_MS)
+        pooled = PooledPage(context, page)
+        # Routes added later run first, so blocking decides before replay
+        if self.replay is not None:
+            await page.route('**/*', self._replay_handler)
+        if self.block_resources:
+            await page.route('**/*', self._make_block_handler(pooled))
+        if self.warc_writer is not None:
+            page.on('response', self._make_recorder(pooled))
+        return pooled
+
+    async def _replay_handler(self, route):
+        record = self.replay.lookup(route.request.url)
+        if record is None:
+            METRICS.increment('replay.misses')
+            await route.abort()
+            return
+        METRICS.increment('replay.hits')
+        await route.fulfill(status=record.http_status, headers=dict(record.http_headers), body=record.body)
+
+    def _make_recorder(self, pooled: PooledPage):
+        async def record_response(response):
+            if not response.url.startswith(('http://', 'https://')) or response.url == pooled.served_url:
+                return
+            request = response.request
+            # Redirects have no body, but their Location is needed to replay them
+            redirect = 300 <= response.status < 400
+            if redirect:
+                body = b''
+            else:
+                try:
+                    body = await response.body()
+                except Exception:
+                    # Failed requests have no body
+                    return
+            site, timestamp = None, None
+            if (pooled.capture and not redirect and request.is_navigation_request()
+                    and request.frame == pooled.page.main_frame):
+                site, timestamp = pooled.capture
+            self.warc_writer.write_response(response.url, response.status, response.status_text,
+                                            list((await response.all_headers()).items()), body,
+                                            list((await request.all_headers()).items()), site, timestamp)
+        return record_response
+
+    def _make_block_handler(self, pooled: PooledPage):
+        async def block_handler(route):
+            request = route.request
+            action = pooled.profile.decide(request.url, request.resource_type) if pooled.profile else None
+            self.block_stats.record(request.resource_type, action)
+            if action == 'stub':
+                await route.fulfill(status=200, content_type='application/javascript', body='')
+            elif action == 'abort':
+                await route.abort()
+            else:
+                await route.fallback()
+        return block_handler
+
+    async def _close_page(self, pooled: PooledPage):
+        if pooled.context is None:
+            return
+        try:
+            await pooled.context.close()
+        except Exception as e:
+            logging.warning(f"Error closing context: {str(e)}")
+
+    async def _recycle(self, pooled: PooledPage) -> PooledPage:
+        """Replace a worn-out or crashed page with a fresh context."""
+        await self._close_page(pooled)
+        for attempt in range(3):
+            try:
+                return await self._new_page()
+            except Exception as e:
+                if attempt == 2:
+                    raise e
+                logging.warning(f"Failed to create page: {str(e)}, retrying...")
+                await asyncio.sleep(2)
+
+    async def _screenshot(self, url: str, site: str, timestamp: str, html: Optional[str],
+                          return_content: bool) -> Tuple[bool, Optional[str]]:
+        pooled = await self._pages.get()
+        if pooled.page is None:
+            # Replacing this slot's page failed after its last job; try again
+            try:
+                pooled = await self._new_page()
+            except Exception as e:
+                logging.error(f"Error creating page for {url}: {str(e)}")
+                await self._pages.put(pooled)
+                return False, None
+        pooled.profile = get_block_profile(site) if self.block_resources else None
+        # Only a render fetches the page for extraction; otherwise it was
+        # archived when it was fetched with requests
+        pooled.capture = (site, timestamp) if return_content and html is None else None
+        try:
+            if html is None:
+                return await self._capture(pooled, url, site, timestamp, return_content)
+
+            async def serve_cached_html(route):
+                await route.fulfill(status=200, content_type='text/html; charset=utf-8', body=html)
+
+            # Match the exact URL with a predicate; Wayback URLs are not safe globs
+            def is_page_url(request_url: str) -> bool:
+                return request_url == url
+
+            await pooled.page.route(is_page_url, serve_cached_html)
+            pooled.served_url = url
+            try:
+                return await self._capture(pooled, url, site, timestamp, return_content)
+            finally:
+                pooled.served_url = None
+                await pooled.page.unroute(is_page_url, serve_cached_html)
+        finally:
+            pooled.capture = None
+            pooled.jobs += 1
+            if pooled.jobs >= self.max_jobs_per_page or pooled.page.is_closed():
+                logging.info(f"Recycling page after {pooled.jobs} jobs")
+                try:
+                    pooled = await self._recycle(pooled)
+                except Exception as e:
+                    # Keep the slot so the pool never shrinks and waiting jobs still run
+                    logging.error(f"Failed to replace page: {str(e)}")
+                    pooled = PooledPage(None, None)
+            await self._pages.put(pooled)
+
+    async def _capture(self, pooled: PooledPage, url: str, site: str, timestamp: str,
+                       return_content: bool = False) -> Tuple[bool, Optional[str]]:
+        """Navigate a pooled page to url, save both screenshots and optionally
+        return the rendered DOM."""
+        page = pooled.page
+        try:
+            logging.info(f"Navigating to URL: {url}")
+
+            # Navigate with retry logic
+            max_retries = 3
+            for attempt in range(max_retries):
+                try:
+                    with METRICS.timer('browser.goto', site=site):
+                        response = await page.goto(url, wait_until='domcontentloaded')
+                    if response and response.ok:
+                        break
+                    logging.warning(f"Attempt {attempt + 1} failed, retrying...")
+                except Exception as e:
+                    if attempt == max_retries - 1:
+                        raise e
+                    logging.warning(f"Attempt {attempt + 1} failed: {str(e)}, retrying...")
+                    await asyncio.sleep(5)
+                METRICS.increment('browser.goto_failures')
+
+            try:
+                await page.wait_for_selector('body', timeout=30000)
+            except Exception as e:
+                logging.warning(f"Timeout waiting for body element: {str(e)}")
+
+            hide_css = pooled.profile.hide_css() if pooled.profile else None
+            if hide_css:
+                await page.add_style_tag(content=hide_css)
+
+            screenshot_path, full_page_path = screenshot_paths(site, timestamp)
+            os.makedirs(os.path.dirname(screenshot_path), exist_ok=True)
+
+            for attempt in range(3):
+                try:
+                    with METRICS.timer('browser.screenshot', site=site):
+                        await page.screenshot(
+                            path=screenshot_path,
+                            full_page=False,
+                            clip={'x': 0, 'y': 0, 'width': VIEWPORT['width'], 'height': VIEWPORT['height']}
+                        )
+                    logging.info(f"Screenshot saved successfully to {screenshot_path}")
+
+                    with METRICS.timer('browser.full_page_screenshot', site=site):
+                        await page.screenshot(path=full_page_path, full_page=True)
+                    logging.info(f"Full page screenshot saved to {full_page_path}")
+                    break
+                except Exception as e:
+                    if attempt == 2:
+                        raise e
+                    logging.warning(f"Screenshot attempt {attempt + 1} failed: {str(e)}, retrying...")
+                    await asyncio.sleep(2)
+
+            return True, (await page.content() if return_content else None)
+
+        except Exception as e:
+            logging.error(f"Error taking screenshot of {url}: {str(e)}")
+            return False, None
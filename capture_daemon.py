@@ -0,0 +1,224 @@
+import argparse
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+from artifact_store import ArtifactStore
+from backfill import append_records, load_checkpoint
+from browser_pool import BrowserService
+from headline_extractors import get_extractor
+from instrumentation import METRICS, enable_event_log
+from pipeline import Stage, build_pipeline, log_summary
+from process_first_url import set_warc_writer
+from story_tracker import StoryTracker
+from visual_change import VisualIndex
+from warc_archive import WarcWriter
+from wayback_scraper import NEWS_SITES, generate_timestamps, process_snapshots
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+DEFAULT_CHECKPOINT = 'live_captures.jsonl'
+
+# Capture grid, matching the Wayback backfill
+START_HOUR = 6
+END_HOUR = 21
+INTERVAL_HOURS = 3
+
+# A slot is captured live if the daemon reaches it within this many seconds;
+# older missed slots are filled from the Wayback Machine instead
+LIVE_WINDOW_SECONDS = 15 * 60
+# How far back missed slots are caught up after downtime
+CATCHUP_HOURS = 24
+# Failed captures of a slot are retried on later passes up to this many times in all
+MAX_ATTEMPTS = 3
+
+TIMESTAMP_FORMAT = '%Y%m%d%H%M%S'
+
+def live_url(site: str) -> str:
+    return f'https://www.{site}/'
+
+def grid_slots(start: datetime, end: datetime) -> List[str]:
+    """Grid timestamps from start to end, inclusive."""
+    return [ts for ts in generate_timestamps(start, end, START_HOUR, END_HOUR, INTERVAL_HOURS, until=end)
+            if ts >= start.strftime(TIMESTAMP_FORMAT)]
+
+def next_slot(now: datetime) -> datetime:
+    """The first grid time strictly after now."""
+    upcoming = [ts for ts in generate_timestamps(now, now + timedelta(days=1), START_HOUR, END_HOUR,
+                                                 INTERVAL_HOURS)
+                if ts > now.strftime(TIMESTAMP_FORMAT)]
+    return datetime.strptime(upcoming[0], TIMESTAMP_FORMAT)
+
+class CaptureDaemon:
+    """Captures every site at each grid time, all at once, with a warm browser.
+
+    Completed (site, slot) pairs are appended to a JSONL checkpoint, as are
+    failed ones with their attempt count so they are given up on after
+    max_attempts. Sites without an extractor are checkpointed once captured.
+    After downtime, slots missed within catchup_hours are filled from the
+    Wayback Machine, since the live page can no longer show what was up then.
+    """
+
+    def __init__(self, browser: Optional[BrowserService], sites: List[str] = NEWS_SITES,
+                 checkpoint_path: str = DEFAULT_CHECKPOINT, catchup_hours: float = CATCHUP_HOURS,
+                 store: Optional[ArtifactStore] = None, story_tracker: Optional[StoryTracker] = None,
+                 visual_index: Optional[VisualIndex] = None, max_attempts: int = MAX_ATTEMPTS,
+                 clock: Callable[[], datetime] = datetime.now,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.browser = browser
+        self.sites = sites
+        self.checkpoint_path = checkpoint_path
+        self.catchup_hours = catchup_hours
+        self.store = store
+        self.story_tracker = story_tracker
+        self.visual_index = visual_index
+        self.max_attempts = max_attempts
+        self.clock = clock
+        self.sleep = sleep
+        self.completed = load_checkpoint(checkpoint_path)
+
+    def settled(self, site: str, slot: str) -> bool:
+        """Whether a slot is captured for site, or has failed too often to retry."""
+        record = self.completed.get((site, slot))
+        if record is None:
+            return False
+        return record['mode'] != 'failed' or record['attempts'] >= self.max_attempts
+
+    def due_slots(self, now: datetime) -> Tuple[List[str], List[str]]:
+        """Split slots some site can still be captured for into (live, catch-up) lists."""
+        slots = grid_slots(now - timedelta(hours=self.catchup_hours), now)
+        live, catchup = [], []
+        for slot in slots:
+            if all(self.settled(site, slot) for site in self.sites):
+                continue
+            age = (now - datetime.strptime(slot, TIMESTAMP_FORMAT)).total_seconds()
+            (live if age <= LIVE_WINDOW_SECONDS else catchup).append(slot)
+        return live, catchup
+
+    def _run_jobs(self, jobs: List[Dict], mode: str, pending: List[Tuple[str, str]]):
+        """Run jobs through the pipeline and checkpoint the ones that finished,
+        and every (site, slot) in pending that did not as a failed attempt."""
+        done = []
+        if jobs:
+            screenshots = self.browser is not None
+            # One worker per site so a slot's pages are fetched and rendered together
+            pipeline = build_pipeline(fetch_workers=len(self.sites), parse_workers=2, extract_workers=2,
+                                      screenshot_workers=len(self.sites), screenshots=screenshots,
+                                      browser=self.browser,
+                                      fetch_mode='intercept' if screenshots else 'requests',
+                                      dedup=False, store=self.store, story_tracker=self.story_tracker,
+                                      visual_index=self.visual_index if screenshots else None)
+            pipeline.stages.append(Stage('checkpoint', lambda job: done.append(job) or job))
+            log_summary(pipeline.run(jobs))
+
+        records = []
+        for job in done:
+            # Extraction fails only for sites without an extractor, which a retry cannot fix
+            if job.get('metadata') or get_extractor(job['site']) is None:
+                records.append({'site': job['site'], 'target': job['timestamp'],
+                                'mode': mode if job.get('metadata') else 'no_extractor',
+                                'url': job['url'], 'captured_at': job['captured_at']})
+        finished = {(record['site'], record['target']) for record in records}
+        failures = []
+        for site, slot in pending:
+            if (site, slot) not in finished:
+                previous = self.completed.get((site, slot))
+                failures.append({'site': site, 'target': slot, 'mode': 'failed',
+                                 'attempts': (previous['attempts'] if previous else 0) + 1})
+        with open(self.checkpoint_path, 'a') as f:
+            append_records(f, records + failures)
+        for record in records + failures:
+            self.completed[(record['site'], record['target'])] = record
+        METRICS.increment(f'capture.{mode}', sum(1 for record in records if record['mode'] == mode))
+        METRICS.increment('capture.no_extractor', sum(1 for record in records if record['mode'] != mode))
+        METRICS.increment('capture.failed', len(failures))
+
+    def capture_live(self, slot: str):
+        """Capture the current homepage of every site for slot, concurrently."""
+        captured_at = self.clock().isoformat()
+        jobs = [{'site': site, 'timestamp': slot, 'url': live_url(site), 'captured_at': captured_at}
+                for site in self.sites if not self.settled(site, slot)]
+        logging.info(f"Capturing {len(jobs)} sites live for slot {slot}")
+        self._run_jobs(jobs, 'live', [(job['site'], slot) for job in jobs])
+
+    def catch_up(self, slots: List[str]):
+        """Fill missed slots from the Wayback captures nearest to each."""
+        logging.info(f"Catching up {len(slots)} missed slots from the Wayback Machine")
+        snapshots = process_snapshots(timestamps=slots)
+        pending = [(site, slot) for slot in slots for site in self.sites if not self.settled(site, slot)]
+        # Slots with no Wayback capture for a site count as failed attempts
+        jobs = [{'site': site, 'timestamp': slot, 'url': snapshots[site][slot]['url'],
+                 'captured_at': snapshots[site][slot]['timestamp']}
+                for site, slot in pending if slot in snapshots.get(site, {})]
+        self._run_jobs(jobs, 'wayback', pending)
+
+    def run_once(self):
+        """Capture whatever is due now: the current slot live, missed ones from Wayback."""
+        live, catchup = self.due_slots(self.clock())
+        for slot in live:
+            self.capture_live(slot)
+        if catchup:
+            self.catch_up(catchup)
+
+    def run_forever(self):
+        while True:
+            self.run_once()
+            wake = next_slot(self.clock())
+            logging.info(f"Next capture at {wake}")
+            self.sleep(max(0.0, (wake - self.clock()).total_seconds()))
+
+def main():
+    parser = argparse.ArgumentParser(description='Capture every news site at each grid time')
+    parser.add_argument('--once', action='store_true', help='Capture any due slots and exit')
+    parser.add_argument('--checkpoint', default=DEFAULT_CHECKPOINT, help='JSONL record of completed captures')
+    parser.add_argument('--catchup-hours', type=float, default=CATCHUP_HOURS,
+                        help='How far back missed slots are filled from the Wayback Machine')
+    parser.add_argument('--no-screenshots', action='store_true', help='Only extract headlines')
+    parser.add_argument('--block-resources', action='store_true',
+                        help='Block ads, trackers and media while rendering')
+    parser.add_argument('--store', metavar='DIR', help='Save artifacts to a compressed artifact store')
+    parser.add_argument('--warc', metavar='DIR',
+                        help='Archive every page and subresource fetched to WARC files in DIR')
+    parser.add_argument('--stories', metavar='PATH',
+                        help='Cluster headlines into stories and record changes using this database')
+    parser.add_argument('--visual-dedup', metavar='PATH',
+                        help='Score visual change between slots and keep near-duplicate screenshots '
+                             'only as references, using this hash database')
+    parser.add_argument('--metrics-log', metavar='PATH', help='Write structured JSON timing events to PATH')
+    args = parser.parse_args()
+
+    if args.metrics_log:
+        enable_event_log(args.metrics_log)
+    store = ArtifactStore(args.store) if args.store else None
+    story_tracker = StoryTracker(args.stories) if args.stories else None
+    visual_index = VisualIndex(args.visual_dedup) if args.visual_dedup else None
+    warc_writer = WarcWriter(args.warc) if args.warc else None
+    set_warc_writer(warc_writer)
+
+    def run(browser: Optional[BrowserService]):
+        daemon = CaptureDaemon(browser, checkpoint_path=args.checkpoint,
+                               catchup_hours=args.catchup_hours, store=store, story_tracker=story_tracker,
+                               visual_index=visual_index)
+        if args.once:
+            daemon.run_once()
+        else:
+            daemon.run_forever()
+
+    try:
+        if args.no_screenshots:
+            run(None)
+            return
+        # One page per site so every site renders at the same moment
+        with BrowserService(pool_size=len(NEWS_SITES), block_resources=args.block_resources,
+                            warc_writer=warc_writer) as browser:
+            run(browser)
+    finally:
+        set_warc_writer(None)
+        for resource in (warc_writer, store, story_tracker, visual_index):
+            if resource is not None:
+                resource.close()
+
+if __name__ == '__main__':
+    main()
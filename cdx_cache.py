@@ -0,0 +1,118 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from instrumentation import METRICS
+
+DEFAULT_CACHE_PATH = 'cache/cdx_cache.db'
+
+# Listings that include today can still gain captures, so they expire quickly
+TODAY_TTL = 15 * 60
+# Total size of cached (compressed) listings before least-recently-used eviction
+MAX_CACHE_BYTES = 256 * 1024 * 1024
+
+class CDXCache:
+    """Persistent SQLite cache of CDX listings keyed on the query parameters.
+
+    Listings whose range ends before today (UTC) never change and are stored
+    without expiry; anything covering today expires after ttl seconds, as do
+    empty listings, which may only mean the archive had not indexed the day
+    yet or the query briefly failed. The
+    cache is trimmed to max_bytes by evicting the least recently used entries.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, ttl: float = TODAY_TTL,
+                 max_bytes: int = MAX_CACHE_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS cdx_cache (
+                key TEXT PRIMARY KEY,
+                body BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                expires_at REAL,
+                last_access REAL NOT NULL
+            )
+        ''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_cdx_cache_access ON cdx_cache (last_access)')
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(params: Dict) -> str:
+        """Canonical cache key for a set of CDX query parameters."""
+        return json.dumps(params, sort_keys=True, separators=(',', ':'))
+
+    def _expires_at(self, params: Dict, rows: List, now: float) -> Optional[float]:
+        """Return None for immutable (fully past) ranges with captures, else now + ttl."""
+        today = datetime.now(timezone.utc).strftime('%Y%m%d')
+        end = str(params.get('to', ''))[:8]
+        # A listing with no captures is empty or just the JSON header row
+        if end and end < today and len(rows) > 1:
+            return None
+        return now + self.ttl
+
+    def get(self, params: Dict) -> Optional[List]:
+        """Return the cached listing for params, or None on a miss."""
+        key = self.make_key(params)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT body, expires_at FROM cdx_cache WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None or (row[1] is not None and row[1] < now):
+                self.misses += 1
+                METRICS.increment('cdx_cache.misses')
+                return None
+            self._conn.execute('UPDATE cdx_cache SET last_access = ? WHERE key = ?', (now, key))
+            self._conn.commit()
+            self.hits += 1
+        METRICS.increment('cdx_cache.hits')
+        return json.loads(zlib.decompress(row[0]))
+
+    def put(self, params: Dict, rows: List):
+        """Store a listing and evict old entries if the cache is over budget."""
+        key = self.make_key(params)
+        body = zlib.compress(json.dumps(rows, separators=(',', ':')).encode('utf-8'))
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO cdx_cache (key, body, size, expires_at, last_access) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (key, body, len(body), self._expires_at(params, rows, now), now)
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """Drop expired entries, then least recently used ones until under max_bytes."""
+        self._conn.execute('DELETE FROM cdx_cache WHERE expires_at IS NOT NULL AND expires_at < ?',
+                           (time.time(),))
+        total = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM cdx_cache').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = 0
+        for key, size in self._conn.execute(
+                'SELECT key, size FROM cdx_cache ORDER BY last_access').fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conn.execute('DELETE FROM cdx_cache WHERE key = ?', (key,))
+            total -= size
+            evicted += 1
+        logging.info(f"Evicted {evicted} CDX cache entries to stay under {self.max_bytes} bytes")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,134 @@
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Hashable, Iterator, List, Optional, Tuple, Union
+from urllib.parse import urlparse
+
+import requests
+
+from cdx_cache import CDXCache
+from http_client import HEADERS, RETRY_STATUS_CODES, TIMEOUT, create_session
+from instrumentation import METRICS
+
+CDX_URL = "https://web.archive.org/cdx/search/cdx"
+
+class TokenBucket:
+    """Thread-safe token bucket used as a global request rate limit"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else 1.0
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available, then consume it"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+class CDXFetcher:
+    """Concurrent Wayback CDX client with a global rate limit, per-host
+    concurrency cap and retry-with-backoff on 429/5xx responses"""
+
+    def __init__(self, rate: float = 1.0, burst: float = 1.0, max_workers: int = 8,
+                 per_host: int = 2, max_retries: int = 4, backoff: float = 1.0,
+                 timeout: Union[float, Tuple[float, float]] = TIMEOUT, cdx_url: str = CDX_URL,
+                 session: Optional[requests.Session] = None,
+                 cache: Optional[CDXCache] = None):
+        self.bucket = TokenBucket(rate, burst)
+        self.max_workers = max_workers
+        self.per_host = per_host
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.cdx_url = cdx_url
+        # Retries are handled here so each attempt goes back through the rate limiter
+        self.session = session or create_session(retries=False, pool_maxsize=max(max_workers, per_host))
+        self.cache = cache
+        self._host_limits: Dict[str, threading.BoundedSemaphore] = {}
+        self._host_lock = threading.Lock()
+
+    def _host_limit(self, url: str) -> threading.BoundedSemaphore:
+        host = urlparse(url).netloc
+        with self._host_lock:
+            if host not in self._host_limits:
+                self._host_limits[host] = threading.BoundedSemaphore(self.per_host)
+            return self._host_limits[host]
+
+    def _retry_delay(self, attempt: int, response: Optional[requests.Response]) -> float:
+        """Exponential backoff with jitter, honouring Retry-After when given"""
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after and retry_after.isdigit():
+                return float(retry_after)
+        delay = self.backoff * (2 ** attempt)
+        return delay + random.uniform(0, delay / 2)
+
+    def fetch(self, params: Dict) -> List:
+        """Fetch one CDX listing. Returns [] if the request ultimately fails."""
+        if self.cache is not None:
+            cached = self.cache.get(params)
+            if cached is not None:
+                return cached
+
+        host_limit = self._host_limit(self.cdx_url)
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            response = None
+            try:
+                with host_limit, METRICS.timer('cdx.request', site=params.get('url')):
+                    response = self.session.get(self.cdx_url, params=params,
+                                                headers=HEADERS, timeout=self.timeout)
+                METRICS.increment('cdx.requests')
+                METRICS.increment('cdx.bytes', len(response.content))
+                if response.status_code not in RETRY_STATUS_CODES:
+                    response.raise_for_status()
+                    # CDX returns an empty body rather than [] when nothing matches
+                    rows = response.json() if response.content.strip() else []
+                    if self.cache is not None:
+                        self.cache.put(params, rows)
+                    return rows
+                error = f"HTTP {response.status_code}"
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                error = str(e)
+            except (requests.exceptions.RequestException, ValueError) as e:
+                logging.error(f"Error querying Wayback CDX for {params.get('url')}: {e}")
+                METRICS.increment('cdx.failures')
+                return []
+
+            if attempt == self.max_retries:
+                break
+            delay = self._retry_delay(attempt, response)
+            METRICS.increment('cdx.retries')
+            logging.warning(f"CDX query for {params.get('url')} failed ({error}), "
+                            f"retrying in {delay:.1f}s ({attempt + 1}/{self.max_retries})")
+            time.sleep(delay)
+
+        METRICS.increment('cdx.failures')
+        logging.error(f"Giving up on CDX query for {params.get('url')} after "
+                      f"{self.max_retries + 1} attempts: {error}")
+        return []
+
+    def fetch_many(self, jobs: Dict[Hashable, Dict]) -> Dict[Hashable, List]:
+        """Fetch several CDX listings concurrently, keyed like the input"""
+        return dict(self.iter_fetch(jobs))
+
+    def iter_fetch(self, jobs: Dict[Hashable, Dict]) -> Iterator[Tuple[Hashable, List]]:
+        """Fetch several CDX listings concurrently, yielding (key, rows) as each completes"""
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {pool.submit(self.fetch, params): key for key, params in jobs.items()}
+            for future in as_completed(futures):
+                yield futures[future], future.result()
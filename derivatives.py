@@ -0,0 +1,209 @@
+import argparse
+import json
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image
+
+from process_first_url import DEVICE_SCALE_FACTOR, VIEWPORT, screenshot_paths
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+DERIVATIVES_DIR = 'screenshots/derivatives'
+
+# Widths of the above-the-fold derivatives; captures are 3840px wide at 2x scale
+DERIVATIVE_WIDTHS = (1920, 1280, 640)
+DERIVATIVE_FORMATS = ('webp', 'jpeg')
+# Time-grid thumbnail, WebP only
+THUMBNAIL_WIDTH = 320
+QUALITY = {'webp': 80, 'jpeg': 82}
+EXTENSIONS = {'webp': '.webp', 'jpeg': '.jpg'}
+
+# What to do with the full-page PNG: keep it, replace it with a smaller copy, or delete it
+FULL_PAGE_MODES = ('keep', 'downsample', 'drop')
+FULL_PAGE_WIDTH = 1280
+# Largest dimensions the encoders accept; taller pages fall back to JPEG, then get cropped
+WEBP_MAX_DIMENSION = 16383
+JPEG_MAX_DIMENSION = 65500
+
+# A long homepage's full-page capture is taller than Pillow's decompression-bomb
+# limit allows at this width (it refuses anything over ~179M pixels, about 46,600px
+# tall here). Our own screenshots may be as tall as the tallest page a downsampled
+# copy can keep; other images keep Pillow's limit.
+CAPTURE_WIDTH = int(VIEWPORT['width'] * DEVICE_SCALE_FACTOR)
+MAX_CAPTURE_PIXELS = CAPTURE_WIDTH * JPEG_MAX_DIMENSION * CAPTURE_WIDTH // FULL_PAGE_WIDTH
+# Image.MAX_IMAGE_PIXELS is global, so only one thread raises it at a time
+_pixel_limit_lock = threading.Lock()
+
+def open_capture(path: str):
+    """Image.open for one of our screenshots, with the pixel limit raised to
+    MAX_CAPTURE_PIXELS only while its size is checked."""
+    with _pixel_limit_lock:
+        default_limit = Image.MAX_IMAGE_PIXELS
+        Image.MAX_IMAGE_PIXELS = MAX_CAPTURE_PIXELS
+        try:
+            return Image.open(path)
+        finally:
+            Image.MAX_IMAGE_PIXELS = default_limit
+
+def image_info(path: str) -> Dict:
+    with open_capture(path) as img:
+        width, height = img.size
+    return {'path': path, 'width': width, 'height': height, 'bytes': os.path.getsize(path)}
+
+def resize_to_width(img, width: int):
+    """Downscale img to width keeping its aspect ratio (never upscales)."""
+    if img.width <= width:
+        return img
+    height = max(1, round(img.height * width / img.width))
+    # reducing_gap does a fast integer reduce before the final Lanczos pass
+    return img.resize((width, height), Image.LANCZOS, reducing_gap=3.0)
+
+def save_image(img, path: str, fmt: str) -> Dict:
+    if fmt == 'jpeg' and img.mode != 'RGB':
+        img = img.convert('RGB')
+    options = {'method': 4} if fmt == 'webp' else {'optimize': True}
+    img.save(path, format=fmt.upper(), quality=QUALITY[fmt], **options)
+    return {'path': path, 'width': img.width, 'height': img.height, 'bytes': os.path.getsize(path)}
+
+def derivative_path(site: str, timestamp: str, name: str, fmt: str, directory: str = DERIVATIVES_DIR) -> str:
+    return os.path.join(directory, f'{site}_{timestamp}_{name}{EXTENSIONS[fmt]}')
+
+def make_screenshot_derivatives(site: str, timestamp: str, widths: Tuple[int, ...] = DERIVATIVE_WIDTHS,
+                                formats: Tuple[str, ...] = DERIVATIVE_FORMATS,
+                                directory: str = DERIVATIVES_DIR) -> Dict[str, Dict]:
+    """Write resized WebP/JPEG copies and a grid thumbnail of the above-the-fold
+    screenshot. Returns {name: {path, width, height, bytes}}."""
+    screenshot_path, _ = screenshot_paths(site, timestamp)
+    os.makedirs(directory, exist_ok=True)
+    derivatives = {}
+    with open_capture(screenshot_path) as source:
+        source.load()
+        # Resize from the previous (larger) size rather than the full capture each time
+        img = source
+        for width in sorted(widths, reverse=True):
+            img = resize_to_width(img, width)
+            for fmt in formats:
+                name = f'w{width}'
+                derivatives[f'{name}.{fmt}'] = save_image(
+                    img, derivative_path(site, timestamp, name, fmt, directory), fmt)
+        thumbnail = resize_to_width(img, THUMBNAIL_WIDTH)
+        derivatives['thumb.webp'] = save_image(
+            thumbnail, derivative_path(site, timestamp, 'thumb', 'webp', directory), 'webp')
+    return derivatives
+
+def shrink_full_page(site: str, timestamp: str, mode: str,
+                     directory: str = DERIVATIVES_DIR) -> Optional[Dict]:
+    """Apply the full-page mode. Returns info on the full-page image kept, if any."""
+    _, full_page_path = screenshot_paths(site, timestamp)
+    if not os.path.exists(full_page_path):
+        return None
+    if mode == 'keep':
+        return image_info(full_page_path)
+    if mode == 'drop':
+        os.remove(full_page_path)
+        return None
+
+    os.makedirs(directory, exist_ok=True)
+    with open_capture(full_page_path) as source:
+        img = resize_to_width(source, FULL_PAGE_WIDTH)
+        fmt = 'webp' if img.height <= WEBP_MAX_DIMENSION else 'jpeg'
+        if img.height > JPEG_MAX_DIMENSION:
+            img = img.crop((0, 0, img.width, JPEG_MAX_DIMENSION))
+        info = save_image(img, derivative_path(site, timestamp, 'full', fmt, directory), fmt)
+    os.remove(full_page_path)
+    return info
+
+def generate_derivatives(site: str, timestamp: str, full_page: str = 'keep',
+                         directory: str = DERIVATIVES_DIR) -> Dict:
+    """Create every derivative of a capture's screenshots and report image sizes.
+
+    A capture whose above-the-fold screenshot is kept only as a reference to an
+    earlier one has no derivatives of its own, but its full-page mode is applied.
+    """
+    if full_page not in FULL_PAGE_MODES:
+        raise ValueError(f"Unknown full-page mode: {full_page}")
+
+    screenshot_path, full_page_path = screenshot_paths(site, timestamp)
+    original_bytes = sum(os.path.getsize(path) for path in (screenshot_path, full_page_path)
+                         if os.path.exists(path))
+
+    has_screenshot = os.path.exists(screenshot_path)
+    images = {
+        'screenshot': image_info(screenshot_path) if has_screenshot else None,
+        'derivatives': make_screenshot_derivatives(site, timestamp, directory=directory) if has_screenshot else {},
+    }
+    images['full_page'] = shrink_full_page(site, timestamp, full_page, directory)
+    images['original_bytes'] = original_bytes
+    return images
+
+def record_image_sizes(site: str, timestamp: str, images: Dict):
+    """Add the image sizes to the capture's metadata file, if it has one."""
+    metadata_file = f'screenshots/{site}_{timestamp}_metadata.json'
+    if not os.path.exists(metadata_file):
+        return
+    with open(metadata_file, 'r') as f:
+        metadata = json.load(f)
+    metadata['images'] = images
+    with open(metadata_file, 'w') as f:
+        json.dump(metadata, f, indent=2)
+
+SCREENSHOT_FILE = re.compile(r'^(?P<site>[^_]+)_(?P<timestamp>\d{14})(?:_full)?\.png$')
+
+def find_screenshots(directory: str = 'screenshots') -> List[Tuple[str, str]]:
+    """Return (site, timestamp) for every capture with a screenshot in directory,
+    including those whose above-the-fold image is only a reference."""
+    captures = []
+    for name in sorted(os.listdir(directory)):
+        match = SCREENSHOT_FILE.match(name)
+        if match and (match.group('site'), match.group('timestamp')) not in captures[-1:]:
+            captures.append((match.group('site'), match.group('timestamp')))
+    return captures
+
+def process_capture(capture: Tuple[str, str], full_page: str = 'keep') -> Tuple[str, str, Optional[Dict], Optional[str]]:
+    """Generate derivatives for one capture. Runs in a worker process."""
+    site, timestamp = capture
+    try:
+        images = generate_derivatives(site, timestamp, full_page)
+        record_image_sizes(site, timestamp, images)
+        return site, timestamp, images, None
+    except Exception as e:
+        return site, timestamp, None, str(e)
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate WebP/JPEG derivatives and thumbnails of screenshots')
+    parser.add_argument('--workers', type=int, help='Worker processes (default: CPU count)')
+    parser.add_argument('--full-page', choices=FULL_PAGE_MODES, default='keep',
+                        help='Keep, downsample or drop the full-page PNG')
+    args = parser.parse_args()
+
+    captures = find_screenshots()
+    if not captures:
+        raise FileNotFoundError("No screenshots found in screenshots/")
+
+    workers = args.workers or os.cpu_count() or 1
+    original_bytes = derivative_bytes = errors = 0
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for site, timestamp, images, error in pool.map(process_capture, captures,
+                                                       [args.full_page] * len(captures)):
+            if error:
+                errors += 1
+                logging.error(f"Failed to process {site} {timestamp}: {error}")
+                continue
+            original_bytes += images['original_bytes']
+            derivative_bytes += sum(d['bytes'] for d in images['derivatives'].values())
+    elapsed = time.perf_counter() - start
+
+    logging.info(f"Processed {len(captures) - errors} of {len(captures)} captures in {elapsed:.1f}s; "
+                 f"{original_bytes / 1_000_000:.1f} MB of PNGs, "
+                 f"{derivative_bytes / 1_000_000:.1f} MB of derivatives")
+
+if __name__ == '__main__':
+    main()
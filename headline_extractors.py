@@ -1,12 +1,85 @@
 from abc import ABC, abstractmethod
-from bs4 import BeautifulSoup
-from typing import Dict, List, Optional
+from bs4 import BeautifulSoup, FeatureNotFound, SoupStrainer
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, List, Optional, Type
 import logging
+import threading
 from urllib.parse import urljoin
 import unicodedata
 
+# BeautifulSoup parser backends, fastest first. lxml is several times faster
+# than the pure-Python html.parser on multi-megabyte homepages, but repairs
+# malformed markup differently, so it is opt-in.
+PARSER_BACKENDS = ['lxml', 'html.parser', 'html5lib']
+# Backend the extractors were written against
+DEFAULT_PARSER = 'html.parser'
+
+@lru_cache(maxsize=None)
+def available_parsers() -> List[str]:
+    """Return the installed parser backends, fastest first"""
+    available = []
+    for name in PARSER_BACKENDS:
+        try:
+            BeautifulSoup('', name)
+        except FeatureNotFound:
+            continue
+        available.append(name)
+    return available
+
+def make_soup(html: str, parser: Optional[str] = None,
+              parse_only: Optional[SoupStrainer] = None) -> BeautifulSoup:
+    """Parse HTML for the extractors with parser, html.parser by default.
+
+    With parse_only, only matching elements (and their descendants) are built
+    into the tree. html5lib does not support this and parses everything.
+    """
+    return BeautifulSoup(html, parser or DEFAULT_PARSER, parse_only=parse_only)
+
+# Replace common Unicode quotes and apostrophes with ASCII versions. Chained
+# str.replace over this tuple benchmarks faster than str.translate, whose
+# per-character dict lookups dominate on non-ASCII text.
+CLEAN_TEXT_REPLACEMENTS = (
+    ('\u2018', "'"),  # Left single quote
+    ('\u2019', "'"),  # Right single quote
+    ('\u201C', '"'),  # Left double quote
+    ('\u201D', '"'),  # Right double quote
+    ('\u2013', '-'),  # En dash
+    ('\u2014', '--'), # Em dash
+)
+
+# Cleaned strings to memoize; kickers and section labels repeat across
+# snapshots. Set to 0 to disable.
+CLEAN_TEXT_CACHE_SIZE = 4096
+
+def clean_text(text: str) -> str:
+    """Clean and normalize text content"""
+    if not text:
+        return text
+
+    # ASCII is unchanged by the replacements and by NFKC normalization
+    if text.isascii():
+        return ' '.join(text.split())
+
+    for old, new in CLEAN_TEXT_REPLACEMENTS:
+        text = text.replace(old, new)
+    # Normalize remaining unicode characters
+    text = unicodedata.normalize('NFKC', text)
+    # Remove extra whitespace
+    return ' '.join(text.split())
+
+_clean_text_cached = lru_cache(maxsize=CLEAN_TEXT_CACHE_SIZE)(clean_text)
+
 class HeadlineExtractor(ABC):
     """Abstract base class for source-specific headline extractors"""
+
+    # Number of top headlines each extractor returns
+    max_headlines = 3
+    # Elements the extractor reads; None means it needs the whole document
+    parse_only: Optional[SoupStrainer] = None
+
+    def parse(self, html: str, parser: Optional[str] = None) -> BeautifulSoup:
+        """Parse only the parts of the page this extractor looks at"""
+        return make_soup(html, parser, self.parse_only)
     
     @abstractmethod
     def extract_headlines(self, soup: BeautifulSoup, base_url: str) -> List[Dict]:
@@ -15,30 +88,56 @@ class HeadlineExtractor(ABC):
         
     def clean_text(self, text: str) -> str:
         """Clean and normalize text content"""
-        if not text:
-            return text
-            
-        # Replace common Unicode quotes and apostrophes with ASCII versions
-        replacements = {
-            '\u2018': "'",  # Left single quote
-            '\u2019': "'",  # Right single quote
-            '\u201C': '"',  # Left double quote
-            '\u201D': '"',  # Right double quote
-            '\u2013': '-',  # En dash
-            '\u2014': '--', # Em dash
-        }
-        
-        for old, new in replacements.items():
-            text = text.replace(old, new)
-            
-        # Normalize remaining unicode characters
-        text = unicodedata.normalize('NFKC', text)
-        # Remove extra whitespace
-        text = ' '.join(text.split())
-        return text
+        return _clean_text_cached(text)
+
+# Registered extractor classes, alias -> source mapping and lazily built instances
+_EXTRACTOR_CLASSES: Dict[str, Type[HeadlineExtractor]] = {}
+_SOURCE_ALIASES: Dict[str, str] = {}
+_EXTRACTOR_INSTANCES: Dict[str, HeadlineExtractor] = {}
+_registry_lock = threading.Lock()
+
+def _source_key(source: str) -> str:
+    """Reduce a site name, host or (Wayback) URL to a bare name like 'cnn'"""
+    source = source.strip().lower()
+    # Unwrap Wayback URLs: web.archive.org/web/<timestamp>/<original url>
+    if 'archive.org/web/' in source:
+        source = source.split('archive.org/web/', 1)[1].partition('/')[2]
+    if '://' in source:
+        source = source.split('://', 1)[1]
+    host = source.split('/', 1)[0].split(':', 1)[0]
+    if host.startswith('www.'):
+        host = host[4:]
+    if host.endswith('.com'):
+        host = host[:-4]
+    return host
+
+def normalize_source(source: str) -> str:
+    """Map a site name, host, URL or alias to its registered source name"""
+    key = _source_key(source)
+    return _SOURCE_ALIASES.get(key, key)
+
+def register_extractor(source: str, aliases: Iterable[str] = ()) -> Callable[[Type[HeadlineExtractor]], Type[HeadlineExtractor]]:
+    """Class decorator registering an extractor for a source and its aliases"""
+    def decorator(cls: Type[HeadlineExtractor]) -> Type[HeadlineExtractor]:
+        with _registry_lock:
+            _EXTRACTOR_CLASSES[source] = cls
+            _EXTRACTOR_INSTANCES.pop(source, None)
+            for alias in aliases:
+                _SOURCE_ALIASES[_source_key(alias)] = source
+        return cls
+    return decorator
+
+def registered_sources() -> List[str]:
+    """Return the names of all sources with a registered extractor"""
+    return sorted(_EXTRACTOR_CLASSES)
 
+@register_extractor('cnn', aliases=['edition.cnn.com', 'us.cnn.com'])
 class CNNHeadlineExtractor(HeadlineExtractor):
     """CNN-specific headline extraction"""
+
+    # Subheadlines are looked up on each link's parent, whose markup varies,
+    # so CNN pages are parsed in full
+    parse_only = None
     
     def extract_headlines(self, soup: BeautifulSoup, base_url: str) -> List[Dict]:
         headlines = []
@@ -80,17 +179,24 @@ class CNNHeadlineExtractor(HeadlineExtractor):
                         'subheadline': subheadline,
                         'url': article_url
                     })
+                    if len(headlines) >= self.max_headlines:
+                        break
             
             # Sort headlines by their position in the HTML (earlier = higher priority)
             # And limit to top 3 main headlines
-            return headlines[:3]
+            return headlines[:self.max_headlines]
             
         except Exception as e:
             logging.error(f"Error extracting CNN headlines: {e}")
             return []
 
+@register_extractor('foxnews', aliases=['fox'])
 class FoxNewsHeadlineExtractor(HeadlineExtractor):
     """Fox News-specific headline extraction"""
+
+    # Keeping <main> preserves the main-content lookup; bare <article>s cover
+    # the fallback for pages without one
+    parse_only = SoupStrainer(['main', 'article'])
     
     def extract_headlines(self, soup: BeautifulSoup, base_url: str) -> List[Dict]:
         headlines = []
@@ -150,17 +256,22 @@ class FoxNewsHeadlineExtractor(HeadlineExtractor):
                         'editorial_tag': editorial_tag,
                         'url': article_url
                     })
+                    if len(headlines) >= self.max_headlines:
+                        break
             
             # Sort headlines by their position in the HTML (earlier = higher priority)
             # And limit to top 3 main headlines
-            return headlines[:3]
+            return headlines[:self.max_headlines]
             
         except Exception as e:
             logging.error(f"Error extracting Fox News headlines: {e}")
             return []
 
+@register_extractor('nytimes', aliases=['nyt', 'nyti.ms'])
 class NYTHeadlineExtractor(HeadlineExtractor):
     """New York Times-specific headline extraction"""
+
+    parse_only = SoupStrainer('section', class_='story-wrapper')
     
     def extract_headlines(self, soup: BeautifulSoup, base_url: str) -> List[Dict]:
         headlines = []
@@ -184,16 +295,21 @@ class NYTHeadlineExtractor(HeadlineExtractor):
                         'subheadline': None,  # NYT doesn't seem to have these in the new layout
                         'editorial_tag': None
                     })
+                    if len(headlines) >= self.max_headlines:
+                        break
             
             # Return top 3 headlines as before
-            return headlines[:3]
+            return headlines[:self.max_headlines]
             
         except Exception as e:
             logging.error(f"Error extracting NYT headlines: {e}")
             return []
 
+@register_extractor('washingtonpost', aliases=['wapo', 'wapo.st'])
 class WaPoHeadlineExtractor(HeadlineExtractor):
     """Washington Post-specific headline extraction"""
+
+    parse_only = SoupStrainer(['div', 'article'], class_=['headline', 'story-headline', 'article-headline', 'story'])
     
     def extract_headlines(self, soup: BeautifulSoup, base_url: str) -> List[Dict]:
         headlines = []
@@ -235,26 +351,33 @@ class WaPoHeadlineExtractor(HeadlineExtractor):
                     'editorial_tag': None,
                     'url': article_url
                 })
+                if len(headlines) >= self.max_headlines:
+                    break
             
             # Return top 3 headlines
-            return headlines[:3]
+            return headlines[:self.max_headlines]
             
         except Exception as e:
             logging.error(f"Error extracting Washington Post headlines: {e}")
             return []
 
 def get_extractor(source: str) -> Optional[HeadlineExtractor]:
-    """Factory function to get the appropriate extractor"""
+    """Factory function to get the appropriate extractor.
+
+    Accepts a site name ('cnn.com'), host ('www.cnn.com'), alias ('wapo')
+    or Wayback URL. One instance per source is created on first use and
+    reused afterwards.
+    """
     # Normalize source name
-    source = source.lower()
-    if source.endswith('.com'):
-        source = source[:-4]
-        
-    extractors = {
-        'cnn': CNNHeadlineExtractor(),
-        'foxnews': FoxNewsHeadlineExtractor(),
-        'nytimes': NYTHeadlineExtractor(),
-        'washingtonpost': WaPoHeadlineExtractor(),
-        # Add more sources here as they're implemented
-    }
-    return extractors.get(source) 
\ No newline at end of file
+    source = normalize_source(source)
+    extractor = _EXTRACTOR_INSTANCES.get(source)
+    if extractor is not None:
+        return extractor
+
+    with _registry_lock:
+        cls = _EXTRACTOR_CLASSES.get(source)
+        if cls is None:
+            return None
+        if source not in _EXTRACTOR_INSTANCES:
+            _EXTRACTOR_INSTANCES[source] = cls()
+        return _EXTRACTOR_INSTANCES[source]
@@ -0,0 +1,306 @@
+import argparse
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+DEFAULT_INDEX_PATH = 'cache/headlines.db'
+
+METADATA_FILE = re.compile(r'^(?P<site>[^_]+)_(?P<timestamp>\d{14})_metadata\.json$')
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS captures (
+        id INTEGER PRIMARY KEY,
+        site TEXT NOT NULL,
+        timestamp TEXT NOT NULL,
+        url TEXT,
+        UNIQUE (site, timestamp)
+    );
+    CREATE INDEX IF NOT EXISTS idx_captures_timestamp ON captures (timestamp);
+    CREATE TABLE IF NOT EXISTS headlines (
+        id INTEGER PRIMARY KEY,
+        capture_id INTEGER NOT NULL REFERENCES captures (id) ON DELETE CASCADE,
+        position INTEGER NOT NULL,
+        headline TEXT NOT NULL,
+        subheadline TEXT,
+        url TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_headlines_capture ON headlines (capture_id, position);
+    CREATE VIRTUAL TABLE IF NOT EXISTS headlines_fts USING fts5 (
+        headline, subheadline, content='headlines', content_rowid='id'
+    );
+    -- New rows are added to the full-text index in bulk after each batch
+    -- (several times faster than a per-row insert trigger); deletes go here
+    CREATE TRIGGER IF NOT EXISTS headlines_ad AFTER DELETE ON headlines BEGIN
+        INSERT INTO headlines_fts (headlines_fts, rowid, headline, subheadline)
+        VALUES ('delete', old.id, old.headline, coalesce(old.subheadline, ''));
+    END;
+    CREATE TABLE IF NOT EXISTS ingested_files (
+        path TEXT PRIMARY KEY,
+        mtime REAL NOT NULL
+    );
+    -- Captures identical to an earlier one of the same site, indexed with its
+    -- headlines whenever that capture is (re)indexed
+    CREATE TABLE IF NOT EXISTS duplicates (
+        site TEXT NOT NULL,
+        timestamp TEXT NOT NULL,
+        duplicate_of TEXT NOT NULL,
+        url TEXT,
+        PRIMARY KEY (site, timestamp)
+    );
+    CREATE INDEX IF NOT EXISTS idx_duplicates_of ON duplicates (site, duplicate_of);
+'''
+
+RESULT_COLUMNS = ('site', 'timestamp', 'position', 'headline', 'subheadline', 'url')
+
+class HeadlineIndex:
+    """SQLite index of extracted headlines with FTS5 search over their text.
+
+    Each (site, timestamp) capture is upserted as a whole, so re-ingesting a
+    capture after fixing an extractor replaces its headlines, and those of
+    any duplicates of it.
+    """
+
+    def __init__(self, path: str = DEFAULT_INDEX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA foreign_keys = ON')
+        self._conn.execute('PRAGMA journal_mode = WAL')
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    def _upsert(self, site: str, timestamp: str, headlines: List[Dict],
+                url: Optional[str]) -> List[Tuple[int, str, str]]:
+        """Replace one capture's headlines, returning (id, headline, subheadline)
+        of the rows inserted."""
+        self._conn.execute('''
+            INSERT INTO captures (site, timestamp, url) VALUES (?, ?, ?)
+            ON CONFLICT (site, timestamp) DO UPDATE SET url = excluded.url
+        ''', (site, timestamp, url))
+        capture_id = self._conn.execute('SELECT id FROM captures WHERE site = ? AND timestamp = ?',
+                                        (site, timestamp)).fetchone()[0]
+        self._conn.execute('DELETE FROM headlines WHERE capture_id = ?', (capture_id,))
+        inserted = []
+        for position, h in enumerate(headlines):
+            if not h.get('headline'):
+                continue
+            row_id = self._conn.execute(
+                'INSERT INTO headlines (capture_id, position, headline, subheadline, url) VALUES (?, ?, ?, ?, ?)',
+                (capture_id, position, h['headline'], h.get('subheadline'), h.get('url'))).lastrowid
+            inserted.append((row_id, h['headline'], h.get('subheadline') or ''))
+        return inserted
+
+    def upsert(self, site: str, timestamp: str, headlines: List[Dict], url: Optional[str] = None):
+        """Insert or replace the headlines of one capture."""
+        self.upsert_many([(site, timestamp, headlines, url)])
+
+    def upsert_many(self, captures: Iterable[Tuple[str, str, List[Dict], Optional[str]]]) -> int:
+        """Upsert (site, timestamp, headlines, url) tuples in a single transaction."""
+        count = 0
+        with self._lock:
+            with self._conn:
+                inserted = []
+                for site, timestamp, headlines, url in captures:
+                    self._conn.execute('DELETE FROM duplicates WHERE site = ? AND timestamp = ?', (site, timestamp))
+                    inserted.extend(self._upsert(site, timestamp, headlines, url))
+                    for duplicate, duplicate_url in self._conn.execute(
+                            'SELECT timestamp, url FROM duplicates WHERE site = ? AND duplicate_of = ?',
+                            (site, timestamp)).fetchall():
+                        inserted.extend(self._upsert(site, duplicate, headlines, duplicate_url))
+                    count += 1
+                self._conn.executemany('INSERT INTO headlines_fts (rowid, headline, subheadline) VALUES (?, ?, ?)',
+                                       inserted)
+        return count
+
+    def add_duplicates(self, duplicates: Iterable[Tuple[str, str, str, Optional[str]]]) -> int:
+        """Record (site, timestamp, duplicate_of, url) captures as identical to an
+        earlier capture of the site. They get its headlines now if it is indexed,
+        or once it is. Returns the number recorded."""
+        count = 0
+        with self._lock:
+            with self._conn:
+                inserted = []
+                for site, timestamp, duplicate_of, url in duplicates:
+                    self._conn.execute('''
+                        INSERT OR REPLACE INTO duplicates (site, timestamp, duplicate_of, url) VALUES (?, ?, ?, ?)
+                    ''', (site, timestamp, duplicate_of, url))
+                    rows = self._conn.execute('''
+                        SELECT h.headline, h.subheadline, h.url FROM captures c
+                        JOIN headlines h ON h.capture_id = c.id
+                        WHERE c.site = ? AND c.timestamp = ? ORDER BY h.position
+                    ''', (site, duplicate_of)).fetchall()
+                    if rows:
+                        headlines = [dict(zip(('headline', 'subheadline', 'url'), row)) for row in rows]
+                        inserted.extend(self._upsert(site, timestamp, headlines, url))
+                    count += 1
+                self._conn.executemany('INSERT INTO headlines_fts (rowid, headline, subheadline) VALUES (?, ?, ?)',
+                                       inserted)
+        return count
+
+    def ingest_directory(self, directory: str = 'screenshots', force: bool = False) -> int:
+        """Load every *_metadata.json in directory, skipping files unchanged since
+        the last ingest. Duplicate pointers are indexed with the headlines of the
+        capture they point to, and follow it when it changes. Returns the number
+        of captures upserted."""
+        with self._lock:
+            seen = dict(self._conn.execute('SELECT path, mtime FROM ingested_files'))
+
+        captures, duplicates, ingested = [], [], []
+        for name in sorted(os.listdir(directory)):
+            match = METADATA_FILE.match(name)
+            if not match:
+                continue
+            path = os.path.join(directory, name)
+            mtime = os.path.getmtime(path)
+            if not force and seen.get(path) == mtime:
+                continue
+            metadata = load_metadata(path)
+            if metadata is None:
+                continue
+            pointer = metadata.get('duplicate_of')
+            if pointer:
+                duplicates.append((match.group('site'), match.group('timestamp'), pointer['timestamp'],
+                                   metadata.get('url')))
+            else:
+                captures.append((match.group('site'), match.group('timestamp'),
+                                 metadata.get('headlines') or [], metadata.get('url')))
+            ingested.append((path, mtime))
+
+        count = self.upsert_many(captures) + self.add_duplicates(duplicates)
+        with self._lock:
+            with self._conn:
+                self._conn.executemany('INSERT OR REPLACE INTO ingested_files (path, mtime) VALUES (?, ?)',
+                                       ingested)
+        return count
+
+    def _query(self, sql: str, params: Iterable) -> List[Dict]:
+        with self._lock:
+            rows = self._conn.execute(sql, list(params)).fetchall()
+        return [dict(zip(RESULT_COLUMNS, row)) for row in rows]
+
+    def search(self, query: str, site: Optional[str] = None, start: Optional[str] = None,
+               end: Optional[str] = None, limit: int = 50) -> List[Dict]:
+        """Full-text search over headlines and subheadlines, best matches first.
+
+        query uses FTS5 syntax (e.g. 'budget AND senate', '"border wall"').
+        start and end are timestamp prefixes such as '20240410'.
+        """
+        sql = '''
+            SELECT c.site, c.timestamp, h.position, h.headline, h.subheadline, h.url
+            FROM headlines_fts
+            JOIN headlines h ON h.id = headlines_fts.rowid
+            JOIN captures c ON c.id = h.capture_id
+            WHERE headlines_fts MATCH ?
+        '''
+        filters, params = time_filters(site, start, end)
+        sql += ''.join(' AND ' + f for f in filters) + ' ORDER BY bm25(headlines_fts), c.timestamp LIMIT ?'
+        return self._query(sql, [query, *params, limit])
+
+    def leads(self, date: str, site: Optional[str] = None) -> List[Dict]:
+        """The lead (first) headline of every capture on a YYYYMMDD date."""
+        filters, params = time_filters(site, date, date)
+        sql = '''
+            SELECT c.site, c.timestamp, h.position, h.headline, h.subheadline, h.url
+            FROM captures c
+            JOIN headlines h ON h.capture_id = c.id AND h.position = 0
+            WHERE ''' + ' AND '.join(filters) + ' ORDER BY c.site, c.timestamp'
+        return self._query(sql, params)
+
+    def first_appearance(self, query: str, site: Optional[str] = None) -> List[Dict]:
+        """The earliest capture per site with a headline matching query."""
+        filters, params = time_filters(site, None, None)
+        sql = '''
+            SELECT site, timestamp, position, headline, subheadline, url FROM (
+                SELECT c.site, c.timestamp, h.position, h.headline, h.subheadline, h.url,
+                       ROW_NUMBER() OVER (PARTITION BY c.site ORDER BY c.timestamp, h.position) AS n
+                FROM headlines_fts
+                JOIN headlines h ON h.id = headlines_fts.rowid
+                JOIN captures c ON c.id = h.capture_id
+                WHERE headlines_fts MATCH ?''' + ''.join(' AND ' + f for f in filters) + '''
+            ) WHERE n = 1 ORDER BY timestamp
+        '''
+        return self._query(sql, [query, *params])
+
+    def stats(self) -> Dict:
+        with self._lock:
+            captures = self._conn.execute('SELECT COUNT(*) FROM captures').fetchone()[0]
+            headlines = self._conn.execute('SELECT COUNT(*) FROM headlines').fetchone()[0]
+        return {'captures': captures, 'headlines': headlines}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def time_filters(site: Optional[str], start: Optional[str], end: Optional[str]) -> Tuple[List[str], List[str]]:
+    """SQL conditions on the captures table (aliased c) for a site and timestamp range."""
+    filters, params = ['1'], []
+    if site:
+        filters.append('c.site = ?')
+        params.append(site)
+    if start:
+        filters.append('c.timestamp >= ?')
+        params.append(start.ljust(14, '0'))
+    if end:
+        filters.append('c.timestamp <= ?')
+        params.append(end.ljust(14, '9'))
+    return filters, params
+
+def load_metadata(path: str) -> Optional[Dict]:
+    """Read a metadata file or duplicate pointer, or None if it cannot be read."""
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logging.warning(f"Skipping {path}: {e}")
+        return None
+
+def print_results(results: List[Dict]):
+    for r in results:
+        print(f"{r['timestamp']}  {r['site']:<20} #{r['position'] + 1}  {r['headline']}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Build and query the headline index')
+    parser.add_argument('--index', default=DEFAULT_INDEX_PATH, help='Index database path')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    ingest_parser = subparsers.add_parser('ingest', help='Load new or changed *_metadata.json files')
+    ingest_parser.add_argument('directory', nargs='?', default='screenshots')
+    ingest_parser.add_argument('--force', action='store_true', help='Re-ingest unchanged files too')
+    search_parser = subparsers.add_parser('search', help='Full-text search over headlines')
+    search_parser.add_argument('query', help='FTS5 query, e.g. \'"border wall" OR immigration\'')
+    search_parser.add_argument('--site')
+    search_parser.add_argument('--from', dest='start', help='Earliest timestamp or date (YYYYMMDD)')
+    search_parser.add_argument('--to', dest='end', help='Latest timestamp or date (YYYYMMDD)')
+    search_parser.add_argument('--limit', type=int, default=50)
+    leads_parser = subparsers.add_parser('leads', help='What each source led with on a date')
+    leads_parser.add_argument('date', help='YYYYMMDD')
+    leads_parser.add_argument('--site')
+    first_parser = subparsers.add_parser('first', help='When a story first appeared on each source')
+    first_parser.add_argument('query')
+    first_parser.add_argument('--site')
+    args = parser.parse_args()
+
+    index = HeadlineIndex(args.index)
+    if args.command == 'ingest':
+        count = index.ingest_directory(args.directory, args.force)
+        stats = index.stats()
+        logging.info(f"Upserted {count} captures; index holds {stats['headlines']} headlines "
+                     f"from {stats['captures']} captures")
+    elif args.command == 'search':
+        print_results(index.search(args.query, args.site, args.start, args.end, args.limit))
+    elif args.command == 'leads':
+        print_results(index.leads(args.date, args.site))
+    elif args.command == 'first':
+        print_results(index.first_appearance(args.query, args.site))
+    index.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+import threading
+from typing import Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from instrumentation import METRICS
+
+HEADERS = {
+    "User-Agent": "NewsLensBot/0.1 (+https://github.com/yourusername/newslens; contact: your@email.com)"
+}
+
+# (connect, read) timeouts in seconds; a stalled archive response fails instead of hanging
+TIMEOUT: Tuple[float, float] = (10, 60)
+
+# Keep-alive connections kept open per host; sized for the pipeline's fetch workers
+POOL_CONNECTIONS = 10
+POOL_MAXSIZE = 16
+
+# Responses worth retrying: rate limiting and transient server errors
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+MAX_RETRIES = 4
+BACKOFF_FACTOR = 1.0
+BACKOFF_JITTER = 0.5
+
+# Bodies are read in chunks and capped so a runaway response can't exhaust memory
+CHUNK_SIZE = 64 * 1024
+MAX_BODY_BYTES = 50 * 1024 * 1024
+
+def accept_encoding() -> str:
+    """Content codings we can decode; brotli only if a decoder is installed."""
+    try:
+        import brotli  # noqa: F401
+        return 'gzip, deflate, br'
+    except ImportError:
+        return 'gzip, deflate'
+
+def create_session(retries: bool = True, pool_maxsize: int = POOL_MAXSIZE) -> requests.Session:
+    """Build a session with pooled keep-alive connections and compression.
+
+    With retries, idempotent requests are retried on connection errors and
+    429/5xx responses with jittered exponential backoff, honouring
+    Retry-After. Callers with their own retry loop (such as CDXFetcher,
+    which must re-enter its rate limiter) should pass retries=False.
+    """
+    retry = Retry(
+        total=MAX_RETRIES,
+        connect=MAX_RETRIES,
+        read=MAX_RETRIES,
+        status=MAX_RETRIES,
+        status_forcelist=RETRY_STATUS_CODES,
+        allowed_methods=frozenset({'GET', 'HEAD'}),
+        backoff_factor=BACKOFF_FACTOR,
+        backoff_jitter=BACKOFF_JITTER,
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    ) if retries else Retry(total=0, raise_on_status=False)
+
+    adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=pool_maxsize,
+                          max_retries=retry)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers.update(HEADERS)
+    session.headers['Accept-Encoding'] = accept_encoding()
+    return session
+
+_shared_session: Optional[requests.Session] = None
+_shared_lock = threading.Lock()
+
+def get_session() -> requests.Session:
+    """Process-wide session (with retries) shared by every archive fetch."""
+    global _shared_session
+    with _shared_lock:
+        if _shared_session is None:
+            _shared_session = create_session()
+        return _shared_session
+
+def fetch_response(url: str, session: Optional[requests.Session] = None,
+                   timeout: Tuple[float, float] = TIMEOUT,
+                   max_bytes: int = MAX_BODY_BYTES) -> Tuple[requests.Response, bytes]:
+    """GET url and return the (closed) response with its decoded body bytes,
+    streaming the body in chunks.
+
+    Raises requests.exceptions.HTTPError for error statuses and
+    requests.exceptions.RequestException if the body exceeds max_bytes.
+    """
+    session = session or get_session()
+    with METRICS.timer('http.fetch'), session.get(url, timeout=timeout, stream=True) as response:
+        retries = response.raw.retries
+        if retries is not None and retries.history:
+            METRICS.increment('http.retries', len(retries.history))
+        METRICS.increment('http.requests')
+        response.raise_for_status()
+        chunks, size = [], 0
+        for chunk in response.iter_content(CHUNK_SIZE):
+            size += len(chunk)
+            if size > max_bytes:
+                raise requests.exceptions.RequestException(
+                    f"Response from {url} exceeds {max_bytes} bytes")
+            chunks.append(chunk)
+        # Bytes on the wire (compressed) versus after decoding
+        METRICS.increment('http.bytes', response.raw.tell())
+        METRICS.increment('http.decoded_bytes', size)
+        return response, b''.join(chunks)
+
+def fetch_text(url: str, session: Optional[requests.Session] = None,
+               timeout: Tuple[float, float] = TIMEOUT, max_bytes: int = MAX_BODY_BYTES) -> str:
+    """GET url and return its decoded body as text (see fetch_response)."""
+    response, body = fetch_response(url, session, timeout, max_bytes)
+    return body.decode(response.encoding or 'utf-8', errors='replace')
@@ -0,0 +1,203 @@
+import contextlib
+import cProfile
+import json
+import logging
+import pstats
+import threading
+import time
+from typing import Dict, Optional
+
+try:
+    import pyinstrument
+except ImportError:  # optional dependency, cProfile is used without it
+    pyinstrument = None
+
+# Structured events go to their own logger so they can be routed to a file
+# without touching the human-readable log
+event_logger = logging.getLogger('newslens.metrics')
+event_logger.propagate = False
+
+class TimerStats:
+    """Count and total/min/max duration of one timed operation"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = float('inf')
+        self.max = 0.0
+
+    def add(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+
+    def summary(self) -> Dict:
+        return {
+            'count': self.count,
+            'total_seconds': round(self.total, 4),
+            'avg_seconds': round(self.total / self.count, 4) if self.count else None,
+            'min_seconds': round(self.min, 4) if self.count else None,
+            'max_seconds': round(self.max, 4),
+        }
+
+class Metrics:
+    """Thread-safe timers and counters for a run.
+
+    Timer and counter names are dotted, e.g. 'cdx.request' or 'http.bytes'.
+    Every observation is also emitted as a JSON event when an event log is
+    enabled with enable_event_log().
+    """
+
+    def __init__(self):
+        self._timers: Dict[str, TimerStats] = {}
+        self._counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.started = time.perf_counter()
+
+    def record_time(self, name: str, seconds: float, **fields):
+        with self._lock:
+            self._timers.setdefault(name, TimerStats()).add(seconds)
+        emit('timer', name=name, seconds=round(seconds, 4), **fields)
+
+    @contextlib.contextmanager
+    def timer(self, name: str, **fields):
+        """Time the enclosed block, recording it even if it raises."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_time(name, time.perf_counter() - started, **fields)
+
+    def increment(self, name: str, amount: int = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def counter(self, name: str) -> int:
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def summary(self) -> Dict:
+        with self._lock:
+            counters = dict(self._counters)
+            summary = {
+                'elapsed_seconds': round(time.perf_counter() - self.started, 3),
+                'timers': {name: stats.summary() for name, stats in sorted(self._timers.items())},
+                'counters': dict(sorted(counters.items())),
+            }
+        # Hit rate for every '<prefix>.hits' / '<prefix>.misses' pair
+        for name, hits in counters.items():
+            if name.endswith('.hits'):
+                prefix = name[:-len('.hits')]
+                lookups = hits + counters.get(prefix + '.misses', 0)
+                summary.setdefault('hit_rates', {})[prefix] = round(hits / lookups, 3) if lookups else None
+        return summary
+
+    def reset(self):
+        with self._lock:
+            self._timers.clear()
+            self._counters.clear()
+            self.started = time.perf_counter()
+
+    def log_summary(self):
+        """Log the run summary as one human-readable line per timer plus a JSON event."""
+        summary = self.summary()
+        for name, stats in summary['timers'].items():
+            logging.info(f"{name}: {stats['count']} calls, {stats['total_seconds']}s total, "
+                         f"{stats['avg_seconds']}s avg, {stats['max_seconds']}s max")
+        if summary['counters']:
+            logging.info(f"Counters: {summary['counters']}")
+        for prefix, rate in summary.get('hit_rates', {}).items():
+            logging.info(f"{prefix} hit rate: {rate}")
+        emit('summary', **summary)
+
+# Shared by every module so one run produces one summary
+METRICS = Metrics()
+
+def emit(event: str, **fields):
+    """Write a structured JSON event if an event log is enabled."""
+    if event_logger.handlers:
+        event_logger.info(json.dumps({'event': event, 'time': time.time(),
+                                      'thread': threading.current_thread().name, **fields}))
+
+def enable_event_log(path: Optional[str] = None):
+    """Send JSON events (one per line) to path, or to stderr if path is None."""
+    handler = logging.FileHandler(path) if path else logging.StreamHandler()
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    event_logger.addHandler(handler)
+    event_logger.setLevel(logging.INFO)
+
+class ExtractionProfiler:
+    """Accumulates profiles of every extraction call, from any thread.
+
+    Uses pyinstrument when requested and installed, otherwise cProfile; the
+    combined profile is written by save(). Extractions are profiled one at a
+    time, since Python 3.12+ allows only one active cProfile profiler, so
+    profiling serializes extraction across threads.
+    """
+
+    def __init__(self, output: str, use_pyinstrument: bool = False):
+        if use_pyinstrument and pyinstrument is None:
+            raise RuntimeError("pyinstrument is not installed")
+        self.output = output
+        self.use_pyinstrument = use_pyinstrument
+        self._stats: Optional[pstats.Stats] = None
+        self._session = None
+        self._lock = threading.Lock()
+        # Held for the whole profiled span, separately from the results lock
+        self._profile_lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def profile(self):
+        with self._profile_lock:
+            yield from self._profile()
+
+    def _profile(self):
+        if self.use_pyinstrument:
+            profiler = pyinstrument.Profiler(async_mode='disabled')
+            profiler.start()
+            try:
+                yield
+            finally:
+                session = profiler.stop()
+                with self._lock:
+                    self._session = session if self._session is None else \
+                        pyinstrument.session.Session.combine(self._session, session)
+            return
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            with self._lock:
+                if self._stats is None:
+                    self._stats = pstats.Stats(profiler)
+                else:
+                    self._stats.add(profiler)
+
+    def save(self):
+        with self._lock:
+            if self._session is not None:
+                renderer = pyinstrument.renderers.HTMLRenderer()
+                with open(self.output, 'w') as f:
+                    f.write(renderer.render(self._session))
+            elif self._stats is not None:
+                self._stats.dump_stats(self.output)
+            else:
+                return
+        logging.info(f"Extraction profile saved to {self.output}")
+
+# Set by scripts that were asked to profile extraction
+_extraction_profiler: Optional[ExtractionProfiler] = None
+
+def set_extraction_profiler(profiler: Optional[ExtractionProfiler]):
+    global _extraction_profiler
+    _extraction_profiler = profiler
+
+def profile_extraction():
+    """Context manager profiling an extraction call if profiling is enabled."""
+    if _extraction_profiler is None:
+        return contextlib.nullcontext()
+    return _extraction_profiler.profile()
@@ -0,0 +1,669 @@
+import argparse
+import functools
+import hashlib
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+import requests
+
+from artifact_store import ArtifactStore
+from browser_pool import BrowserService
+from derivatives import FULL_PAGE_MODES, generate_derivatives, record_image_sizes
+from headline_extractors import available_parsers
+from headline_index import HeadlineIndex
+from instrumentation import METRICS, ExtractionProfiler, emit, enable_event_log, set_extraction_profiler
+from process_first_url import (
+    extract_metadata,
+    fetch_html,
+    find_latest_snapshot_file,
+    parse_html,
+    save_duplicate_pointer,
+    save_metadata,
+    screenshot_paths,
+    set_warc_replay,
+    set_warc_writer,
+    take_screenshot,
+)
+from story_tracker import StoryTracker
+from visual_change import (
+    NEAR_DUPLICATE_THRESHOLD,
+    VisualIndex,
+    compare_screenshots,
+    record_visual_change,
+    refresh_screenshots,
+)
+from warc_archive import WarcIndex, WarcWriter
+
+# Marks the end of the job stream on a queue
+_DONE = object()
+
+# Parts of a Wayback page that differ between captures of identical HTML: the
+# playback scripts and toolbar it injects, its archival comments, and the
+# capture timestamp in every rewritten URL
+WAYBACK_HEAD_INSERT = re.compile(r'<script[^>]*bundle-playback\.js.*?<!-- End Wayback Rewrite JS Include -->', re.S)
+WAYBACK_TOOLBAR_INSERT = re.compile(r'<!-- BEGIN WAYBACK TOOLBAR INSERT -->.*?<!-- END WAYBACK TOOLBAR INSERT -->',
+                                    re.S)
+HTML_COMMENT = re.compile(r'<!--.*?-->', re.S)
+WAYBACK_URL_TIMESTAMP = re.compile(r'/web/\d{14}([a-z]{2}_)?/')
+
+class StageStats:
+    """Throughput counters for one pipeline stage"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self.first_start: Optional[float] = None
+        self.last_end: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def record(self, started: float, finished: float, outcome: str):
+        with self._lock:
+            if self.first_start is None or started < self.first_start:
+                self.first_start = started
+            if self.last_end is None or finished > self.last_end:
+                self.last_end = finished
+            self.busy_seconds += finished - started
+            if outcome == 'ok':
+                self.processed += 1
+            elif outcome == 'dropped':
+                self.dropped += 1
+            else:
+                self.errors += 1
+
+    def summary(self) -> Dict:
+        wall = (self.last_end - self.first_start) if self.first_start is not None else 0.0
+        handled = self.processed + self.dropped + self.errors
+        return {
+            'stage': self.name,
+            'processed': self.processed,
+            'dropped': self.dropped,
+            'errors': self.errors,
+            'busy_seconds': round(self.busy_seconds, 3),
+            'wall_seconds': round(wall, 3),
+            'items_per_second': round(handled / wall, 3) if wall > 0 else None,
+            'avg_seconds_per_item': round(self.busy_seconds / handled, 3) if handled else None,
+        }
+
+class Stage:
+    """A pipeline step run by a fixed number of worker threads.
+
+    func receives a job dict and returns the (possibly updated) job to pass
+    downstream, or None to drop it from the pipeline.
+    """
+
+    def __init__(self, name: str, func: Callable[[Dict], Optional[Dict]], workers: int = 1):
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.stats = StageStats(name)
+
+class Pipeline:
+    """Runs jobs through a chain of stages connected by bounded queues"""
+
+    def __init__(self, stages: List[Stage], queue_size: int = 8):
+        self.stages = stages
+        self.queue_size = queue_size
+
+    def _worker(self, stage: Stage, inbox: queue.Queue, outbox: Optional[queue.Queue]):
+        while True:
+            job = inbox.get()
+            if job is _DONE:
+                # Hand the sentinel to the next worker of this stage
+                inbox.put(_DONE)
+                return
+
+            started = time.perf_counter()
+            try:
+                result = stage.func(job)
+                outcome = 'ok' if result is not None else 'dropped'
+            except Exception as e:
+                logging.error(f"[{stage.name}] {job['site']} {job['timestamp']} failed: {e}")
+                result, outcome = None, 'error'
+            stage.stats.record(started, time.perf_counter(), outcome)
+
+            if result is not None and outbox is not None:
+                outbox.put(result)
+
+    def run(self, jobs: List[Dict]) -> List[Dict]:
+        """Process all jobs and return per-stage throughput summaries."""
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        threads_by_stage = []
+        for i, stage in enumerate(self.stages):
+            outbox = queues[i + 1] if i + 1 < len(self.stages) else None
+            threads = [
+                threading.Thread(target=self._worker, args=(stage, queues[i], outbox),
+                                 name=f"{stage.name}-{n}", daemon=True)
+                for n in range(stage.workers)
+            ]
+            for thread in threads:
+                thread.start()
+            threads_by_stage.append(threads)
+
+        for job in jobs:
+            queues[0].put(job)
+        queues[0].put(_DONE)
+
+        # Close each stage once all of its workers have drained their input
+        for i, threads in enumerate(threads_by_stage):
+            for thread in threads:
+                thread.join()
+            if i + 1 < len(queues):
+                queues[i + 1].put(_DONE)
+
+        return [stage.stats.summary() for stage in self.stages]
+
+def load_snapshot_jobs(snapshot_file: str) -> List[Dict]:
+    """Turn every site/timestamp entry of a snapshot file into a pipeline job."""
+    with open(snapshot_file, 'r') as f:
+        data = json.load(f)
+
+    jobs = []
+    for site, snapshots in data.items():
+        for timestamp, snapshot in snapshots.items():
+            jobs.append({
+                'site': site,
+                'timestamp': timestamp,
+                'url': snapshot['url'],
+                'digest': snapshot.get('digest')
+            })
+    return jobs
+
+def load_warc_jobs(index: WarcIndex) -> List[Dict]:
+    """A job for every capture whose page is in a WARC archive."""
+    return [{'site': site, 'timestamp': timestamp, 'url': url}
+            for site, timestamp, url, *_ in index.pages()]
+
+def split_duplicate_jobs(jobs: List[Dict]) -> Tuple[List[Dict], List[Dict]]:
+    """Split jobs into unique captures and ones whose CDX digest matches an
+    earlier capture of the same site. Duplicates get a 'duplicate_of' timestamp."""
+    first_by_digest: Dict[Tuple[str, str], str] = {}
+    unique, duplicates = [], []
+    for job in sorted(jobs, key=lambda j: (j['site'], j['timestamp'])):
+        key = (job['site'], job.get('digest'))
+        if job.get('digest') and key in first_by_digest:
+            job['duplicate_of'] = first_by_digest[key]
+            duplicates.append(job)
+            continue
+        if job.get('digest'):
+            first_by_digest[key] = job['timestamp']
+        unique.append(job)
+    return unique, duplicates
+
+def content_hash(html: str) -> str:
+    """SHA-256 of a page's HTML without the parts the Wayback Machine adds per capture."""
+    html = WAYBACK_TOOLBAR_INSERT.sub('', WAYBACK_HEAD_INSERT.sub('', html))
+    html = WAYBACK_URL_TIMESTAMP.sub(r'/web/\1/', HTML_COMMENT.sub('', html))
+    return hashlib.sha256(html.encode('utf-8')).hexdigest()
+
+class ContentIndex:
+    """Thread-safe record of the earliest capture seen for each (site, HTML hash)"""
+
+    def __init__(self):
+        self._first: Dict[Tuple[str, str], str] = {}
+        self._lock = threading.Lock()
+
+    def claim(self, site: str, content_hash: str, timestamp: str) -> Optional[str]:
+        """Register a capture; return the earlier timestamp if its content was already seen.
+
+        Pages are fetched concurrently, so a later slot may claim first. An
+        earlier one then takes over as the original and is processed too,
+        rather than becoming a pointer forward in time.
+        """
+        with self._lock:
+            first = self._first.get((site, content_hash))
+            if first is not None and first < timestamp:
+                return first
+            self._first[(site, content_hash)] = timestamp
+        return None
+
+def record_duplicate(job: Dict, duplicate_of: str, store: Optional[ArtifactStore] = None,
+                     headline_index: Optional[HeadlineIndex] = None, **fingerprints):
+    """Record an unchanged capture as a pointer file, or as index entries
+    sharing the earlier capture's blobs when an artifact store is used. It is
+    also indexed with the earlier capture's headlines."""
+    if store is None:
+        save_duplicate_pointer(job['site'], job['timestamp'], job['url'], duplicate_of, **fingerprints)
+    else:
+        store.link(job['site'], job['timestamp'], duplicate_of)
+    if headline_index is not None:
+        headline_index.add_duplicates([(job['site'], job['timestamp'], duplicate_of, job['url'])])
+
+def fetch_stage(job: Dict, content_index: Optional[ContentIndex] = None,
+                store: Optional[ArtifactStore] = None,
+                headline_index: Optional[HeadlineIndex] = None) -> Optional[Dict]:
+    try:
+        job['html'] = fetch_html(job['url'], job['site'], job['timestamp'])
+    except requests.exceptions.RequestException as e:
+        logging.error(f"Error fetching page: {e}")
+        return None
+
+    job['content_hash'] = content_hash(job['html'])
+    if content_index is not None:
+        duplicate_of = content_index.claim(job['site'], job['content_hash'], job['timestamp'])
+        if duplicate_of:
+            record_duplicate(job, duplicate_of, store, headline_index,
+                             digest=job.get('digest'), content_hash=job['content_hash'])
+            return None
+    return job
+
+def parse_stage(job: Dict, parser: Optional[str] = None) -> Dict:
+    job['soup'] = parse_html(job['html'], parser, job['site'])
+    return job
+
+def extract_stage(job: Dict, store: Optional[ArtifactStore] = None,
+                  headline_index: Optional[HeadlineIndex] = None) -> Dict:
+    metadata = extract_metadata(job.pop('soup'), job['url'], job['site'])
+    if metadata:
+        metadata['digest'] = job.get('digest')
+        metadata['content_hash'] = job.get('content_hash')
+        if headline_index is not None:
+            headline_index.upsert(job['site'], job['timestamp'], metadata['headlines'], job['url'])
+        if store is None:
+            save_metadata(job['site'], job['timestamp'], metadata, job['html'])
+        else:
+            store.put_artifact(job['site'], job['timestamp'], 'metadata',
+                               json.dumps(metadata, indent=2).encode('utf-8'))
+            store.put_artifact(job['site'], job['timestamp'], 'raw_html', job['html'].encode('utf-8'))
+    job['metadata'] = metadata
+    return job
+
+def screenshot_stage(job: Dict) -> Dict:
+    job.pop('html', None)
+    take_screenshot(job['url'], job['site'], job['timestamp'])
+    return job
+
+def make_pooled_screenshot_stage(browser: BrowserService, serve_html: bool = False) -> Callable[[Dict], Dict]:
+    """Screenshot stage that reuses pages from a long-lived browser service.
+
+    With serve_html, the browser is handed the HTML fetched earlier in the
+    pipeline instead of downloading the page a second time.
+    """
+    def pooled_screenshot_stage(job: Dict) -> Dict:
+        html = job.pop('html', None)
+        job['screenshot'] = browser.screenshot(job['url'], job['site'], job['timestamp'],
+                                               html if serve_html else None)
+        return job
+    return pooled_screenshot_stage
+
+def make_render_stage(browser: BrowserService) -> Callable[[Dict], Optional[Dict]]:
+    """Fetch stage that navigates the browser once, taking the screenshots and
+    keeping the rendered DOM for the extractors."""
+    def render_stage(job: Dict) -> Optional[Dict]:
+        html = browser.render(job['url'], job['site'], job['timestamp'])
+        if html is None:
+            return None
+        job['html'] = html
+        return job
+    return render_stage
+
+def make_derivatives_stage(full_page: str = 'keep', store: Optional[ArtifactStore] = None) -> Callable[[Dict], Dict]:
+    """Stage writing WebP/JPEG derivatives and a thumbnail of each screenshot
+    and recording image sizes in the capture's metadata."""
+    def derivatives_stage(job: Dict) -> Dict:
+        if not any(os.path.exists(path) for path in screenshot_paths(job['site'], job['timestamp'])):
+            return job
+        images = generate_derivatives(job['site'], job['timestamp'], full_page)
+        job['images'] = images
+        if store is None:
+            record_image_sizes(job['site'], job['timestamp'], images)
+        elif job.get('metadata'):
+            job['metadata']['images'] = stored_images(images, image_artifacts(job['site'], job['timestamp'], images))
+            store.put_artifact(job['site'], job['timestamp'], 'metadata',
+                               json.dumps(job['metadata'], indent=2).encode('utf-8'))
+        return job
+    return derivatives_stage
+
+def save_visual(site: str, timestamp: str, visual: Dict, store: Optional[ArtifactStore] = None):
+    """Record screenshot comparisons in a capture's metadata and, in the store,
+    point each near-duplicate at the image it matches."""
+    if store is None:
+        record_visual_change(site, timestamp, visual)
+        return
+    for kind, result in visual.items():
+        if result['duplicate_of']:
+            store.link_artifact(site, timestamp, kind, result['duplicate_of'])
+    data = store.get_artifact(site, timestamp, 'metadata')
+    if data is None:
+        return
+    metadata = json.loads(data)
+    metadata['visual'] = {**metadata.get('visual', {}), **visual}
+    store.put_artifact(site, timestamp, 'metadata', json.dumps(metadata, indent=2).encode('utf-8'))
+
+def make_visual_stage(index: VisualIndex, store: Optional[ArtifactStore] = None,
+                      in_flight: Optional[Set[Tuple[str, str]]] = None) -> Callable[[Dict], Dict]:
+    """Stage scoring each screenshot against the site's previous slot and
+    replacing near-duplicates with references to the image they match.
+    Captures compared are added to in_flight until make_visual_order_stage
+    sees them."""
+    def visual_stage(job: Dict) -> Dict:
+        visual = compare_screenshots(index, job['site'], job['timestamp'])
+        if not visual:
+            return job
+        job['visual'] = visual
+        if in_flight is not None:
+            in_flight.add((job['site'], job['timestamp']))
+        if store is None:
+            record_visual_change(job['site'], job['timestamp'], visual)
+            return job
+        for kind, result in visual.items():
+            if result['duplicate_of']:
+                store.link_artifact(job['site'], job['timestamp'], kind, result['duplicate_of'])
+        if job.get('metadata'):
+            job['metadata']['visual'] = visual
+            store.put_artifact(job['site'], job['timestamp'], 'metadata',
+                               json.dumps(job['metadata'], indent=2).encode('utf-8'))
+        return job
+    return visual_stage
+
+def make_visual_order_stage(index: VisualIndex, in_flight: Set[Tuple[str, str]],
+                            store: Optional[ArtifactStore] = None) -> Callable[[Dict], Dict]:
+    """Stage comparing each capture's screenshots again once it is finished.
+
+    It runs after the image stages and on one worker, as captures finish out
+    of order: a capture is compared again with the slot now before it, and the
+    site's next slot, if already finished, is compared again with it.
+    """
+    def visual_order_stage(job: Dict) -> Dict:
+        site, timestamp = job['site'], job['timestamp']
+        if (site, timestamp) not in in_flight:
+            return job
+        in_flight.discard((site, timestamp))
+        visual = refresh_screenshots(index, site, timestamp)
+        if any(job['visual'].get(kind, {}).get(field) != value
+               for kind, result in visual.items() for field, value in result.items()):
+            job['visual'] = {**job['visual'], **visual}
+            save_visual(site, timestamp, visual, store)
+        later = index.next_timestamp(site, timestamp)
+        if later and (site, later) not in in_flight:
+            save_visual(site, later, refresh_screenshots(index, site, later), store)
+        return job
+    return visual_order_stage
+
+def update_metadata(site: str, timestamp: str, updates: Dict, store: Optional[ArtifactStore] = None):
+    """Merge updates into a capture's saved metadata, if it has any."""
+    if store is None:
+        metadata_file = f'screenshots/{site}_{timestamp}_metadata.json'
+        if not os.path.exists(metadata_file):
+            return
+        with open(metadata_file, 'r') as f:
+            metadata = json.load(f)
+        metadata.update(updates)
+        with open(metadata_file, 'w') as f:
+            json.dump(metadata, f, indent=2)
+        return
+    data = store.get_artifact(site, timestamp, 'metadata')
+    if data is None:
+        return
+    metadata = json.loads(data)
+    metadata.update(updates)
+    store.put_artifact(site, timestamp, 'metadata', json.dumps(metadata, indent=2).encode('utf-8'))
+
+def make_stories_stage(tracker: StoryTracker, store: Optional[ArtifactStore] = None) -> Callable[[Dict], Dict]:
+    """Stage adding story ids and the changes since the site's previous slot to
+    each capture's metadata.
+
+    It runs last and on one worker, as captures finish out of order: when an
+    earlier slot is tracked after a later one, the later slot's changes are
+    rewritten against it.
+    """
+    def stories_stage(job: Dict) -> Dict:
+        metadata = job.get('metadata')
+        if not metadata:
+            return job
+        metadata['changes'] = tracker.process(job['site'], job['timestamp'], metadata['headlines'])
+        update_metadata(job['site'], job['timestamp'],
+                        {'headlines': metadata['headlines'], 'changes': metadata['changes']}, store)
+        later = tracker.next_capture(job['site'], job['timestamp'])
+        if later:
+            update_metadata(job['site'], later, {'changes': tracker.changes(job['site'], later)}, store)
+        return job
+    return stories_stage
+
+def image_artifacts(site: str, timestamp: str, images: Dict) -> Dict[str, str]:
+    """The artifact kind each image file of a capture is stored as, by path."""
+    screenshot_path, full_page_path = screenshot_paths(site, timestamp)
+    kinds = {screenshot_path: 'screenshot', full_page_path: 'full_page'}
+    for name, info in (images.get('derivatives') or {}).items():
+        kinds[info['path']] = name
+    full_page = images.get('full_page')
+    if full_page and full_page['path'] != full_page_path:
+        kinds[full_page['path']] = 'full_page.' + full_page['path'].rsplit('.', 1)[1]
+    return kinds
+
+def stored_images(images: Dict, kinds: Dict[str, str]) -> Dict:
+    """Image sizes with each file's path, gone once it is moved into the store,
+    replaced by the artifact kind it is stored as."""
+    def stored(info: Optional[Dict]) -> Optional[Dict]:
+        if info is None:
+            return None
+        info = dict(info)
+        info['artifact'] = kinds[info.pop('path')]
+        return info
+    return {**images, 'screenshot': stored(images['screenshot']), 'full_page': stored(images['full_page']),
+            'derivatives': {name: stored(info) for name, info in images['derivatives'].items()}}
+
+def store_screenshots(func: Callable[[Dict], Optional[Dict]], store: ArtifactStore) -> Callable[[Dict], Optional[Dict]]:
+    """Wrap the last stage that writes images so the screenshots and any
+    derivatives are moved into the artifact store."""
+    def stage(job: Dict) -> Optional[Dict]:
+        result = func(job)
+        for path, kind in image_artifacts(job['site'], job['timestamp'], job.get('images') or {}).items():
+            if os.path.exists(path):
+                # WebP and JPEG are already compressed
+                store.put_file(job['site'], job['timestamp'], kind, path, remove=True,
+                               codec=None if path.endswith('.png') else 'none')
+        return result
+    return stage
+
+# How each page is downloaded:
+#   requests  - fetch with requests for extraction, browser downloads it again
+#   intercept - fetch once with requests, serve that HTML to the browser
+#   browser   - navigate once in the browser and extract from the rendered DOM
+FETCH_MODES = ('requests', 'intercept', 'browser')
+
+def build_pipeline(fetch_workers: int = 4, parse_workers: int = 2, extract_workers: int = 2,
+                   screenshot_workers: int = 2, screenshots: bool = True,
+                   queue_size: int = 8, browser: Optional[BrowserService] = None,
+                   fetch_mode: str = 'requests', parser: Optional[str] = None,
+                   dedup: bool = True, store: Optional[ArtifactStore] = None,
+                   derivatives: bool = False, derivative_workers: int = 2,
+                   full_page: str = 'keep', headline_index: Optional[HeadlineIndex] = None,
+                   story_tracker: Optional[StoryTracker] = None,
+                   visual_index: Optional[VisualIndex] = None) -> Pipeline:
+    """Build the fetch -> parse -> extract -> screenshot pipeline.
+
+    When a browser service is given, screenshots are taken on its page pool
+    instead of launching a new browser per capture. The intercept and browser
+    fetch modes need a browser service and download each page only once.
+    With dedup, pages whose HTML matches an earlier capture of the same site
+    are recorded as pointers after fetching instead of being processed again.
+    With a store, artifacts go into the compressed artifact store instead of
+    loose files in screenshots/. With derivatives, a final stage writes
+    resized WebP/JPEG copies of the screenshots and applies the full_page mode.
+    Extracted headlines are also upserted into headline_index if one is given,
+    and captures recorded as duplicates are indexed with their original's.
+    With a story_tracker, each capture's metadata gets story ids and the changes
+    since the previous capture of its site. With a visual_index, screenshots
+    get a visual-change score and near-duplicates are kept only as references;
+    a final stage rescores captures that finished out of order.
+    """
+    if fetch_mode not in FETCH_MODES:
+        raise ValueError(f"Unknown fetch mode: {fetch_mode}")
+    if fetch_mode != 'requests' and (browser is None or not screenshots):
+        raise ValueError(f"Fetch mode {fetch_mode} requires a browser service and screenshots")
+    parse = functools.partial(parse_stage, parser=parser)
+    fetch = functools.partial(fetch_stage, content_index=ContentIndex() if dedup else None, store=store,
+                              headline_index=headline_index)
+    extract = functools.partial(extract_stage, store=store, headline_index=headline_index)
+
+    if full_page not in FULL_PAGE_MODES:
+        raise ValueError(f"Unknown full-page mode: {full_page}")
+
+    if fetch_mode == 'browser':
+        stages = [
+            Stage('render', make_render_stage(browser), screenshot_workers),
+            Stage('parse', parse, parse_workers),
+            Stage('extract', extract, extract_workers),
+        ]
+        image_stage = stages[0]
+    else:
+        stages = [
+            Stage('fetch', fetch, fetch_workers),
+            Stage('parse', parse, parse_workers),
+            Stage('extract', extract, extract_workers),
+        ]
+        image_stage = None
+        if screenshots:
+            if browser:
+                screenshot = make_pooled_screenshot_stage(browser, serve_html=fetch_mode == 'intercept')
+            else:
+                screenshot = screenshot_stage
+            image_stage = Stage('screenshot', screenshot, screenshot_workers)
+            stages.append(image_stage)
+
+    visual_in_flight: Set[Tuple[str, str]] = set()
+    if image_stage is not None and visual_index is not None:
+        # Before derivatives, so none are made for near-duplicates
+        image_stage = Stage('visual', make_visual_stage(visual_index, store, visual_in_flight))
+        stages.append(image_stage)
+    if image_stage is not None and derivatives:
+        image_stage = Stage('derivatives', make_derivatives_stage(full_page, store), derivative_workers)
+        stages.append(image_stage)
+    if image_stage is not None and store is not None:
+        image_stage.func = store_screenshots(image_stage.func, store)
+    if image_stage is not None and visual_index is not None:
+        stages.append(Stage('visual-order', make_visual_order_stage(visual_index, visual_in_flight, store)))
+    if story_tracker is not None:
+        stages.append(Stage('stories', make_stories_stage(story_tracker, store)))
+    return Pipeline(stages, queue_size)
+
+def log_summary(summaries: List[Dict]):
+    """Log per-stage throughput followed by the run's timers and counters."""
+    for summary in summaries:
+        logging.info(f"Stage {summary['stage']}: {summary['processed']} ok, "
+                     f"{summary['dropped']} dropped, {summary['errors']} errors, "
+                     f"{summary['items_per_second']} items/s, "
+                     f"{summary['avg_seconds_per_item']}s/item")
+        emit('stage', **summary)
+    METRICS.log_summary()
+
+def main():
+    parser = argparse.ArgumentParser(description='Process every snapshot in a wayback_snapshots_*.json file')
+    parser.add_argument('snapshot_file', nargs='?', help='Snapshot file (default: most recent)')
+    parser.add_argument('--fetch-workers', type=int, default=4)
+    parser.add_argument('--parse-workers', type=int, default=2)
+    parser.add_argument('--extract-workers', type=int, default=2)
+    parser.add_argument('--screenshot-workers', type=int, default=2)
+    parser.add_argument('--queue-size', type=int, default=8, help='Max jobs waiting between stages')
+    parser.add_argument('--no-screenshots', action='store_true', help='Skip the screenshot stage')
+    parser.add_argument('--recycle-after', type=int, default=25,
+                        help='Replace each browser page after this many screenshots')
+    parser.add_argument('--fetch-mode', choices=FETCH_MODES, default='requests',
+                        help='intercept or browser download each page only once')
+    parser.add_argument('--parser', choices=available_parsers(),
+                        help='HTML parser backend (default: html.parser; lxml is several times faster)')
+    parser.add_argument('--block-resources', action='store_true',
+                        help='Block ads, trackers, media and the Wayback banner while rendering')
+    parser.add_argument('--no-dedup', action='store_true',
+                        help='Process captures even if their content matches an earlier one')
+    parser.add_argument('--derivatives', action='store_true',
+                        help='Write WebP/JPEG derivatives and thumbnails of each screenshot')
+    parser.add_argument('--derivative-workers', type=int, default=2)
+    parser.add_argument('--full-page', choices=FULL_PAGE_MODES, default='keep',
+                        help='With --derivatives, keep, downsample or drop the full-page PNG')
+    parser.add_argument('--headline-index', metavar='PATH',
+                        help='Also add extracted headlines to this headline index database')
+    parser.add_argument('--stories', metavar='PATH',
+                        help='Cluster headlines into stories and record changes using this database')
+    parser.add_argument('--visual-dedup', metavar='PATH',
+                        help='Score visual change between slots and keep near-duplicate screenshots '
+                             'only as references, using this hash database')
+    parser.add_argument('--visual-threshold', type=float, default=NEAR_DUPLICATE_THRESHOLD,
+                        help='Largest fraction of differing hash bits treated as a near-duplicate')
+    parser.add_argument('--warc', metavar='DIR',
+                        help='Archive every page and subresource fetched to WARC files in DIR')
+    parser.add_argument('--replay', metavar='DIR',
+                        help='Read pages and subresources from the WARC archive in DIR instead of the network '
+                             '(processes every archived capture unless a snapshot file is given)')
+    parser.add_argument('--metrics-log', metavar='PATH', help='Write structured JSON timing events to PATH')
+    parser.add_argument('--profile-extraction', metavar='PATH',
+                        help='Profile headline extraction and save the combined profile to PATH')
+    parser.add_argument('--pyinstrument', action='store_true',
+                        help='Profile with pyinstrument (HTML output) instead of cProfile')
+    parser.add_argument('--store', metavar='DIR',
+                        help='Save artifacts to a compressed artifact store instead of screenshots/')
+    args = parser.parse_args()
+
+    if args.no_screenshots and args.fetch_mode != 'requests':
+        parser.error(f'--fetch-mode {args.fetch_mode} cannot be combined with --no-screenshots')
+    if args.warc and args.replay:
+        parser.error('--warc cannot be combined with --replay')
+    if args.metrics_log:
+        enable_event_log(args.metrics_log)
+    warc_writer = WarcWriter(args.warc) if args.warc else None
+    replay = WarcIndex(args.replay) if args.replay else None
+    set_warc_writer(warc_writer)
+    set_warc_replay(replay)
+    profiler = None
+    if args.profile_extraction:
+        profiler = ExtractionProfiler(args.profile_extraction, args.pyinstrument)
+        set_extraction_profiler(profiler)
+
+    store = ArtifactStore(args.store) if args.store else None
+    headline_index = HeadlineIndex(args.headline_index) if args.headline_index else None
+    story_tracker = StoryTracker(args.stories) if args.stories else None
+    visual_index = VisualIndex(args.visual_dedup, args.visual_threshold) if args.visual_dedup else None
+    try:
+        if replay is not None and not args.snapshot_file:
+            snapshot_file = args.replay
+            jobs = load_warc_jobs(replay)
+        else:
+            snapshot_file = args.snapshot_file or find_latest_snapshot_file()
+            jobs = load_snapshot_jobs(snapshot_file)
+        if not args.no_dedup:
+            jobs, duplicates = split_duplicate_jobs(jobs)
+            for job in duplicates:
+                record_duplicate(job, job['duplicate_of'], store, headline_index, digest=job['digest'])
+            logging.info(f"Skipping {len(duplicates)} captures with unchanged CDX digests")
+        logging.info(f"Processing {len(jobs)} snapshots from {snapshot_file}")
+
+        options = dict(queue_size=args.queue_size, parser=args.parser, dedup=not args.no_dedup, store=store,
+                       derivatives=args.derivatives, derivative_workers=args.derivative_workers,
+                       full_page=args.full_page, headline_index=headline_index,
+                       story_tracker=story_tracker, visual_index=visual_index)
+        if args.no_screenshots:
+            pipeline = build_pipeline(args.fetch_workers, args.parse_workers, args.extract_workers,
+                                      screenshots=False, **options)
+            log_summary(pipeline.run(jobs))
+        else:
+            # One browser for the whole run, with a page per screenshot worker
+            with BrowserService(pool_size=args.screenshot_workers,
+                                max_jobs_per_page=args.recycle_after,
+                                block_resources=args.block_resources,
+                                warc_writer=warc_writer, replay=replay) as browser:
+                pipeline = build_pipeline(args.fetch_workers, args.parse_workers, args.extract_workers,
+                                          args.screenshot_workers, browser=browser,
+                                          fetch_mode=args.fetch_mode, **options)
+                log_summary(pipeline.run(jobs))
+
+        if profiler:
+            profiler.save()
+    finally:
+        # Flushes the last WARC record and the databases' final writes
+        set_warc_writer(None)
+        set_warc_replay(None)
+        for resource in (warc_writer, replay, store, headline_index, story_tracker, visual_index):
+            if resource is not None:
+                resource.close()
+
+if __name__ == '__main__':
+    main()
@@ -6,7 +6,12 @@ from playwright.sync_api import sync_playwright
 from datetime import datetime
 import os
 import time
-from headline_extractors import get_extractor
+from typing import Optional
+from headline_extractors import get_extractor, make_soup
+from http_client import fetch_response, fetch_text
+from instrumentation import METRICS, profile_extraction
+from resource_blocking import BlockStats, get_block_profile
+from warc_archive import WarcIndex, WarcWriter
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -14,14 +19,32 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 # Create screenshots directory at the start
 os.makedirs('screenshots', exist_ok=True)
 
-def load_first_url():
-    """Load the first URL from the most recent snapshot file."""
-    # Find the most recent snapshot file
+# Browser settings shared by every screenshot path
+BROWSER_ARGS = [
+    '--disable-gpu',
+    '--disable-dev-shm-usage',
+    '--disable-setuid-sandbox',
+    '--no-sandbox'
+]
+VIEWPORT = {'width': 1920, 'height': 1080}  # Standard desktop resolution
+DEVICE_SCALE_FACTOR = 2.0  # Higher resolution for retina displays
+NAVIGATION_TIMEOUT_MS = 120000  # 2 minutes
+
+def screenshot_paths(site: str, timestamp: str):
+    """Return the above-the-fold and full-page screenshot paths for a capture."""
+    return f'screenshots/{site}_{timestamp}.png', f'screenshots/{site}_{timestamp}_full.png'
+
+def find_latest_snapshot_file() -> str:
+    """Find the most recent wayback_snapshots_*.json file."""
     files = [f for f in os.listdir('.') if f.startswith('wayback_snapshots_') and f.endswith('.json')]
     if not files:
         raise FileNotFoundError("No snapshot files found")
-    
-    latest_file = max(files)
+    return max(files)
+
+def load_first_url():
+    """Load the first URL from the most recent snapshot file."""
+    # Find the most recent snapshot file
+    latest_file = find_latest_snapshot_file()
     with open(latest_file, 'r') as f:
         data = json.load(f)
     
@@ -35,74 +58,156 @@ def load_first_url():
     
     return url, site, first_timestamp
 
+# Set by scripts that archive fetched pages to WARC files or replay them offline
+_warc_writer: Optional[WarcWriter] = None
+_warc_replay: Optional[WarcIndex] = None
+
+def set_warc_writer(writer: Optional[WarcWriter]):
+    global _warc_writer
+    _warc_writer = writer
+
+def set_warc_replay(index: Optional[WarcIndex]):
+    global _warc_replay
+    _warc_replay = index
+
+def fetch_html(url: str, site: Optional[str] = None, timestamp: Optional[str] = None) -> str:
+    """Fetch the raw HTML of an archived page over the shared pooled session.
+
+    When replaying, the page is read from the WARC index instead (the one
+    fetched for site and timestamp if given). When a WARC writer is set, the
+    response is archived and indexed under site and timestamp.
+    """
+    if _warc_replay is not None:
+        record = (_warc_replay.page(site, timestamp) if site and timestamp else None) or _warc_replay.lookup(url)
+        if record is None:
+            raise requests.exceptions.RequestException(f"{url} is not in the WARC archive")
+        return record.text()
+    if _warc_writer is None:
+        return fetch_text(url)
+    response, body = fetch_response(url)
+    _warc_writer.write_requests_response(response, body, site, timestamp, url)
+    return body.decode(response.encoding or 'utf-8', errors='replace')
+
+def parse_html(html_content: str, parser: Optional[str] = None, site: Optional[str] = None) -> BeautifulSoup:
+    """Parse raw HTML into a BeautifulSoup tree with the given (or default) backend.
+
+    If site is given, only the elements that site's extractor reads are parsed.
+    """
+    extractor = get_extractor(site) if site else None
+    with METRICS.timer('parse', site=site):
+        if extractor:
+            return extractor.parse(html_content, parser)
+        return make_soup(html_content, parser)
+
+def extract_metadata(soup: BeautifulSoup, url: str, site: str) -> dict:
+    """Run the source-specific extractor over a parsed page and build its metadata."""
+    # Get the appropriate extractor for this source
+    extractor = get_extractor(site)
+    if not extractor:
+        logging.error(f"No extractor found for source: {site}")
+        return None
+
+    # Extract headlines using source-specific extractor
+    with METRICS.timer('extract', site=site), profile_extraction():
+        headlines = extractor.extract_headlines(soup, url)
+
+    return {
+        'headlines': headlines,
+        'timestamp': datetime.now().isoformat(),
+        'url': url
+    }
+
 def extract_headlines_and_metadata(url: str, site: str) -> dict:
     """Extract headlines and metadata from the archived page using source-specific extractor."""
-    headers = {
-        "User-Agent": "NewsLensBot/0.1 (+https://github.com/yourusername/newslens; contact: your@email.com)"
-    }
-    
     try:
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        
-        # Save the raw HTML
-        html_content = response.text
-        
-        soup = BeautifulSoup(html_content, 'html.parser')
-        
-        # Get the appropriate extractor for this source
-        extractor = get_extractor(site)
-        if not extractor:
-            logging.error(f"No extractor found for source: {site}")
-            return None, html_content
-            
-        # Extract headlines using source-specific extractor
-        headlines = extractor.extract_headlines(soup, url)
-        
-        metadata = {
-            'headlines': headlines,
-            'timestamp': datetime.now().isoformat(),
-            'url': url
-        }
-        
+        html_content = fetch_html(url)
+        metadata = extract_metadata(parse_html(html_content, site=site), url, site)
         return metadata, html_content
     
     except requests.exceptions.RequestException as e:
         logging.error(f"Error fetching page: {e}")
         return None, None
 
-def take_screenshot(url: str, site: str, timestamp: str):
-    """Take a screenshot of the archived page."""
+def save_metadata(site: str, timestamp: str, metadata: dict, html_content: str):
+    """Save extracted metadata and the raw HTML next to the screenshots."""
+    # Save metadata to JSON
+    metadata_file = f'screenshots/{site}_{timestamp}_metadata.json'
+    with open(metadata_file, 'w') as f:
+        json.dump(metadata, f, indent=2)
+    logging.info(f"Metadata saved to {metadata_file}")
+
+    # Save raw HTML
+    html_file = f'screenshots/{site}_{timestamp}_raw.html'
+    with open(html_file, 'w', encoding='utf-8') as f:
+        f.write(html_content)
+    logging.info(f"Raw HTML saved to {html_file}")
+
+def save_duplicate_pointer(site: str, timestamp: str, url: str, duplicate_of: str, **fingerprints):
+    """Record that a capture is identical to an earlier one instead of saving
+    its artifacts again. fingerprints (e.g. digest, content_hash) are stored
+    as given."""
+    screenshot_path, full_page_path = screenshot_paths(site, duplicate_of)
+    pointer = {
+        'duplicate_of': {
+            'timestamp': duplicate_of,
+            'metadata': f'screenshots/{site}_{duplicate_of}_metadata.json',
+            'raw_html': f'screenshots/{site}_{duplicate_of}_raw.html',
+            'screenshot': screenshot_path,
+            'full_page_screenshot': full_page_path
+        },
+        'timestamp': datetime.now().isoformat(),
+        'url': url,
+        **fingerprints
+    }
+    metadata_file = f'screenshots/{site}_{timestamp}_metadata.json'
+    with open(metadata_file, 'w') as f:
+        json.dump(pointer, f, indent=2)
+    logging.info(f"Unchanged since {duplicate_of}, pointer saved to {metadata_file}")
+
+def take_screenshot(url: str, site: str, timestamp: str, block_resources: bool = False):
+    """Take a screenshot of the archived page, optionally blocking ads, trackers,
+    media and the Wayback banner according to the site's blocking profile."""
     with sync_playwright() as p:
         # Launch browser with increased timeout and macOS-specific settings
         browser = p.chromium.launch(
             headless=True,  # Force headless mode
-            args=[
-                '--disable-gpu',
-                '--disable-dev-shm-usage',
-                '--disable-setuid-sandbox',
-                '--no-sandbox'
-            ]
+            args=BROWSER_ARGS
         )
         
         # Set viewport to standard desktop size
         context = browser.new_context(
-            viewport={'width': 1920, 'height': 1080},  # Standard desktop resolution
-            device_scale_factor=2.0  # Higher resolution for retina displays
+            viewport=VIEWPORT,
+            device_scale_factor=DEVICE_SCALE_FACTOR
         )
         page = context.new_page()
+
+        block_profile = get_block_profile(site) if block_resources else None
+        block_stats = BlockStats()
+        if block_profile:
+            def block_handler(route):
+                request = route.request
+                action = block_profile.decide(request.url, request.resource_type)
+                block_stats.record(request.resource_type, action)
+                if action == 'stub':
+                    route.fulfill(status=200, content_type='application/javascript', body='')
+                elif action == 'abort':
+                    route.abort()
+                else:
+                    route.fallback()
+            page.route('**/*', block_handler)
         
         try:
             logging.info(f"Navigating to URL: {url}")
             # Set navigation timeout
-            page.set_default_navigation_timeout(120000)  # 2 minutes
-            page.set_default_timeout(120000)  # 2 minutes
+            page.set_default_navigation_timeout(NAVIGATION_TIMEOUT_MS)
+            page.set_default_timeout(NAVIGATION_TIMEOUT_MS)
             
             # Navigate with retry logic
             max_retries = 3
             for attempt in range(max_retries):
                 try:
-                    response = page.goto(url, wait_until='domcontentloaded')
+                    with METRICS.timer('browser.goto', site=site):
+                        response = page.goto(url, wait_until='domcontentloaded')
                     if response and response.ok:
                         break
                     logging.warning(f"Attempt {attempt + 1} failed, retrying...")
@@ -111,6 +216,7 @@ def take_screenshot(url: str, site: str, timestamp: str):
                         raise e
                     logging.warning(f"Attempt {attempt + 1} failed: {str(e)}, retrying...")
                     time.sleep(5)
+                METRICS.increment('browser.goto_failures')
             
             # Wait for the page to load
             logging.info("Waiting for page to load...")
@@ -118,9 +224,13 @@ def take_screenshot(url: str, site: str, timestamp: str):
                 page.wait_for_selector('body', timeout=30000)
             except Exception as e:
                 logging.warning(f"Timeout waiting for body element: {str(e)}")
+
+            # Hide overlays such as the Wayback banner
+            if block_profile and block_profile.hide_css():
+                page.add_style_tag(content=block_profile.hide_css())
             
             # Take viewport-only screenshot
-            screenshot_path = f'screenshots/{site}_{timestamp}.png'
+            screenshot_path, full_page_path = screenshot_paths(site, timestamp)
             logging.info(f"Attempting to take screenshot to: {screenshot_path}")
             
             # Ensure the directory exists
@@ -129,21 +239,22 @@ def take_screenshot(url: str, site: str, timestamp: str):
             # Take screenshot with retry - only capture viewport
             for attempt in range(3):
                 try:
-                    page.screenshot(
-                        path=screenshot_path,
-                        full_page=False,  # Only capture viewport
-                        clip={
-                            'x': 0,
-                            'y': 0,
-                            'width': 1920,
-                            'height': 1080
-                        }
-                    )
+                    with METRICS.timer('browser.screenshot', site=site):
+                        page.screenshot(
+                            path=screenshot_path,
+                            full_page=False,  # Only capture viewport
+                            clip={
+                                'x': 0,
+                                'y': 0,
+                                'width': VIEWPORT['width'],
+                                'height': VIEWPORT['height']
+                            }
+                        )
                     logging.info(f"Screenshot saved successfully to {screenshot_path}")
                     
                     # Save a full-page version as well for reference
-                    full_page_path = f'screenshots/{site}_{timestamp}_full.png'
-                    page.screenshot(path=full_page_path, full_page=True)
+                    with METRICS.timer('browser.full_page_screenshot', site=site):
+                        page.screenshot(path=full_page_path, full_page=True)
                     logging.info(f"Full page screenshot saved to {full_page_path}")
                     break
                 except Exception as e:
@@ -157,6 +268,8 @@ def take_screenshot(url: str, site: str, timestamp: str):
             import traceback
             logging.error(traceback.format_exc())
         finally:
+            if block_profile:
+                block_stats.log_summary()
             try:
                 context.close()
             except Exception as e:
@@ -175,17 +288,7 @@ def main():
         # Extract headlines and metadata using source-specific extractor
         metadata, html_content = extract_headlines_and_metadata(url, site)
         if metadata:
-            # Save metadata to JSON
-            metadata_file = f'screenshots/{site}_{timestamp}_metadata.json'
-            with open(metadata_file, 'w') as f:
-                json.dump(metadata, f, indent=2)
-            logging.info(f"Metadata saved to {metadata_file}")
-            
-            # Save raw HTML
-            html_file = f'screenshots/{site}_{timestamp}_raw.html'
-            with open(html_file, 'w', encoding='utf-8') as f:
-                f.write(html_content)
-            logging.info(f"Raw HTML saved to {html_file}")
+            save_metadata(site, timestamp, metadata, html_content)
         
         # Take screenshot
         take_screenshot(url, site, timestamp)
@@ -194,6 +297,8 @@ def main():
         logging.error(f"Error in main process: {e}")
         import traceback
         logging.error(traceback.format_exc())
+    finally:
+        METRICS.log_summary()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,138 @@
+import argparse
+import glob
+import json
+import logging
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from headline_extractors import available_parsers, get_extractor
+from warc_archive import WarcIndex, read_record
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+RAW_SUFFIX = '_raw.html'
+RAW_FILE = re.compile(r'^(?P<site>[^_]+)_(?P<timestamp>\d{14})_raw\.html$')
+
+def parse_raw_filename(path: str) -> Tuple[str, str]:
+    """Split a {site}_{timestamp}_raw.html path into (site, timestamp)."""
+    match = RAW_FILE.match(os.path.basename(path))
+    if not match:
+        raise ValueError(f'Not a {{site}}_{{timestamp}}{RAW_SUFFIX} file: {os.path.basename(path)}')
+    return match.group('site'), match.group('timestamp')
+
+def page_url(path: str, site: str, timestamp: str) -> str:
+    """URL the page was captured from, used to resolve relative links."""
+    metadata_path = path[:-len(RAW_SUFFIX)] + '_metadata.json'
+    if os.path.exists(metadata_path):
+        with open(metadata_path, 'r') as f:
+            url = json.load(f).get('url')
+        if url:
+            return url
+    return f'https://web.archive.org/web/{timestamp}/https://www.{site}/'
+
+def extract_file(path: str, parser: Optional[str] = None) -> Dict:
+    """Re-run the site's extractor over one saved page. Runs in a worker process."""
+    try:
+        site, timestamp = parse_raw_filename(path)
+    except ValueError as e:
+        return {'path': path, 'error': str(e)}
+    result = {'site': site, 'timestamp': timestamp, 'path': path}
+    extractor = get_extractor(site)
+    if not extractor:
+        result['error'] = f'No extractor found for source: {site}'
+        return result
+
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            html = f.read()
+        url = page_url(path, site, timestamp)
+        result['url'] = url
+        result['headlines'] = extractor.extract_headlines(extractor.parse(html, parser), url)
+    except Exception as e:
+        result['error'] = str(e)
+    return result
+
+def extract_warc_page(page: Tuple[str, str, str, str, int, int], parser: Optional[str] = None) -> Dict:
+    """Re-run the site's extractor over a page archived in a WARC file, given as
+    a WarcIndex.pages() entry. Runs in a worker process."""
+    site, timestamp, url, path, offset, length = page
+    result = {'site': site, 'timestamp': timestamp, 'path': f'{path}@{offset}', 'url': url}
+    extractor = get_extractor(site)
+    if not extractor:
+        result['error'] = f'No extractor found for source: {site}'
+        return result
+
+    try:
+        html = read_record(path, offset, length).text()
+        result['headlines'] = extractor.extract_headlines(extractor.parse(html, parser), url)
+    except Exception as e:
+        result['error'] = str(e)
+    return result
+
+def find_raw_files(directory: str) -> List[str]:
+    return sorted(glob.glob(os.path.join(directory, '**', '*' + RAW_SUFFIX), recursive=True))
+
+def reextract(paths: List, workers: Optional[int] = None, parser: Optional[str] = None,
+              extract: Callable[..., Dict] = extract_file) -> Dict:
+    """Extract headlines from many saved pages across a process pool.
+
+    paths are raw HTML files, or WARC pages with extract=extract_warc_page.
+    Returns results grouped as {site: {timestamp: {'url', 'headlines'}}}.
+    """
+    workers = workers or os.cpu_count() or 1
+    # Batch tasks so per-task IPC overhead stays small next to parsing
+    chunksize = max(1, len(paths) // (workers * 4))
+    results: Dict[str, Dict[str, Dict]] = {}
+    errors = 0
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for result in pool.map(extract, paths, [parser] * len(paths), chunksize=chunksize):
+            if 'error' in result:
+                errors += 1
+                logging.error(f"Failed to extract {result['path']}: {result['error']}")
+                continue
+            results.setdefault(result['site'], {})[result['timestamp']] = {
+                'url': result['url'],
+                'headlines': result['headlines']
+            }
+    elapsed = time.perf_counter() - start
+
+    logging.info(f"Re-extracted {len(paths) - errors} of {len(paths)} pages with {workers} workers "
+                 f"in {elapsed:.1f}s ({len(paths) / elapsed if elapsed else 0:.1f} pages/s)")
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='Re-run headline extraction over saved raw HTML')
+    parser.add_argument('directory', nargs='?', default='screenshots',
+                        help='Directory searched recursively for *_raw.html files')
+    parser.add_argument('--workers', type=int, help='Worker processes (default: CPU count)')
+    parser.add_argument('--parser', choices=available_parsers(),
+                        help='HTML parser backend (default: html.parser; lxml is several times faster)')
+    parser.add_argument('--warc', action='store_true',
+                        help='directory is a WARC archive; extract every capture archived in it')
+    parser.add_argument('--output', help='Output JSON path (default: reextracted_YYYYMMDD_HHMMSS.json)')
+    args = parser.parse_args()
+
+    if args.warc:
+        index = WarcIndex(args.directory)
+        paths, extract = index.pages(), extract_warc_page
+        index.close()
+    else:
+        paths, extract = find_raw_files(args.directory), extract_file
+    if not paths:
+        raise FileNotFoundError(f"No captured pages found in {args.directory}")
+
+    results = reextract(paths, args.workers, args.parser, extract)
+    output = args.output or f"reextracted_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    logging.info(f"Results saved to {output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+import logging
+import re
+from typing import Dict, Iterable, Optional
+from urllib.parse import urlparse
+
+# Wayback rewrites every subresource to web.archive.org/web/<timestamp><modifier>/<original url>
+WAYBACK_PATH = re.compile(r'^/web/\d{1,14}[a-z_]*/(.+)$')
+
+# Wayback playback banner assets; wombat.js is left alone since it rewrites URLs
+WAYBACK_TOOLBAR_PATTERNS = [
+    '/_static/js/bundle-playback.js',
+    '/_static/js/ruffle',
+    '/_static/css/banner-styles.css',
+    '/_static/css/iconochive.css',
+]
+WAYBACK_TOOLBAR_SELECTORS = ['#wm-ipp-base', '#wm-ipp', '#donato', '#wm-ipp-print']
+
+AD_AND_TRACKER_DOMAINS = [
+    'doubleclick.net',
+    'googlesyndication.com',
+    'googletagmanager.com',
+    'googletagservices.com',
+    'google-analytics.com',
+    'adnxs.com',
+    'amazon-adsystem.com',
+    'criteo.com',
+    'taboola.com',
+    'outbrain.com',
+    'scorecardresearch.com',
+    'chartbeat.com',
+    'chartbeat.net',
+    'moatads.com',
+    'krxd.net',
+    'rubiconproject.com',
+    'pubmatic.com',
+    'casalemedia.com',
+    'quantserve.com',
+    'facebook.net',
+    'hotjar.com',
+    'optimizely.com',
+    'segment.io',
+    'newrelic.com',
+    'nr-data.net',
+]
+
+# Rough transfer sizes by resource type, used to estimate bandwidth saved
+TYPICAL_BYTES = {
+    'media': 500_000,
+    'font': 40_000,
+    'script': 60_000,
+    'image': 30_000,
+    'stylesheet': 20_000,
+    'xhr': 5_000,
+    'fetch': 5_000,
+}
+DEFAULT_TYPICAL_BYTES = 10_000
+
+def original_url(url: str) -> str:
+    """Return the archived page's original URL for a Wayback URL, else url itself."""
+    parsed = urlparse(url)
+    if parsed.netloc.endswith('archive.org'):
+        match = WAYBACK_PATH.match(parsed.path)
+        if match:
+            original = match.group(1)
+            if parsed.query:
+                original += '?' + parsed.query
+            return original if '://' in original else 'http://' + original
+    return url
+
+def host_matches(host: str, domains: Iterable[str]) -> bool:
+    """True if host is one of domains or a subdomain of one."""
+    return any(host == domain or host.endswith('.' + domain) for domain in domains)
+
+class BlockProfile:
+    """Which requests to block or stub while rendering a page for a screenshot.
+
+    Blocked scripts are stubbed with an empty 200 response so pages waiting on
+    them don't error out; everything else that is blocked is aborted. Hosts in
+    allowed_domains are never blocked, which lets a site keep first-party
+    fonts or media it needs to render correctly.
+    """
+
+    def __init__(self, blocked_resource_types: Iterable[str] = (),
+                 blocked_domains: Iterable[str] = (), allowed_domains: Iterable[str] = (),
+                 blocked_url_patterns: Iterable[str] = (), hide_selectors: Iterable[str] = ()):
+        self.blocked_resource_types = set(blocked_resource_types)
+        self.blocked_domains = list(blocked_domains)
+        self.allowed_domains = list(allowed_domains)
+        self.blocked_url_patterns = list(blocked_url_patterns)
+        self.hide_selectors = list(hide_selectors)
+
+    def decide(self, url: str, resource_type: str) -> Optional[str]:
+        """Return 'abort', 'stub' or None (let the request through)."""
+        if resource_type == 'document':
+            return None
+        if any(pattern in url for pattern in self.blocked_url_patterns):
+            return self._action(resource_type)
+
+        host = urlparse(original_url(url)).hostname or ''
+        if host_matches(host, self.allowed_domains):
+            return None
+        if resource_type in self.blocked_resource_types or host_matches(host, self.blocked_domains):
+            return self._action(resource_type)
+        return None
+
+    @staticmethod
+    def _action(resource_type: str) -> str:
+        return 'stub' if resource_type == 'script' else 'abort'
+
+    def hide_css(self) -> Optional[str]:
+        """CSS hiding overlay elements (such as the Wayback banner), if any."""
+        if not self.hide_selectors:
+            return None
+        return ', '.join(self.hide_selectors) + ' { display: none !important; }'
+
+DEFAULT_PROFILE = BlockProfile(
+    blocked_resource_types=['media', 'font', 'websocket', 'eventsource', 'beacon'],
+    blocked_domains=AD_AND_TRACKER_DOMAINS,
+    blocked_url_patterns=WAYBACK_TOOLBAR_PATTERNS,
+    hide_selectors=WAYBACK_TOOLBAR_SELECTORS,
+)
+
+# Per-site overrides; sites not listed use DEFAULT_PROFILE
+SITE_PROFILES: Dict[str, BlockProfile] = {
+    # NYT headlines are set in web fonts, so keep them for faithful captures
+    'nytimes.com': BlockProfile(
+        blocked_resource_types=['media', 'websocket', 'eventsource', 'beacon'],
+        blocked_domains=AD_AND_TRACKER_DOMAINS,
+        blocked_url_patterns=WAYBACK_TOOLBAR_PATTERNS,
+        hide_selectors=WAYBACK_TOOLBAR_SELECTORS,
+    ),
+}
+
+def get_block_profile(site: str) -> BlockProfile:
+    """Return the blocking profile for a site."""
+    return SITE_PROFILES.get(site, DEFAULT_PROFILE)
+
+class BlockStats:
+    """Counts of blocked and allowed requests with an estimate of bytes saved"""
+
+    def __init__(self):
+        self.allowed = 0
+        self.blocked = 0
+        self.blocked_by_type: Dict[str, int] = {}
+        self.estimated_bytes_saved = 0
+
+    def record(self, resource_type: str, action: Optional[str]):
+        if action is None:
+            self.allowed += 1
+            return
+        self.blocked += 1
+        self.blocked_by_type[resource_type] = self.blocked_by_type.get(resource_type, 0) + 1
+        self.estimated_bytes_saved += TYPICAL_BYTES.get(resource_type, DEFAULT_TYPICAL_BYTES)
+
+    def summary(self) -> Dict:
+        return {
+            'requests_allowed': self.allowed,
+            'requests_blocked': self.blocked,
+            'blocked_by_type': dict(self.blocked_by_type),
+            'estimated_bytes_saved': self.estimated_bytes_saved,
+        }
+
+    def log_summary(self):
+        logging.info(f"Blocked {self.blocked} of {self.blocked + self.allowed} requests "
+                     f"(~{self.estimated_bytes_saved / 1_000_000:.1f} MB saved): {self.blocked_by_type}")
@@ -0,0 +1,65 @@
+from array import array
+from bisect import bisect_left
+import calendar
+from typing import List, Optional, Tuple
+
+def timestamp_to_epoch(timestamp: str) -> int:
+    """Convert a 14-digit Wayback timestamp (YYYYMMDDhhmmss, UTC) to epoch seconds."""
+    return calendar.timegm((
+        int(timestamp[0:4]), int(timestamp[4:6]), int(timestamp[6:8]),
+        int(timestamp[8:10] or 0), int(timestamp[10:12] or 0), int(timestamp[12:14] or 0),
+        0, 0, 0
+    ))
+
+class SnapshotIndex:
+    """Sorted index of CDX captures supporting nearest-capture lookups by binary search"""
+
+    def __init__(self, rows: List[List[str]]):
+        """Build the index from CDX JSON rows (first row is the header)."""
+        self.epochs = array('q')
+        self.timestamps: List[str] = []
+        self.originals: List[str] = []
+        self.digests: List[Optional[str]] = []
+        if not rows or len(rows) < 2:
+            return
+
+        header = rows[0]
+        ts_col = header.index("timestamp")
+        original_col = header.index("original")
+        digest_col = header.index("digest") if "digest" in header else None
+
+        # Parse every timestamp exactly once, then sort by capture time
+        parsed = sorted(
+            (timestamp_to_epoch(row[ts_col]), i) for i, row in enumerate(rows[1:], start=1)
+        )
+        for epoch, i in parsed:
+            row = rows[i]
+            self.epochs.append(epoch)
+            self.timestamps.append(row[ts_col])
+            self.originals.append(row[original_col])
+            self.digests.append(row[digest_col] if digest_col is not None else None)
+
+    def __len__(self) -> int:
+        return len(self.epochs)
+
+    def nearest_position(self, target: int) -> Optional[int]:
+        """Return the position of the capture closest to target (epoch seconds)."""
+        if not self.epochs:
+            return None
+        pos = bisect_left(self.epochs, target)
+        if pos == 0:
+            return 0
+        if pos == len(self.epochs):
+            return pos - 1
+        # Prefer the earlier capture on ties
+        if target - self.epochs[pos - 1] <= self.epochs[pos] - target:
+            return pos - 1
+        return pos
+
+    def nearest(self, timestamp: str) -> Optional[Tuple[str, str, int]]:
+        """Return (capture timestamp, original url, distance in seconds) for the closest capture."""
+        target = timestamp_to_epoch(timestamp)
+        pos = self.nearest_position(target)
+        if pos is None:
+            return None
+        return self.timestamps[pos], self.originals[pos], abs(self.epochs[pos] - target)
@@ -0,0 +1,337 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import sqlite3
+import threading
+import zlib
+from array import array
+from typing import Dict, List, Optional, Set, Tuple
+
+from headline_extractors import clean_text
+from headline_index import METADATA_FILE
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+DEFAULT_TRACKER_PATH = 'cache/stories.db'
+
+# Character shingles catch small rewordings ("passes" -> "passed") that word
+# shingles of a short headline would miss
+SHINGLE_SIZE = 4
+# 16 bands of 4 rows make pairs with a Jaccard similarity around 0.5 or more
+# likely to share a bucket, while very different headlines almost never do
+NUM_BANDS = 16
+ROWS_PER_BAND = 4
+NUM_PERMUTATIONS = NUM_BANDS * ROWS_PER_BAND
+# Estimated Jaccard similarity at which a headline joins an existing story
+SIMILARITY_THRESHOLD = 0.5
+
+_MERSENNE_PRIME = (1 << 61) - 1
+# Fixed seed so signatures, and so story assignments, are stable across runs
+_rng = random.Random(20240410)
+_PERMUTATIONS = [(_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+                 for _ in range(NUM_PERMUTATIONS)]
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS stories (
+        id INTEGER PRIMARY KEY,
+        headline TEXT NOT NULL,
+        first_site TEXT NOT NULL,
+        first_timestamp TEXT NOT NULL
+    );
+    -- Each distinct normalized headline text, its story and MinHash signature
+    CREATE TABLE IF NOT EXISTS variants (
+        id INTEGER PRIMARY KEY,
+        story_id INTEGER NOT NULL REFERENCES stories (id),
+        text TEXT NOT NULL UNIQUE,
+        signature BLOB NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS buckets (
+        band INTEGER NOT NULL,
+        key INTEGER NOT NULL,
+        variant_id INTEGER NOT NULL REFERENCES variants (id)
+    );
+    CREATE INDEX IF NOT EXISTS idx_buckets ON buckets (band, key);
+    CREATE TABLE IF NOT EXISTS sightings (
+        site TEXT NOT NULL,
+        timestamp TEXT NOT NULL,
+        position INTEGER NOT NULL,
+        variant_id INTEGER NOT NULL REFERENCES variants (id),
+        headline TEXT NOT NULL,
+        PRIMARY KEY (site, timestamp, position)
+    );
+    CREATE INDEX IF NOT EXISTS idx_sightings_variant ON sightings (variant_id);
+    -- Every capture processed, including those with no headlines and so no sightings
+    CREATE TABLE IF NOT EXISTS captures (
+        site TEXT NOT NULL,
+        timestamp TEXT NOT NULL,
+        PRIMARY KEY (site, timestamp)
+    );
+'''
+
+def normalize(headline: str) -> str:
+    """Lowercase a headline and strip punctuation so trivial edits compare equal."""
+    return ' '.join(re.sub(r'[^\w\s]', ' ', clean_text(headline).lower()).split())
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> Set[str]:
+    if len(text) <= size:
+        return {text}
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+def minhash(text: str) -> List[int]:
+    """MinHash signature of a normalized headline's character shingles."""
+    hashes = [zlib.crc32(s.encode('utf-8')) for s in shingles(text)]
+    return [min((a * h + b) % _MERSENNE_PRIME for h in hashes) for a, b in _PERMUTATIONS]
+
+def similarity(first: List[int], second: List[int]) -> float:
+    """Estimated Jaccard similarity of two signatures."""
+    return sum(x == y for x, y in zip(first, second)) / len(first)
+
+def band_keys(signature: List[int]) -> List[Tuple[int, int]]:
+    """(band, bucket key) pairs for the LSH index, keys fitting SQLite's signed 64 bits."""
+    keys = []
+    for band in range(NUM_BANDS):
+        rows = array('Q', signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]).tobytes()
+        keys.append((band, int.from_bytes(hashlib.blake2b(rows, digest_size=8).digest(), 'big', signed=True)))
+    return keys
+
+class StoryTracker:
+    """Incremental story clustering and headline change detection.
+
+    Each distinct headline text is assigned a story once: an exact match reuses
+    its story, otherwise MinHash/LSH finds earlier headlines of any site with
+    similar wording, so only a handful of candidates are compared however long
+    the history. Each capture is then diffed against the previous processed
+    capture of the same site. Captures may be processed out of order: a story's
+    first sighting moves back when an earlier one turns up, and the changes of
+    the next capture (see next_capture) must then be recomputed.
+    """
+
+    def __init__(self, path: str = DEFAULT_TRACKER_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode = WAL')
+        self._conn.executescript(SCHEMA)
+        # Databases from before the captures table only recorded captures with headlines
+        if self._conn.execute('SELECT 1 FROM captures LIMIT 1').fetchone() is None:
+            self._conn.execute('INSERT INTO captures (site, timestamp) SELECT DISTINCT site, timestamp FROM sightings')
+        self._conn.commit()
+
+    def _find_story(self, signature: List[int]) -> Optional[int]:
+        candidates = set()
+        for band, key in band_keys(signature):
+            candidates.update(row[0] for row in self._conn.execute(
+                'SELECT variant_id FROM buckets WHERE band = ? AND key = ?', (band, key)))
+        best, best_score = None, SIMILARITY_THRESHOLD
+        for variant_id in candidates:
+            story_id, blob = self._conn.execute('SELECT story_id, signature FROM variants WHERE id = ?',
+                                                (variant_id,)).fetchone()
+            score = similarity(signature, array('Q', blob).tolist())
+            if score >= best_score:
+                best, best_score = story_id, score
+        return best
+
+    def _variant(self, headline: str, site: str, timestamp: str) -> Tuple[int, int]:
+        """(variant id, story id) of a headline, creating them if it is new."""
+        text = normalize(headline)
+        row = self._conn.execute('SELECT id, story_id FROM variants WHERE text = ?', (text,)).fetchone()
+        if row:
+            self._update_first_sighting(row[1], headline, site, timestamp)
+            return row
+
+        signature = minhash(text)
+        story_id = self._find_story(signature)
+        if story_id is None:
+            story_id = self._conn.execute(
+                'INSERT INTO stories (headline, first_site, first_timestamp) VALUES (?, ?, ?)',
+                (headline, site, timestamp)).lastrowid
+        else:
+            self._update_first_sighting(story_id, headline, site, timestamp)
+        variant_id = self._conn.execute('INSERT INTO variants (story_id, text, signature) VALUES (?, ?, ?)',
+                                        (story_id, text, array('Q', signature).tobytes())).lastrowid
+        self._conn.executemany('INSERT INTO buckets (band, key, variant_id) VALUES (?, ?, ?)',
+                               [(band, key, variant_id) for band, key in band_keys(signature)])
+        return variant_id, story_id
+
+    def _update_first_sighting(self, story_id: int, headline: str, site: str, timestamp: str):
+        self._conn.execute('''
+            UPDATE stories SET headline = ?, first_site = ?, first_timestamp = ?
+            WHERE id = ? AND (first_timestamp, first_site) > (?, ?)
+        ''', (headline, site, timestamp, story_id, timestamp, site))
+
+    def _sightings(self, site: str, timestamp: str) -> List[Tuple[int, str, int, int]]:
+        return self._conn.execute('''
+            SELECT s.position, s.headline, s.variant_id, v.story_id
+            FROM sightings s JOIN variants v ON v.id = s.variant_id
+            WHERE s.site = ? AND s.timestamp = ? ORDER BY s.position
+        ''', (site, timestamp)).fetchall()
+
+    def process(self, site: str, timestamp: str, headlines: List[Dict]) -> Dict:
+        """Assign story ids to one capture's headlines and diff it against the
+        previous capture of the site.
+
+        Sets 'story_id' on each headline dict and returns {'previous_timestamp',
+        'events'}, where each event is new, persisting, reworded or dropped.
+        Processing a capture again replaces its earlier result.
+        """
+        with self._lock:
+            with self._conn:
+                self._conn.execute('DELETE FROM sightings WHERE site = ? AND timestamp = ?', (site, timestamp))
+                self._conn.execute('INSERT OR IGNORE INTO captures (site, timestamp) VALUES (?, ?)',
+                                   (site, timestamp))
+                current = []
+                for position, h in enumerate(headlines):
+                    if not h.get('headline'):
+                        continue
+                    variant_id, story_id = self._variant(h['headline'], site, timestamp)
+                    h['story_id'] = story_id
+                    current.append((position, h['headline'], variant_id, story_id))
+                self._conn.executemany(
+                    'INSERT INTO sightings (site, timestamp, position, variant_id, headline) VALUES (?, ?, ?, ?, ?)',
+                    [(site, timestamp, position, variant_id, text) for position, text, variant_id, _ in current])
+                return self._changes(site, timestamp)
+
+    def _changes(self, site: str, timestamp: str) -> Dict:
+        previous_timestamp = self._conn.execute(
+            'SELECT MAX(timestamp) FROM sightings WHERE site = ? AND timestamp < ?',
+            (site, timestamp)).fetchone()[0]
+        previous = self._sightings(site, previous_timestamp) if previous_timestamp else []
+        return {'previous_timestamp': previous_timestamp,
+                'events': diff_captures(previous, self._sightings(site, timestamp))}
+
+    def changes(self, site: str, timestamp: str) -> Dict:
+        """A processed capture's changes since the previous capture of its site,
+        as process returns them, reflecting any captures processed since."""
+        with self._lock:
+            return self._changes(site, timestamp)
+
+    def next_capture(self, site: str, timestamp: str) -> Optional[str]:
+        """The first processed capture of the site after timestamp, whose changes
+        are out of date if it was processed before this one."""
+        with self._lock:
+            return self._conn.execute('SELECT MIN(timestamp) FROM sightings WHERE site = ? AND timestamp > ?',
+                                      (site, timestamp)).fetchone()[0]
+
+    def story(self, story_id: int) -> List[Dict]:
+        """Every sighting of a story, oldest first."""
+        with self._lock:
+            rows = self._conn.execute('''
+                SELECT s.site, s.timestamp, s.position, s.headline
+                FROM variants v JOIN sightings s ON s.variant_id = v.id
+                WHERE v.story_id = ? ORDER BY s.timestamp, s.site, s.position
+            ''', (story_id,)).fetchall()
+        return [dict(zip(('site', 'timestamp', 'position', 'headline'), row)) for row in rows]
+
+    def is_processed(self, site: str, timestamp: str) -> bool:
+        with self._lock:
+            return self._conn.execute('SELECT 1 FROM captures WHERE site = ? AND timestamp = ?',
+                                      (site, timestamp)).fetchone() is not None
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {table: self._conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+                    for table in ('stories', 'variants', 'sightings', 'captures')}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def diff_captures(previous: List[Tuple], current: List[Tuple]) -> List[Dict]:
+    """Change events between two captures given as (position, headline, variant id,
+    story id) rows. Same text is persisting; same story with other wording is
+    reworded."""
+    previous_variants = {variant_id: (position, text) for position, text, variant_id, _ in previous}
+    previous_stories = {}
+    for position, text, _, story_id in previous:
+        previous_stories.setdefault(story_id, (position, text))
+
+    events = []
+    for position, text, variant_id, story_id in current:
+        event = {'position': position, 'headline': text, 'story_id': story_id}
+        if variant_id in previous_variants:
+            event.update(type='persisting', previous_position=previous_variants[variant_id][0])
+        elif story_id in previous_stories:
+            previous_position, previous_text = previous_stories[story_id]
+            event.update(type='reworded', previous_position=previous_position, previous=previous_text)
+        else:
+            event['type'] = 'new'
+        events.append(event)
+
+    current_stories = {story_id for *_, story_id in current}
+    for story_id, (position, text) in previous_stories.items():
+        if story_id not in current_stories:
+            events.append({'type': 'dropped', 'previous_position': position, 'headline': text,
+                           'story_id': story_id})
+    return events
+
+def ingest_directory(tracker: StoryTracker, directory: str = 'screenshots', force: bool = False) -> int:
+    """Track every *_metadata.json in directory in timestamp order, writing story
+    ids and changes back into each file. Duplicate pointers are skipped as they
+    have no headlines of their own, and the changes of an already tracked capture
+    are rewritten when an earlier one is added. Returns the number of captures
+    processed."""
+    captures = []
+    for name in os.listdir(directory):
+        match = METADATA_FILE.match(name)
+        if match:
+            captures.append((match.group('timestamp'), match.group('site'), os.path.join(directory, name)))
+
+    count = 0
+    for timestamp, site, path in sorted(captures):
+        if not force and tracker.is_processed(site, timestamp):
+            continue
+        try:
+            with open(path, 'r') as f:
+                metadata = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Skipping {path}: {e}")
+            continue
+        if 'duplicate_of' in metadata:
+            continue
+        metadata['changes'] = tracker.process(site, timestamp, metadata.get('headlines') or [])
+        with open(path, 'w') as f:
+            json.dump(metadata, f, indent=2)
+        count += 1
+
+        # A later capture tracked in an earlier run was diffed against the wrong one
+        later = tracker.next_capture(site, timestamp)
+        later_path = os.path.join(directory, f'{site}_{later}_metadata.json')
+        if later and os.path.exists(later_path):
+            with open(later_path, 'r') as f:
+                later_metadata = json.load(f)
+            later_metadata['changes'] = tracker.changes(site, later)
+            with open(later_path, 'w') as f:
+                json.dump(later_metadata, f, indent=2)
+    return count
+
+def main():
+    parser = argparse.ArgumentParser(description='Cluster headlines into stories and track their changes')
+    parser.add_argument('--db', default=DEFAULT_TRACKER_PATH, help='Story database path')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    ingest_parser = subparsers.add_parser('ingest', help='Process new *_metadata.json files in time order')
+    ingest_parser.add_argument('directory', nargs='?', default='screenshots')
+    ingest_parser.add_argument('--force', action='store_true', help='Reprocess captures already tracked')
+    story_parser = subparsers.add_parser('story', help='Show every sighting of a story')
+    story_parser.add_argument('story_id', type=int)
+    args = parser.parse_args()
+
+    tracker = StoryTracker(args.db)
+    if args.command == 'ingest':
+        count = ingest_directory(tracker, args.directory, args.force)
+        stats = tracker.stats()
+        logging.info(f"Processed {count} captures; {stats['stories']} stories from "
+                     f"{stats['variants']} distinct headlines")
+    elif args.command == 'story':
+        for s in tracker.story(args.story_id):
+            print(f"{s['timestamp']}  {s['site']:<20} #{s['position'] + 1}  {s['headline']}")
+    tracker.close()
+
+if __name__ == '__main__':
+    main()
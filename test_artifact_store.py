@@ -0,0 +1,103 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import artifact_store
+import pipeline
+from artifact_store import ArtifactStore, import_directory
+from test_pipeline import NYT_HTML
+
+class TestArtifactStore(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self.tmpdir.name, 'store')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def blob_files(self):
+        return [name for _, _, names in os.walk(os.path.join(self.root, 'objects')) for name in names]
+
+    def test_html_is_compressed_and_deduplicated(self):
+        store = ArtifactStore(self.root, codec='gzip')
+        html = NYT_HTML.encode('utf-8') * 50
+        first = store.put_artifact('nytimes.com', '20240410060000', 'raw_html', html)
+        second = store.put_artifact('nytimes.com', '20240410090000', 'raw_html', html)
+
+        self.assertEqual(first, second)
+        self.assertEqual(len(self.blob_files()), 1)
+        self.assertTrue(self.blob_files()[0].endswith('.gz'))
+        stats = store.stats()
+        self.assertEqual((stats['artifacts'], stats['blobs']), (2, 1))
+        self.assertLess(stats['stored_bytes'], stats['bytes'] / 10)
+
+        # The index survives reopening the store
+        store.close()
+        store = ArtifactStore(self.root)
+        self.assertEqual(store.get_artifact('nytimes.com', '20240410090000', 'raw_html'), html)
+        self.assertIsNone(store.get_artifact('nytimes.com', '20240410090000', 'metadata'))
+        self.assertEqual(store.latest_timestamp('nytimes.com'), '20240410090000')
+
+    def test_blobs_are_sharded_by_hash(self):
+        store = ArtifactStore(self.root, codec='gzip')
+        blob_hash = store.put_blob(b'hello')
+        self.assertTrue(os.path.exists(
+            os.path.join(self.root, 'objects', blob_hash[:2], blob_hash[2:4], blob_hash + '.gz')))
+
+    def test_screenshots_are_stored_uncompressed(self):
+        store = ArtifactStore(self.root, codec='gzip')
+        store.put_artifact('cnn.com', '20240410060000', 'screenshot', b'\x89PNG fake')
+        self.assertFalse(self.blob_files()[0].endswith('.gz'))
+
+    def test_link_resolves_before_source_is_stored(self):
+        store = ArtifactStore(self.root)
+        store.link('cnn.com', '20240410090000', '20240410060000')
+        store.put_artifact('cnn.com', '20240410060000', 'raw_html', b'<html></html>')
+        self.assertEqual(store.get_artifact('cnn.com', '20240410090000', 'raw_html'), b'<html></html>')
+
+    def test_import_directory(self):
+        loose = os.path.join(self.tmpdir.name, 'screenshots')
+        os.makedirs(loose)
+        for name in ('cnn.com_20240410060000.png', 'cnn.com_20240410060000_full.png',
+                     'cnn.com_20240410060000_metadata.json', 'cnn.com_20240410060000_raw.html',
+                     'notes.txt'):
+            with open(os.path.join(loose, name), 'w') as f:
+                f.write(name)
+
+        store = ArtifactStore(self.root)
+        self.assertEqual(import_directory(store, loose, remove=True), 4)
+        self.assertEqual(sorted(store.artifacts('cnn.com', '20240410060000')),
+                         ['full_page', 'metadata', 'raw_html', 'screenshot'])
+        self.assertEqual(os.listdir(loose), ['notes.txt'])
+
+    def test_export_derivative_kinds(self):
+        store = ArtifactStore(self.root)
+        store.put_artifact('cnn.com', '20240410060000', 'w640.webp', b'RIFF webp', codec='none')
+        store.close()
+        output = os.path.join(self.tmpdir.name, 'w640.webp')
+        with mock.patch('sys.argv', ['artifact_store.py', '--store', self.root, 'export', 'cnn.com',
+                                     '20240410060000', 'w640.webp', output]):
+            artifact_store.main()
+        with open(output, 'rb') as f:
+            self.assertEqual(f.read(), b'RIFF webp')
+        with mock.patch('sys.argv', ['artifact_store.py', '--store', self.root, 'export', 'cnn.com',
+                                     '20240410060000', 'thumb.webp', output]):
+            with self.assertRaisesRegex(SystemExit, 'stored: w640.webp'):
+                artifact_store.main()
+
+    def test_pipeline_writes_to_store(self):
+        store = ArtifactStore(self.root)
+        jobs = [{'site': 'nytimes.com', 'timestamp': ts, 'url': f'https://example.org/{ts}', 'digest': ts}
+                for ts in ('20240410060000', '20240410090000')]
+        with mock.patch.object(pipeline, 'fetch_html', return_value=NYT_HTML), \
+                mock.patch.object(pipeline, 'save_metadata') as save_metadata:
+            pipeline.build_pipeline(fetch_workers=1, screenshots=False, store=store).run(jobs)
+
+        save_metadata.assert_not_called()
+        self.assertEqual(store.get_artifact('nytimes.com', '20240410090000', 'raw_html'),
+                         NYT_HTML.encode('utf-8'))
+        self.assertIn(b'Pipeline Headline', store.get_artifact('nytimes.com', '20240410060000', 'metadata'))
+
+if __name__ == '__main__':
+    unittest.main()
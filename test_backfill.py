@@ -0,0 +1,81 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import backfill
+from backfill import build_results, load_checkpoint, run_backfill
+
+class FakeFetcher:
+    """Returns two captures per queried day and records which sites were queried"""
+
+    def __init__(self, fail_sites=(), empty_sites=()):
+        self.queried = []
+        self.fail_sites = set(fail_sites)
+        self.empty_sites = set(empty_sites)
+
+    def iter_fetch(self, jobs):
+        for key, params in jobs.items():
+            site = params['url']
+            self.queried.append((site, params['from']))
+            if site in self.fail_sites:
+                raise RuntimeError('simulated crash')
+            if site in self.empty_sites:
+                yield key, []
+                continue
+            day = params['from'][:8]
+            yield key, [
+                ['timestamp', 'original', 'digest'],
+                [f'{day}060500', f'https://www.{site}/', 'A'],
+                [f'{day}085000', f'https://www.{site}/', 'B'],
+            ]
+
+class TestBackfill(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.checkpoint = os.path.join(self.tmpdir.name, 'checkpoint.jsonl')
+        self.timestamps = ['20240410060000', '20240410090000', '20240411060000']
+        self.sites = ['cnn.com', 'foxnews.com']
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_resume_skips_completed_work(self):
+        with self.assertRaises(RuntimeError):
+            run_backfill(self.timestamps, self.checkpoint, self.sites, FakeFetcher(fail_sites=['foxnews.com']))
+        self.assertEqual({site for site, _ in load_checkpoint(self.checkpoint)}, {'cnn.com'})
+
+        fetcher = FakeFetcher()
+        completed = run_backfill(self.timestamps, self.checkpoint, self.sites, fetcher)
+        self.assertEqual({site for site, _ in fetcher.queried}, {'foxnews.com'})
+
+        results = build_results(completed, self.timestamps, self.sites)
+        self.assertEqual(results['cnn.com']['20240410090000'], {
+            'url': 'https://web.archive.org/web/20240410085000/https://www.cnn.com/',
+            'timestamp': '20240410085000',
+            'digest': 'B'
+        })
+        self.assertEqual(len(results['foxnews.com']), 3)
+
+    def test_ranges_without_captures_are_checkpointed(self):
+        run_backfill(self.timestamps, self.checkpoint, self.sites, FakeFetcher(empty_sites=['foxnews.com']))
+        fetcher = FakeFetcher()
+        completed = run_backfill(self.timestamps, self.checkpoint, self.sites, fetcher)
+        self.assertEqual(fetcher.queried, [])
+        self.assertEqual(build_results(completed, self.timestamps, self.sites)['foxnews.com'], {})
+
+    def test_truncated_checkpoint_line_is_ignored(self):
+        run_backfill(self.timestamps, self.checkpoint, ['cnn.com'], FakeFetcher())
+        with open(self.checkpoint, 'a') as f:
+            f.write('{"site": "cnn.com", "tar')
+        self.assertEqual(len(load_checkpoint(self.checkpoint)), 3)
+
+    def test_interval_must_be_positive(self):
+        argv = ['backfill.py', '20240410', '20240411', '--interval-hours', '0']
+        with mock.patch('sys.argv', argv), mock.patch.object(backfill, 'run_backfill') as run, \
+                mock.patch('sys.stderr'), self.assertRaises(SystemExit):
+            backfill.main()
+        run.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+import gzip
+import os
+import tempfile
+import unittest
+
+from benchmarks import suite
+from benchmarks.synthetic_pages import build_pages
+
+class TestBenchmarkSuite(unittest.TestCase):
+    def test_compare_flags_only_regressions_beyond_tolerance(self):
+        baseline = {'cnn.com.parse_ms': 100.0, 'pipeline.pages_per_s': 10.0, 'nytimes.com.parse_ms': 50.0}
+        results = {'cnn.com.parse_ms': 120.0, 'pipeline.pages_per_s': 7.0, 'nytimes.com.parse_ms': 20.0,
+                   'new.metric_ms': 5.0}
+        regressions = suite.compare(results, baseline, tolerance=0.25)
+        self.assertEqual(len(regressions), 1)
+        self.assertTrue(regressions[0].startswith('pipeline.pages_per_s'))
+
+    def test_baselines_are_kept_per_corpus(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'baselines.json')
+            suite.save_baseline(path, 'synthetic', {'a_ms': 1.0})
+            suite.save_baseline(path, 'fixtures', {'a_ms': 2.0})
+            self.assertEqual(suite.load_baseline(path, 'synthetic'), {'a_ms': 1.0})
+            self.assertEqual(suite.load_baseline(path, 'fixtures'), {'a_ms': 2.0})
+
+    def test_recorded_fixtures_replace_synthetic_pages(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            self.assertEqual(suite.load_corpus(tmpdir)[0], 'synthetic')
+            with gzip.open(os.path.join(tmpdir, 'cnn.com_20240410060000_raw.html.gz'), 'wt') as f:
+                f.write('<html></html>')
+            self.assertEqual(suite.load_corpus(tmpdir), ('fixtures', {'cnn.com': '<html></html>'}))
+
+    def test_small_run(self):
+        pages = build_pages(stories=6, blocks=5)
+        results = suite.bench_pages(pages, repeat=1)
+        self.assertEqual(len(results), 3 * len(pages))
+        self.assertGreater(suite.bench_pipeline(pages, captures_per_site=2)['pipeline.pages_per_s'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
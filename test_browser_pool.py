@@ -0,0 +1,179 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from browser_pool import BrowserService, PooledPage
+from warc_archive import WarcIndex, WarcWriter
+
+class FakeRequest:
+    def __init__(self, url, frame=None, navigation=False):
+        self.url = url
+        self.frame = frame
+        self.navigation = navigation
+
+    def is_navigation_request(self):
+        return self.navigation
+
+    async def all_headers(self):
+        return {'user-agent': 'test'}
+
+class FakeResponse:
+    """Stands in for a Playwright response; like Playwright, redirects have no body"""
+
+    def __init__(self, url, status, headers, body=b'', request=None):
+        self.url = url
+        self.status = status
+        self.status_text = 'Found' if status == 302 else 'OK'
+        self.headers = headers
+        self._body = body
+        self.request = request or FakeRequest(url)
+
+    async def body(self):
+        if 300 <= self.status < 400:
+            raise Exception('Response body is unavailable for redirect responses')
+        return self._body
+
+    async def all_headers(self):
+        return self.headers
+
+class FakeRoute:
+    def __init__(self, url):
+        self.request = FakeRequest(url)
+        self.calls = []
+
+    async def abort(self):
+        self.calls.append(('abort',))
+
+    async def fulfill(self, **kwargs):
+        self.calls.append(('fulfill', kwargs))
+
+class FakePage:
+    def __init__(self):
+        self.main_frame = object()
+        self.closed = False
+
+    def set_default_navigation_timeout(self, timeout):
+        pass
+
+    def set_default_timeout(self, timeout):
+        pass
+
+    def is_closed(self):
+        return self.closed
+
+class FakeContext:
+    def __init__(self):
+        self.closed = False
+
+    async def new_page(self):
+        return FakePage()
+
+    async def close(self):
+        self.closed = True
+
+class FakeBrowser:
+    """Creates fake contexts, or fails to while broken"""
+
+    def __init__(self):
+        self.contexts = []
+        self.broken = False
+
+    async def new_context(self, **kwargs):
+        if self.broken:
+            raise Exception('Target page, context or browser has been closed')
+        self.contexts.append(FakeContext())
+        return self.contexts[-1]
+
+class TestRecordAndReplay(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.directory = os.path.join(self.tmpdir.name, 'warc')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_recorded_responses_replay_offline(self):
+        writer = WarcWriter(self.directory)
+        service = BrowserService(warc_writer=writer)
+        pooled = PooledPage(None, FakePage())
+        pooled.capture = ('cnn.com', '20240410060000')
+        record = service._make_recorder(pooled)
+
+        url = 'https://web.archive.org/web/20240410060000/https://www.cnn.com/'
+        final_url = url.replace('060000', '060312')
+        asyncio.run(record(FakeResponse(url, 302, {'location': final_url},
+                                        request=FakeRequest(url, pooled.page.main_frame, navigation=True))))
+        asyncio.run(record(FakeResponse(final_url, 200, {'content-type': 'text/html'}, b'<html>cnn</html>',
+                                        FakeRequest(final_url, pooled.page.main_frame, navigation=True))))
+        asyncio.run(record(FakeResponse(final_url + 'style.css', 200, {'content-type': 'text/css'}, b'body {}')))
+        asyncio.run(record(FakeResponse('data:image/png;base64,', 200, {})))
+        writer.close()
+
+        index = WarcIndex(self.directory)
+        self.assertEqual(index.stats(), {'responses': 3, 'captures': 1})
+        # The rendered page is indexed under its capture, not the redirect to it
+        self.assertEqual(index.page('cnn.com', '20240410060000').url, final_url)
+
+        service = BrowserService(replay=index)
+        routes = [FakeRoute(url), FakeRoute(final_url), FakeRoute('https://www.cnn.com/missing.js')]
+        for route in routes:
+            asyncio.run(service._replay_handler(route))
+        index.close()
+
+        (action, redirect), (_, page), missing = (route.calls[0] for route in routes)
+        self.assertEqual((action, redirect['status'], redirect['body']), ('fulfill', 302, b''))
+        self.assertEqual(redirect['headers']['location'], final_url)
+        self.assertEqual((page['status'], page['body']), (200, b'<html>cnn</html>'))
+        self.assertEqual(missing, ('abort',))
+
+class TestPagePool(unittest.TestCase):
+    def setUp(self):
+        self.service = BrowserService(pool_size=1, max_jobs_per_page=2)
+        self.service._browser = FakeBrowser()
+        self.pages = []
+
+        async def capture(pooled, url, site, timestamp, return_content=False):
+            self.pages.append(pooled.page)
+            return True, None
+        self.service._capture = capture
+        # No pause between attempts to create a page
+        patcher = mock.patch('browser_pool.asyncio.sleep', mock.AsyncMock())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def run_jobs(self, *broken):
+        """Run one job per entry of broken, with the browser failing to create
+        pages while it is True. Returns each job's result and the pool size."""
+        async def run():
+            self.service._pages = asyncio.Queue()
+            await self.service._pages.put(await self.service._new_page())
+            results = []
+            for fail in broken:
+                self.service._browser.broken = fail
+                results.append(await self.service._screenshot('https://www.cnn.com/', 'cnn.com',
+                                                              '20240410060000', None, False))
+            return results, self.service._pages.qsize()
+        return asyncio.run(run())
+
+    def test_pages_are_recycled_after_max_jobs(self):
+        results, pool_size = self.run_jobs(False, False, False)
+        self.assertEqual(results, [(True, None)] * 3)
+        self.assertEqual(pool_size, 1)
+        contexts = self.service._browser.contexts
+        self.assertEqual([c.closed for c in contexts], [True, False])
+        self.assertIs(self.pages[0], self.pages[1])
+        self.assertIsNot(self.pages[1], self.pages[2])
+
+    def test_failed_recycle_keeps_the_pool_slot(self):
+        # The second job's page cannot be replaced, nor can the third job's
+        # retry create one; once the browser recovers the slot works again
+        results, pool_size = self.run_jobs(False, True, True, False)
+        self.assertEqual(results, [(True, None), (True, None), (False, None), (True, None)])
+        self.assertEqual(pool_size, 1)
+        self.assertEqual(len(self.service._browser.contexts), 2)
+        self.assertEqual(len(self.pages), 3)
+
+if __name__ == '__main__':
+    unittest.main()
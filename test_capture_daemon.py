@@ -0,0 +1,116 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from unittest import mock
+
+import requests
+
+import capture_daemon
+import pipeline
+from backfill import load_checkpoint
+from capture_daemon import CaptureDaemon, next_slot
+from test_pipeline import NYT_HTML, FakeBrowser
+
+SITE = 'nytimes.com'
+
+class TestSchedule(unittest.TestCase):
+    def test_next_slot_follows_the_grid(self):
+        self.assertEqual(next_slot(datetime(2024, 4, 10, 9, 0)), datetime(2024, 4, 10, 12, 0))
+        self.assertEqual(next_slot(datetime(2024, 4, 10, 21, 30)), datetime(2024, 4, 11, 6, 0))
+
+class TestCaptureDaemon(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.checkpoint = os.path.join(self.tmpdir.name, 'live.jsonl')
+        self.now = datetime(2024, 4, 10, 9, 5)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def make_daemon(self, browser=None, sites=(SITE,)):
+        return CaptureDaemon(browser, sites=list(sites), checkpoint_path=self.checkpoint,
+                             catchup_hours=13, clock=lambda: self.now)
+
+    def run_twice(self, fetch_html, sites):
+        """Run two passes without a browser; returns the slots each asked the Wayback Machine for."""
+        queried = []
+
+        def process_snapshots(timestamps):
+            queried.append(timestamps)
+            return {site: {ts: {'url': f'https://web.archive.org/web/{ts}/https://www.{site}/',
+                                'timestamp': ts[:-4] + '0312'} for ts in timestamps} for site in sites}
+
+        with mock.patch.object(pipeline, 'fetch_html', fetch_html), \
+                mock.patch.object(pipeline, 'save_metadata'), \
+                mock.patch.object(capture_daemon, 'process_snapshots', process_snapshots):
+            self.make_daemon(sites=sites).run_once()
+            self.make_daemon(sites=sites).run_once()
+        return queried
+
+    def test_due_slots_split_live_and_missed(self):
+        live, catchup = self.make_daemon().due_slots(self.now)
+        self.assertEqual(live, ['20240410090000'])
+        self.assertEqual(catchup, ['20240409210000', '20240410060000'])
+
+    def test_run_once_captures_live_and_catches_up(self):
+        browser = FakeBrowser()
+        fetched = []
+
+        def fetch_html(url, site=None, timestamp=None):
+            fetched.append(url)
+            return NYT_HTML
+
+        def process_snapshots(timestamps):
+            return {SITE: {ts: {'url': f'https://web.archive.org/web/{ts}/https://www.{SITE}/',
+                                'timestamp': ts[:-4] + '0312'} for ts in timestamps}}
+
+        with mock.patch.object(pipeline, 'fetch_html', fetch_html), \
+                mock.patch.object(pipeline, 'save_metadata'), \
+                mock.patch.object(capture_daemon, 'process_snapshots', process_snapshots):
+            self.make_daemon(browser).run_once()
+            # Everything due has been captured, so a second pass does nothing
+            self.make_daemon(browser).run_once()
+
+        self.assertEqual(len(fetched), 3)
+        self.assertIn(f'https://www.{SITE}/', fetched)
+        # Pages fetched for extraction were served to the browser, not downloaded again
+        self.assertEqual((browser.navigations, len(browser.served_html)), (0, 3))
+
+        completed = load_checkpoint(self.checkpoint)
+        modes = {target: record['mode'] for (_, target), record in completed.items()}
+        self.assertEqual(modes, {'20240410090000': 'live', '20240409210000': 'wayback',
+                                 '20240410060000': 'wayback'})
+
+    def test_site_without_extractor_is_not_captured_again(self):
+        fetched = []
+
+        def fetch_html(url, site=None, timestamp=None):
+            fetched.append(url)
+            return NYT_HTML
+
+        queried = self.run_twice(fetch_html, [SITE, 'usatoday.com'])
+        self.assertEqual(len(queried), 1)
+        self.assertEqual(len(fetched), 6)
+        modes = {key: record['mode'] for key, record in load_checkpoint(self.checkpoint).items()}
+        self.assertEqual(modes[('usatoday.com', '20240410090000')], 'no_extractor')
+        self.assertEqual(modes[(SITE, '20240410090000')], 'live')
+
+    def test_failed_captures_are_retried_up_to_max_attempts(self):
+        fetched = []
+
+        def fetch_html(url, site=None, timestamp=None):
+            fetched.append(url)
+            raise requests.exceptions.ConnectionError('down')
+
+        self.run_twice(fetch_html, [SITE])
+        queried = self.run_twice(fetch_html, [SITE])
+        # Three slots, each tried MAX_ATTEMPTS times
+        self.assertEqual(len(fetched), 3 * capture_daemon.MAX_ATTEMPTS)
+        # Only the third pass still had slots to catch up
+        self.assertEqual(len(queried), 1)
+        attempts = {target: record['attempts'] for (_, target), record in load_checkpoint(self.checkpoint).items()}
+        self.assertEqual(set(attempts.values()), {capture_daemon.MAX_ATTEMPTS})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import os
+import tempfile
+import time
+import unittest
+from datetime import datetime, timezone
+
+from cdx_cache import CDXCache
+
+ROWS = [['timestamp', 'original', 'digest'], ['20240410055900', 'https://www.cnn.com/', 'A']]
+
+def params_for(day: str, site: str = 'cnn.com') -> dict:
+    return {'url': site, 'from': day + '000000', 'to': day + '235959', 'output': 'json'}
+
+class TestCDXCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'cdx.db')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_past_ranges_never_expire(self):
+        cache = CDXCache(self.path, ttl=0)
+        cache.put(params_for('20240410'), ROWS)
+        time.sleep(0.01)
+        self.assertEqual(cache.get(params_for('20240410')), ROWS)
+        cache.close()
+
+        # Entries persist across cache instances
+        self.assertEqual(CDXCache(self.path).get(params_for('20240410')), ROWS)
+
+    def test_today_expires_after_ttl(self):
+        today = datetime.now(timezone.utc).strftime('%Y%m%d')
+        cache = CDXCache(self.path, ttl=0)
+        cache.put(params_for(today), ROWS)
+        time.sleep(0.01)
+        self.assertIsNone(cache.get(params_for(today)))
+        self.assertEqual((cache.hits, cache.misses), (0, 1))
+
+    def test_empty_past_listing_expires_after_ttl(self):
+        cache = CDXCache(self.path, ttl=0)
+        cache.put(params_for('20240410'), [])
+        cache.put(params_for('20240411'), ROWS[:1])
+        time.sleep(0.01)
+        self.assertIsNone(cache.get(params_for('20240410')))
+        self.assertIsNone(cache.get(params_for('20240411')))
+        cache.close()
+
+    def test_evicts_least_recently_used(self):
+        probe = CDXCache(os.path.join(self.tmpdir.name, 'probe.db'))
+        probe.put(params_for('20240410'), ROWS)
+        entry_size = probe._conn.execute('SELECT size FROM cdx_cache').fetchone()[0]
+
+        cache = CDXCache(self.path, max_bytes=entry_size * 2)
+        cache.put(params_for('20240410', 'cnn.com'), ROWS)
+        cache.put(params_for('20240410', 'foxnews.com'), ROWS)
+        cache.get(params_for('20240410', 'cnn.com'))
+        cache.put(params_for('20240410', 'nytimes.com'), ROWS)
+
+        self.assertIsNotNone(cache.get(params_for('20240410', 'cnn.com')))
+        self.assertIsNone(cache.get(params_for('20240410', 'foxnews.com')))
+        self.assertIsNotNone(cache.get(params_for('20240410', 'nytimes.com')))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+
+import wayback_scraper
+from cdx_cache import CDXCache
+from cdx_fetcher import CDXFetcher, TokenBucket
+
+class StubCDXHandler(BaseHTTPRequestHandler):
+    """Serves canned CDX listings, failing the first request per site if asked"""
+
+    def do_GET(self):
+        params = parse_qs(urlparse(self.path).query)
+        site = params['url'][0]
+        server = self.server
+        with server.lock:
+            server.requests.append(params)
+            fail = site in server.fail_once and site not in server.failed
+            if fail:
+                server.failed.add(site)
+        if fail:
+            self.send_response(429)
+            self.send_header('Retry-After', '0')
+            self.end_headers()
+            return
+
+        day = params['from'][0][:8]
+        rows = [
+            ['urlkey', 'timestamp', 'original', 'mimetype', 'statuscode', 'digest', 'length'],
+            ['com,cnn)/', f'{day}055900', f'https://www.{site}/', 'text/html', '200', 'A', '1'],
+            ['com,cnn)/', f'{day}091500', f'https://www.{site}/', 'text/html', '200', 'B', '1'],
+        ]
+        if 'fl' in params:
+            columns = [rows[0].index(field) for field in params['fl'][0].split(',')]
+            rows = [[row[i] for i in columns] for row in rows]
+        body = json.dumps(rows).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class TestCDXFetcher(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubCDXHandler)
+        self.server.lock = threading.Lock()
+        self.server.requests = []
+        self.server.fail_once = set()
+        self.server.failed = set()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.cdx_url = f'http://127.0.0.1:{self.server.server_port}/cdx/search/cdx'
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def make_fetcher(self, **kwargs):
+        options = dict(rate=100, burst=10, backoff=0.01, cdx_url=self.cdx_url)
+        options.update(kwargs)
+        return CDXFetcher(**options)
+
+    def test_retries_on_429(self):
+        self.server.fail_once.add('cnn.com')
+        rows = self.make_fetcher().fetch({'url': 'cnn.com', 'from': '20240410', 'to': '20240410'})
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_gives_up_after_max_retries(self):
+        self.server.fail_once.add('cnn.com')
+        rows = self.make_fetcher(max_retries=0).fetch({'url': 'cnn.com', 'from': '20240410', 'to': '20240410'})
+        self.assertEqual(rows, [])
+
+    def test_cached_listings_skip_the_network(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = CDXCache(os.path.join(tmpdir, 'cdx.db'))
+            fetcher = self.make_fetcher(cache=cache)
+            params = {'url': 'cnn.com', 'from': '20240410000000', 'to': '20240410235959'}
+            first = fetcher.fetch(params)
+            second = fetcher.fetch(params)
+            cache.close()
+
+        self.assertEqual(first, second)
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_process_snapshots_output_shape(self):
+        timestamps = ['20240410060000', '20240410090000']
+        with mock.patch.object(wayback_scraper, 'get_timestamps', return_value=timestamps):
+            results = wayback_scraper.process_snapshots(self.make_fetcher())
+
+        self.assertEqual(list(results), wayback_scraper.NEWS_SITES)
+        self.assertEqual(results['cnn.com']['20240410060000'], {
+            'url': 'https://web.archive.org/web/20240410055900/https://www.cnn.com/',
+            'timestamp': '20240410055900',
+            'digest': 'A'
+        })
+        self.assertEqual(results['nytimes.com']['20240410090000']['timestamp'], '20240410091500')
+
+    def test_one_query_per_site_per_range(self):
+        timestamps = ['20240410060000', '20240410090000', '20240410120000']
+        wayback_scraper.process_snapshots(self.make_fetcher(), timestamps)
+
+        self.assertEqual(len(self.server.requests), len(wayback_scraper.NEWS_SITES))
+        params = self.server.requests[0]
+        self.assertEqual(params['from'], ['20240410000000'])
+        self.assertEqual(params['to'], ['20240410235959'])
+        self.assertEqual(params['fl'], ['timestamp,original,digest'])
+
+    def test_plan_date_ranges_splits_long_spans(self):
+        timestamps = ['20240401060000', '20240403060000', '20240409060000', '20240409090000']
+        ranges = wayback_scraper.plan_date_ranges(timestamps, max_days=7)
+        self.assertEqual(ranges, [
+            ('20240401000000', '20240403235959', ['20240401060000', '20240403060000']),
+            ('20240409000000', '20240409235959', ['20240409060000', '20240409090000']),
+        ])
+
+class TestTokenBucket(unittest.TestCase):
+    def test_limits_rate(self):
+        bucket = TokenBucket(rate=50, capacity=1)
+        start = time.monotonic()
+        for _ in range(6):
+            bucket.acquire()
+        # First token is free, the remaining five arrive at 50/s
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+
+if __name__ == '__main__':
+    unittest.main()
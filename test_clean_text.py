@@ -0,0 +1,54 @@
+import unicodedata
+import unittest
+
+from headline_extractors import NYTHeadlineExtractor, clean_text
+
+def reference_clean_text(text):
+    """The original replace-loop implementation, kept to check equivalence"""
+    if not text:
+        return text
+    replacements = {
+        '\u2018': "'",
+        '\u2019': "'",
+        '\u201C': '"',
+        '\u201D': '"',
+        '\u2013': '-',
+        '\u2014': '--',
+    }
+    for old, new in replacements.items():
+        text = text.replace(old, new)
+    text = unicodedata.normalize('NFKC', text)
+    return ' '.join(text.split())
+
+UNICODE_CORPUS = [
+    '',
+    None,
+    'Plain ASCII headline',
+    '  Leading,\ttrailing\nand   internal   whitespace  ',
+    '‘Unprecedented’ storm batters coast',
+    '“We will rebuild,” mayor says',
+    'Results 2024–2025 — live',
+    'Café owners and näive combining marks',
+    'ﬁrst-of-its-kind ﬂood warning',
+    'FullＷidth ＡＢＣ and ① circled',
+    'Non\u00a0breaking\u2003em\u3000ideographic spaces',
+    '‘’“”–—',
+    'Emoji \U0001F1FA\U0001F1F8 and CJK 新聞',
+    'Superscript x² and fraction ½',
+    'Half-width ｶﾞ kana',
+    'Zero\u200bwidth space stays',
+]
+
+class TestCleanText(unittest.TestCase):
+    def test_matches_reference_on_unicode_corpus(self):
+        for text in UNICODE_CORPUS:
+            with self.subTest(text=text):
+                self.assertEqual(clean_text(text), reference_clean_text(text))
+
+    def test_extractor_method_uses_memoized_cleaner(self):
+        extractor = NYTHeadlineExtractor()
+        for text in UNICODE_CORPUS + UNICODE_CORPUS:
+            self.assertEqual(extractor.clean_text(text), reference_clean_text(text))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from PIL import Image
+
+import derivatives
+import pipeline
+from artifact_store import ArtifactStore
+
+class TestDerivatives(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmpdir.name)
+        os.makedirs('screenshots')
+        Image.new('RGB', (3840, 2160), (200, 30, 30)).save('screenshots/cnn.com_20240410060000.png')
+        Image.new('RGB', (2560, 8000), (30, 30, 200)).save('screenshots/cnn.com_20240410060000_full.png')
+        with open('screenshots/cnn.com_20240410060000_metadata.json', 'w') as f:
+            json.dump({'headlines': []}, f)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmpdir.cleanup()
+
+    def test_generates_widths_formats_and_thumbnail(self):
+        images = derivatives.generate_derivatives('cnn.com', '20240410060000')
+        self.assertEqual(sorted(images['derivatives']), [
+            'thumb.webp', 'w1280.jpeg', 'w1280.webp', 'w1920.jpeg', 'w1920.webp', 'w640.jpeg', 'w640.webp'])
+        self.assertEqual((images['derivatives']['w640.webp']['width'],
+                          images['derivatives']['w640.webp']['height']), (640, 360))
+        self.assertEqual(images['derivatives']['thumb.webp']['width'], derivatives.THUMBNAIL_WIDTH)
+        for info in images['derivatives'].values():
+            self.assertEqual(os.path.getsize(info['path']), info['bytes'])
+        # The full-page capture is kept untouched by default
+        self.assertEqual(images['full_page']['height'], 8000)
+
+    def test_full_page_modes(self):
+        images = derivatives.generate_derivatives('cnn.com', '20240410060000', full_page='downsample')
+        self.assertFalse(os.path.exists('screenshots/cnn.com_20240410060000_full.png'))
+        self.assertEqual((images['full_page']['width'], images['full_page']['height']), (1280, 4000))
+        self.assertTrue(images['full_page']['path'].endswith('.webp'))
+
+        derivatives.generate_derivatives('cnn.com', '20240410060000', full_page='drop')
+        self.assertIsNone(derivatives.generate_derivatives('cnn.com', '20240410060000')['full_page'])
+
+    def test_full_page_of_a_referenced_screenshot(self):
+        # The above-the-fold image was replaced by a reference to an earlier capture
+        os.remove('screenshots/cnn.com_20240410060000.png')
+        self.assertEqual(derivatives.find_screenshots(), [('cnn.com', '20240410060000')])
+        images = derivatives.generate_derivatives('cnn.com', '20240410060000', full_page='downsample')
+        self.assertIsNone(images['screenshot'])
+        self.assertEqual(images['derivatives'], {})
+        self.assertEqual(images['full_page']['width'], 1280)
+        self.assertFalse(os.path.exists('screenshots/cnn.com_20240410060000_full.png'))
+
+    def test_sizes_recorded_in_metadata(self):
+        site, timestamp, images, error = derivatives.process_capture(('cnn.com', '20240410060000'))
+        self.assertIsNone(error)
+        with open('screenshots/cnn.com_20240410060000_metadata.json') as f:
+            metadata = json.load(f)
+        self.assertEqual(metadata['images']['screenshot']['width'], 3840)
+        self.assertIn('thumb.webp', metadata['images']['derivatives'])
+        self.assertEqual(derivatives.find_screenshots(), [('cnn.com', '20240410060000')])
+
+    def test_store_metadata_names_artifacts(self):
+        store = ArtifactStore('store')
+        stage = pipeline.store_screenshots(pipeline.make_derivatives_stage('downsample', store), store)
+        stage({'site': 'cnn.com', 'timestamp': '20240410060000', 'metadata': {'headlines': []}})
+
+        images = json.loads(store.get_artifact('cnn.com', '20240410060000', 'metadata'))['images']
+        infos = [images['screenshot'], images['full_page'], *images['derivatives'].values()]
+        self.assertEqual((images['screenshot']['artifact'], images['full_page']['artifact']),
+                         ('screenshot', 'full_page.webp'))
+        for info in infos:
+            self.assertNotIn('path', info)
+            self.assertIsNotNone(store.get_artifact('cnn.com', '20240410060000', info['artifact']))
+        self.assertEqual(os.listdir('screenshots/derivatives'), [])
+        store.close()
+
+    def test_pixel_limit_raised_only_for_captures(self):
+        Image.new('L', (100, 100)).save('big.png')
+        with mock.patch.object(Image, 'MAX_IMAGE_PIXELS', 1000):
+            with derivatives.open_capture('big.png') as img:
+                self.assertEqual(img.size, (100, 100))
+            self.assertEqual(Image.MAX_IMAGE_PIXELS, 1000)
+            with self.assertRaises(Image.DecompressionBombError):
+                Image.open('big.png')
+
+if __name__ == '__main__':
+    unittest.main()
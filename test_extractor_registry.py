@@ -0,0 +1,47 @@
+import unittest
+
+import headline_extractors
+from headline_extractors import (
+    HeadlineExtractor,
+    NYTHeadlineExtractor,
+    WaPoHeadlineExtractor,
+    get_extractor,
+    normalize_source,
+    register_extractor,
+    registered_sources,
+)
+
+class TestExtractorRegistry(unittest.TestCase):
+    def test_source_normalization(self):
+        self.assertEqual(normalize_source('cnn.com'), 'cnn')
+        self.assertEqual(normalize_source('WWW.CNN.COM'), 'cnn')
+        self.assertEqual(normalize_source('https://edition.cnn.com/world'), 'cnn')
+        self.assertEqual(normalize_source('wapo'), 'washingtonpost')
+        self.assertEqual(normalize_source(
+            'https://web.archive.org/web/20240410060000/https://www.nytimes.com/'), 'nytimes')
+        self.assertEqual(normalize_source('web.archive.org/web/20240410060000id_/http://foxnews.com:80/'), 'foxnews')
+
+    def test_instances_are_cached(self):
+        extractor = get_extractor('nytimes.com')
+        self.assertIsInstance(extractor, NYTHeadlineExtractor)
+        self.assertIs(get_extractor('https://www.nytimes.com/'), extractor)
+        self.assertIsInstance(get_extractor('washingtonpost.com'), WaPoHeadlineExtractor)
+        self.assertIsNone(get_extractor('example.com'))
+
+    def test_register_new_source(self):
+        @register_extractor('usatoday', aliases=['usat'])
+        class StubUSATodayExtractor(HeadlineExtractor):
+            def extract_headlines(self, soup, base_url):
+                return []
+
+        try:
+            self.assertIn('usatoday', registered_sources())
+            self.assertIsInstance(get_extractor('usatoday.com'), StubUSATodayExtractor)
+            self.assertIs(get_extractor('usat'), get_extractor('www.usatoday.com'))
+        finally:
+            headline_extractors._EXTRACTOR_CLASSES.pop('usatoday')
+            headline_extractors._EXTRACTOR_INSTANCES.pop('usatoday', None)
+            headline_extractors._SOURCE_ALIASES.pop('usat')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+
+from headline_index import HeadlineIndex
+
+def headline(text: str, sub: str = '') -> dict:
+    return {'headline': text, 'subheadline': sub, 'url': 'https://example.org/' + text.split()[0].lower()}
+
+class TestHeadlineIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.index = HeadlineIndex(os.path.join(self.tmpdir.name, 'headlines.db'))
+        self.index.upsert_many([
+            ('cnn.com', '20240410060000', [headline('Senate passes budget deal'), headline('Storm hits coast')], None),
+            ('cnn.com', '20240410090000', [headline('Storm hits coast', 'Thousands without power')], None),
+            ('foxnews.com', '20240410090000', [headline('Budget deal clears Senate')], None),
+            ('foxnews.com', '20240411060000', [headline('Markets rally')], None),
+        ])
+
+    def tearDown(self):
+        self.index.close()
+        self.tmpdir.cleanup()
+
+    def test_search_headlines_and_subheadlines(self):
+        results = self.index.search('budget')
+        self.assertEqual({(r['site'], r['timestamp']) for r in results},
+                         {('cnn.com', '20240410060000'), ('foxnews.com', '20240410090000')})
+        self.assertEqual([r['site'] for r in self.index.search('power')], ['cnn.com'])
+        self.assertEqual(self.index.search('budget', site='foxnews.com')[0]['headline'], 'Budget deal clears Senate')
+        self.assertEqual(self.index.search('budget', start='20240410080000'), self.index.search('budget', site='foxnews.com'))
+
+    def test_leads_on_date(self):
+        leads = self.index.leads('20240410')
+        self.assertEqual([(r['site'], r['timestamp'], r['headline']) for r in leads], [
+            ('cnn.com', '20240410060000', 'Senate passes budget deal'),
+            ('cnn.com', '20240410090000', 'Storm hits coast'),
+            ('foxnews.com', '20240410090000', 'Budget deal clears Senate'),
+        ])
+
+    def test_first_appearance_per_site(self):
+        first = self.index.first_appearance('storm')
+        self.assertEqual([(r['site'], r['timestamp']) for r in first], [('cnn.com', '20240410060000')])
+
+    def test_upsert_replaces_a_capture(self):
+        self.index.upsert('cnn.com', '20240410060000', [headline('Corrected headline')])
+        self.assertEqual(self.index.search('senate', site='cnn.com'), [])
+        self.assertEqual(len(self.index.search('corrected')), 1)
+        self.assertEqual(self.index.stats(), {'captures': 4, 'headlines': 4})
+
+    def test_reupserting_the_newest_capture(self):
+        # Replacing the last capture's rows frees the highest ids, which the new rows reuse
+        self.index.upsert('foxnews.com', '20240411060000', [headline('Typhoon nears coast')])
+        self.index.upsert('foxnews.com', '20240411060000', [headline('Corrected eclipse story')])
+        self.assertEqual(len(self.index.search('eclipse')), 1)
+        self.assertEqual(self.index.search('typhoon'), [])
+        self.assertEqual(self.index.stats(), {'captures': 4, 'headlines': 5})
+
+    def test_ingest_directory_is_incremental(self):
+        directory = os.path.join(self.tmpdir.name, 'screenshots')
+        os.makedirs(directory)
+        original = os.path.join(directory, 'nytimes.com_20240410060000_metadata.json')
+        with open(original, 'w') as f:
+            json.dump({'headlines': [headline('Eclipse draws crowds')], 'url': 'u1'}, f)
+        with open(os.path.join(directory, 'nytimes.com_20240410090000_metadata.json'), 'w') as f:
+            json.dump({'duplicate_of': {'timestamp': '20240410060000',
+                                        'metadata': 'screenshots/nytimes.com_20240410060000_metadata.json'},
+                       'url': 'u2'}, f)
+
+        self.assertEqual(self.index.ingest_directory(directory), 2)
+        self.assertEqual(self.index.ingest_directory(directory), 0)
+        self.assertEqual(len(self.index.search('eclipse')), 2)
+
+        time.sleep(0.01)
+        with open(original, 'w') as f:
+            json.dump({'headlines': [headline('Eclipse crowds head home')], 'url': 'u1'}, f)
+        self.assertEqual(self.index.ingest_directory(directory), 1)
+        # The unchanged pointer follows the capture it duplicates
+        self.assertEqual(sorted((r['timestamp'], r['url']) for r in self.index.search('home')),
+                         [('20240410060000', 'https://example.org/eclipse'),
+                          ('20240410090000', 'https://example.org/eclipse')])
+        self.assertEqual(self.index.search('draws'), [])
+
+    def test_duplicates_recorded_before_their_original(self):
+        self.assertEqual(self.index.add_duplicates([('cnn.com', '20240410120000', '20240410150000', None)]), 1)
+        self.assertEqual(self.index.search('eclipse'), [])
+        self.index.upsert('cnn.com', '20240410150000', [headline('Eclipse draws crowds')])
+        self.assertEqual([r['timestamp'] for r in self.index.search('eclipse')], ['20240410120000', '20240410150000'])
+
+if __name__ == '__main__':
+    unittest.main()
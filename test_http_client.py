@@ -0,0 +1,89 @@
+import gzip
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+import requests
+
+import http_client
+from instrumentation import METRICS
+
+PAGE = '<html><body><p class="indicate-hover">Caf\u00e9 headline</p></body></html>' * 100
+
+class StubPageHandler(BaseHTTPRequestHandler):
+    """Serves a gzipped page, failing the first requests with 503 if asked"""
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.client_ports.add(self.client_address[1])
+            server.headers.append(dict(self.headers))
+            fail = server.failures > 0
+            if fail:
+                server.failures -= 1
+        if fail:
+            self.send_response(503)
+            self.send_header('Retry-After', '0')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        body = gzip.compress(PAGE.encode('utf-8'))
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class TestHTTPClient(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubPageHandler)
+        self.server.lock = threading.Lock()
+        self.server.client_ports = set()
+        self.server.headers = []
+        self.server.failures = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f'http://127.0.0.1:{self.server.server_port}/web/20240410060000/https://www.nytimes.com/'
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_reuses_connections_and_decompresses(self):
+        session = http_client.create_session()
+        for _ in range(5):
+            self.assertEqual(http_client.fetch_text(self.url, session), PAGE)
+        self.assertEqual(len(self.server.client_ports), 1)
+        self.assertIn('gzip', self.server.headers[0]['Accept-Encoding'])
+        self.assertTrue(self.server.headers[0]['User-Agent'].startswith('NewsLensBot'))
+
+    def test_retries_server_errors(self):
+        self.server.failures = 2
+        with mock.patch.object(http_client, 'BACKOFF_FACTOR', 0), \
+                mock.patch.object(http_client, 'BACKOFF_JITTER', 0):
+            session = http_client.create_session()
+        retries, wire_bytes = METRICS.counter('http.retries'), METRICS.counter('http.bytes')
+        self.assertEqual(http_client.fetch_text(self.url, session), PAGE)
+        self.assertEqual(len(self.server.headers), 3)
+        self.assertEqual(METRICS.counter('http.retries') - retries, 2)
+        # Compressed bytes on the wire, far fewer than the decoded page
+        self.assertLess(METRICS.counter('http.bytes') - wire_bytes, len(PAGE) / 10)
+
+    def test_no_retries_when_disabled(self):
+        self.server.failures = 1
+        with self.assertRaises(requests.exceptions.HTTPError):
+            http_client.fetch_text(self.url, http_client.create_session(retries=False))
+        self.assertEqual(len(self.server.headers), 1)
+
+    def test_body_size_cap(self):
+        with self.assertRaises(requests.exceptions.RequestException):
+            http_client.fetch_text(self.url, http_client.create_session(), max_bytes=1000)
+
+if __name__ == '__main__':
+    unittest.main()
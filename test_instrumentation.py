@@ -0,0 +1,108 @@
+import json
+import os
+import pstats
+import tempfile
+import threading
+import unittest
+
+import instrumentation
+from instrumentation import ExtractionProfiler, Metrics
+from process_first_url import extract_metadata, parse_html
+from test_pipeline import NYT_HTML
+
+class TestMetrics(unittest.TestCase):
+    def test_timers_counters_and_hit_rates(self):
+        metrics = Metrics()
+        for _ in range(3):
+            with metrics.timer('parse'):
+                pass
+        with self.assertRaises(ValueError), metrics.timer('extract'):
+            raise ValueError()
+        metrics.increment('cdx_cache.hits', 3)
+        metrics.increment('cdx_cache.misses')
+        metrics.increment('http.bytes', 2048)
+
+        summary = metrics.summary()
+        self.assertEqual(summary['timers']['parse']['count'], 3)
+        self.assertEqual(summary['timers']['extract']['count'], 1)
+        self.assertEqual(summary['counters']['http.bytes'], 2048)
+        self.assertEqual(summary['hit_rates'], {'cdx_cache': 0.75})
+
+    def test_concurrent_increments(self):
+        metrics = Metrics()
+
+        def work():
+            for _ in range(1000):
+                metrics.increment('n')
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(metrics.counter('n'), 4000)
+
+class TestEventLogAndProfiler(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        for handler in list(instrumentation.event_logger.handlers):
+            instrumentation.event_logger.removeHandler(handler)
+            handler.close()
+        instrumentation.set_extraction_profiler(None)
+        self.tmpdir.cleanup()
+
+    def test_events_are_json_lines(self):
+        path = os.path.join(self.tmpdir.name, 'metrics.jsonl')
+        instrumentation.enable_event_log(path)
+        metrics = Metrics()
+        with metrics.timer('cdx.request', site='cnn.com'):
+            pass
+        metrics.log_summary()
+
+        with open(path) as f:
+            events = [json.loads(line) for line in f]
+        self.assertEqual([e['event'] for e in events], ['timer', 'summary'])
+        self.assertEqual(events[0]['name'], 'cdx.request')
+        self.assertEqual(events[0]['site'], 'cnn.com')
+        self.assertEqual(events[1]['timers']['cdx.request']['count'], 1)
+
+    def test_extraction_profile_combines_calls(self):
+        path = os.path.join(self.tmpdir.name, 'extract.prof')
+        profiler = ExtractionProfiler(path)
+        instrumentation.set_extraction_profiler(profiler)
+        for _ in range(2):
+            soup = parse_html(NYT_HTML, site='nytimes.com')
+            extract_metadata(soup, 'https://www.nytimes.com/', 'nytimes.com')
+        profiler.save()
+
+        stats = pstats.Stats(path)
+        extract_calls = [calls for (filename, _, name), (_, calls, *_) in stats.stats.items()
+                         if name == 'extract_headlines' and filename.endswith('headline_extractors.py')]
+        self.assertEqual(extract_calls, [2])
+
+    def test_concurrent_extractions_are_profiled_one_at_a_time(self):
+        profiler = ExtractionProfiler(os.path.join(self.tmpdir.name, 'extract.prof'))
+        active, overlaps, lock = [], [], threading.Lock()
+
+        def extract():
+            with profiler.profile():
+                with lock:
+                    active.append(1)
+                    overlaps.append(len(active))
+                sum(range(100_000))
+                with lock:
+                    active.pop()
+
+        threads = [threading.Thread(target=extract) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(overlaps, [1, 1, 1, 1])
+        profiler.save()
+        self.assertTrue(os.path.exists(profiler.output))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+import unittest.mock
+
+from benchmarks.synthetic_pages import build_pages
+from headline_extractors import available_parsers, get_extractor, make_soup
+
+class TestParserBackends(unittest.TestCase):
+    def test_parsers_produce_identical_headlines(self):
+        pages = build_pages(stories=8, blocks=10)
+        for site, html in pages.items():
+            extractor = get_extractor(site)
+            url = f'https://web.archive.org/web/20240410060000/https://www.{site}/'
+            reference = extractor.extract_headlines(make_soup(html, 'html.parser'), url)
+            self.assertEqual(len(reference), 3, site)
+            for parser in available_parsers():
+                with self.subTest(site=site, parser=parser):
+                    self.assertEqual(extractor.extract_headlines(make_soup(html, parser), url), reference)
+
+    def test_strained_parse_matches_full_parse(self):
+        pages = build_pages(stories=8, blocks=10)
+        for site, html in pages.items():
+            extractor = get_extractor(site)
+            url = f'https://web.archive.org/web/20240410060000/https://www.{site}/'
+            with self.subTest(site=site):
+                self.assertEqual(extractor.extract_headlines(extractor.parse(html, 'html.parser'), url),
+                                 extractor.extract_headlines(make_soup(html, 'html.parser'), url))
+
+    def test_fox_strainer_falls_back_without_main(self):
+        html = ('<div><article class="article"><h2><a href="/a">Outside main</a></h2></article></div>'
+                '<footer><h2><a href="/b">Not an article</a></h2></footer>')
+        extractor = get_extractor('foxnews.com')
+        headlines = extractor.extract_headlines(extractor.parse(html, 'html.parser'), 'https://www.foxnews.com')
+        self.assertEqual([h['headline'] for h in headlines], ['Outside main'])
+
+    def test_extraction_stops_at_max_headlines(self):
+        extractor = get_extractor('nytimes.com')
+        html = ''.join(f'<section class="story-wrapper"><p class="indicate-hover">Story {i}</p>'
+                       f'<a href="/{i}">Link</a></section>' for i in range(10))
+        with unittest.mock.patch.object(extractor, 'clean_text', side_effect=lambda text: text) as clean_text:
+            headlines = extractor.extract_headlines(extractor.parse(html, 'html.parser'), 'https://www.nytimes.com')
+        self.assertEqual(len(headlines), extractor.max_headlines)
+        self.assertEqual(clean_text.call_count, extractor.max_headlines)
+
+    def test_html_parser_is_always_available(self):
+        self.assertIn('html.parser', available_parsers())
+
+    def test_default_parser_is_html_parser(self):
+        # Faster backends repair malformed markup differently, so they are opt-in
+        self.assertEqual(make_soup('<p>story</p>').builder.NAME, 'html.parser')
+
+if __name__ == '__main__':
+    unittest.main()
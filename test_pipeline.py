@@ -0,0 +1,159 @@
+import threading
+import unittest
+from unittest import mock
+
+import pipeline
+from headline_index import HeadlineIndex
+from pipeline import Pipeline, Stage
+
+NYT_HTML = """
+<html><body>
+    <section class="story-wrapper">
+        <p class="indicate-hover">Pipeline Headline</p>
+        <a href="/2024/03/pipeline">Link</a>
+    </section>
+</body></html>
+"""
+
+class FakeBrowser:
+    """Stands in for BrowserService, recording how each page was obtained"""
+
+    def __init__(self):
+        self.navigations = 0
+        self.served_html = []
+
+    def render(self, url, site, timestamp):
+        self.navigations += 1
+        return NYT_HTML
+
+    def screenshot(self, url, site, timestamp, html=None):
+        if html is None:
+            self.navigations += 1
+        else:
+            self.served_html.append(html)
+        return True
+
+class TestPipeline(unittest.TestCase):
+    def test_runs_jobs_through_all_stages(self):
+        seen = []
+        lock = threading.Lock()
+
+        def double(job):
+            job['value'] *= 2
+            return job
+
+        def drop_odd_sites(job):
+            return job if job['site'] != 'odd' else None
+
+        def collect(job):
+            with lock:
+                seen.append(job['value'])
+            return job
+
+        jobs = [{'site': 'odd' if i % 2 else 'even', 'timestamp': str(i), 'value': i} for i in range(20)]
+        pipeline = Pipeline([
+            Stage('double', double, workers=3),
+            Stage('filter', drop_odd_sites, workers=2),
+            Stage('collect', collect, workers=1),
+        ], queue_size=2)
+        summaries = pipeline.run(jobs)
+
+        self.assertEqual(sorted(seen), [i * 2 for i in range(0, 20, 2)])
+        self.assertEqual([s['processed'] for s in summaries], [20, 10, 10])
+        self.assertEqual(summaries[1]['dropped'], 10)
+
+    def test_stage_errors_are_counted_and_skipped(self):
+        def explode(job):
+            if job['timestamp'] == '1':
+                raise ValueError('boom')
+            return job
+
+        summaries = Pipeline([Stage('explode', explode, workers=2)]).run(
+            [{'site': 'cnn.com', 'timestamp': str(i)} for i in range(3)])
+        self.assertEqual((summaries[0]['processed'], summaries[0]['errors']), (2, 1))
+
+class TestFetchModes(unittest.TestCase):
+    def run_mode(self, fetch_mode):
+        browser = FakeBrowser()
+        saved = []
+        fetch_html = mock.Mock(return_value=NYT_HTML)
+        jobs = [{'site': 'nytimes.com', 'timestamp': '20240410060000',
+                 'url': 'https://web.archive.org/web/20240410060000/https://www.nytimes.com/'}]
+        with mock.patch.object(pipeline, 'fetch_html', fetch_html), \
+                mock.patch.object(pipeline, 'save_metadata', lambda *args: saved.append(args[2])):
+            pipeline.build_pipeline(browser=browser, fetch_mode=fetch_mode).run(jobs)
+        return saved[0]['headlines'], fetch_html.call_count + browser.navigations
+
+    def test_all_modes_produce_the_same_metadata(self):
+        results = {mode: self.run_mode(mode) for mode in pipeline.FETCH_MODES}
+        self.assertEqual(results['requests'][0][0]['headline'], 'Pipeline Headline')
+        self.assertEqual(results['intercept'][0], results['requests'][0])
+        self.assertEqual(results['browser'][0], results['requests'][0])
+
+        # Only the requests mode downloads the page twice
+        self.assertEqual({mode: downloads for mode, (_, downloads) in results.items()},
+                         {'requests': 2, 'intercept': 1, 'browser': 1})
+
+    def test_single_fetch_modes_need_a_browser(self):
+        with self.assertRaises(ValueError):
+            pipeline.build_pipeline(fetch_mode='browser')
+
+class TestDeduplication(unittest.TestCase):
+    def test_split_duplicate_jobs_by_digest(self):
+        jobs = [
+            {'site': 'cnn.com', 'timestamp': '20240410090000', 'url': 'u2', 'digest': 'A'},
+            {'site': 'cnn.com', 'timestamp': '20240410060000', 'url': 'u1', 'digest': 'A'},
+            {'site': 'cnn.com', 'timestamp': '20240410120000', 'url': 'u3', 'digest': 'B'},
+            {'site': 'foxnews.com', 'timestamp': '20240410060000', 'url': 'u4', 'digest': 'A'},
+            {'site': 'foxnews.com', 'timestamp': '20240410090000', 'url': 'u5', 'digest': None},
+        ]
+        unique, duplicates = pipeline.split_duplicate_jobs(jobs)
+        self.assertEqual([(j['site'], j['timestamp']) for j in duplicates], [('cnn.com', '20240410090000')])
+        self.assertEqual(duplicates[0]['duplicate_of'], '20240410060000')
+        self.assertEqual(len(unique), 4)
+
+    def test_identical_html_is_processed_once(self):
+        saved, pointers = [], []
+        jobs = [{'site': 'nytimes.com', 'timestamp': ts, 'url': f'https://example.org/{ts}', 'digest': ts}
+                for ts in ('20240410060000', '20240410090000')]
+        headline_index = HeadlineIndex(':memory:')
+        with mock.patch.object(pipeline, 'fetch_html', return_value=NYT_HTML), \
+                mock.patch.object(pipeline, 'save_metadata', lambda *args: saved.append(args)), \
+                mock.patch.object(pipeline, 'save_duplicate_pointer', lambda *args, **kw: pointers.append(args)):
+            pipeline.build_pipeline(fetch_workers=1, screenshots=False, headline_index=headline_index).run(jobs)
+
+        # The duplicate is indexed with the original's headlines
+        self.assertEqual([r['timestamp'] for r in headline_index.search('pipeline')],
+                         ['20240410060000', '20240410090000'])
+        headline_index.close()
+        self.assertEqual(len(saved), 1)
+        self.assertEqual(len(saved[0][2]['content_hash']), 64)
+        self.assertEqual([p[1] for p in pointers], ['20240410090000'])
+        self.assertEqual(pointers[0][3], '20240410060000')
+
+    def test_content_hash_ignores_wayback_additions(self):
+        def archived(timestamp, retrieved):
+            return (f'<html><head><script src="https://web-static.archive.org/_static/js/bundle-playback.js">'
+                    f'</script><script>__wm.wombat("https://www.cnn.com/","{timestamp}")</script>'
+                    f'<!-- End Wayback Rewrite JS Include --></head><body>'
+                    f'<!-- BEGIN WAYBACK TOOLBAR INSERT --><div id="wm-ipp">{timestamp}</div>'
+                    f'<!-- END WAYBACK TOOLBAR INSERT -->'
+                    f'<a href="/web/{timestamp}/https://www.cnn.com/politics">Politics</a>'
+                    f'<img src="/web/{timestamp}im_/https://media.cnn.com/a.jpg"></body></html>'
+                    f'<!-- FILE ARCHIVED ON {timestamp} AND RETRIEVED ON {retrieved} -->')
+
+        first = pipeline.content_hash(archived('20240410060312', '20240501'))
+        self.assertEqual(pipeline.content_hash(archived('20240410090217', '20240502')), first)
+        self.assertNotEqual(pipeline.content_hash(archived('20240410060312', '20240501').replace('Politics', 'World')),
+                            first)
+
+    def test_content_claims_keep_the_earliest_capture(self):
+        index = pipeline.ContentIndex()
+        # A later slot fetched first does not make the earlier one a pointer to it
+        self.assertIsNone(index.claim('cnn.com', 'A', '20240410090000'))
+        self.assertIsNone(index.claim('cnn.com', 'A', '20240410060000'))
+        self.assertEqual(index.claim('cnn.com', 'A', '20240410120000'), '20240410060000')
+        self.assertIsNone(index.claim('foxnews.com', 'A', '20240410120000'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+import os
+import tempfile
+import unittest
+
+from reextract import find_raw_files, parse_raw_filename, reextract
+from test_pipeline import NYT_HTML
+
+class TestReextract(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.directory = os.path.join(self.tmpdir.name, 'screenshots')
+        os.makedirs(os.path.join(self.directory, '2024'))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write(self, name: str, html: str = NYT_HTML):
+        with open(os.path.join(self.directory, name), 'w', encoding='utf-8') as f:
+            f.write(html)
+
+    def test_parse_raw_filename(self):
+        self.assertEqual(parse_raw_filename('screenshots/nytimes.com_20240410060000_raw.html'),
+                         ('nytimes.com', '20240410060000'))
+        for name in ('nytimes.com_raw.html', 'nytimes.com_20240410_raw.html', 'notes_raw.html'):
+            with self.subTest(name=name), self.assertRaises(ValueError):
+                parse_raw_filename(name)
+
+    def test_results_are_grouped_and_errors_counted(self):
+        self.write('nytimes.com_20240410060000_raw.html')
+        self.write(os.path.join('2024', 'nytimes.com_20240410090000_raw.html'))
+        self.write('example.org_20240410060000_raw.html')
+        self.write('nytimes.com_raw.html')
+
+        paths = find_raw_files(self.directory)
+        self.assertEqual(len(paths), 4)
+        with self.assertLogs(level='ERROR') as logs:
+            results = reextract(paths, workers=1)
+
+        self.assertEqual(list(results), ['nytimes.com'])
+        self.assertEqual(sorted(results['nytimes.com']), ['20240410060000', '20240410090000'])
+        capture = results['nytimes.com']['20240410060000']
+        self.assertEqual(capture['url'], 'https://web.archive.org/web/20240410060000/https://www.nytimes.com/')
+        self.assertEqual(capture['headlines'][0]['headline'], 'Pipeline Headline')
+        self.assertEqual(len(logs.records), 2)
+        self.assertTrue(any('nytimes.com_raw.html' in record.getMessage() for record in logs.records))
+
+if __name__ == '__main__':
+    unittest.main()
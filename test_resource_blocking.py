@@ -0,0 +1,42 @@
+import unittest
+
+from resource_blocking import BlockStats, DEFAULT_PROFILE, get_block_profile, original_url
+
+ARCHIVE = 'https://web.archive.org/web/20240410060000'
+
+class TestBlockProfile(unittest.TestCase):
+    def test_original_url_unwraps_wayback_urls(self):
+        self.assertEqual(original_url(f'{ARCHIVE}js_/https://www.googletagmanager.com/gtm.js?id=1'),
+                         'https://www.googletagmanager.com/gtm.js?id=1')
+        self.assertEqual(original_url('https://www.cnn.com/'), 'https://www.cnn.com/')
+
+    def test_archived_trackers_are_stubbed(self):
+        url = f'{ARCHIVE}js_/https://securepubads.g.doubleclick.net/tag/js/gpt.js'
+        self.assertEqual(DEFAULT_PROFILE.decide(url, 'script'), 'stub')
+        self.assertEqual(DEFAULT_PROFILE.decide(url, 'image'), 'abort')
+
+    def test_wayback_banner_is_blocked(self):
+        url = 'https://web.archive.org/_static/css/banner-styles.css?v=1'
+        self.assertEqual(DEFAULT_PROFILE.decide(url, 'stylesheet'), 'abort')
+        self.assertIn('#wm-ipp-base', DEFAULT_PROFILE.hide_css())
+
+    def test_first_party_content_is_allowed(self):
+        self.assertIsNone(DEFAULT_PROFILE.decide(f'{ARCHIVE}/https://www.cnn.com/', 'document'))
+        self.assertIsNone(DEFAULT_PROFILE.decide(f'{ARCHIVE}im_/https://media.cnn.com/a.jpg', 'image'))
+
+    def test_site_profiles(self):
+        font = f'{ARCHIVE}/https://g1.nyt.com/fonts/cheltenham.woff2'
+        self.assertEqual(get_block_profile('cnn.com').decide(font, 'font'), 'abort')
+        self.assertIsNone(get_block_profile('nytimes.com').decide(font, 'font'))
+
+    def test_stats(self):
+        stats = BlockStats()
+        stats.record('font', 'abort')
+        stats.record('script', None)
+        summary = stats.summary()
+        self.assertEqual((summary['requests_blocked'], summary['requests_allowed']), (1, 1))
+        self.assertEqual(summary['blocked_by_type'], {'font': 1})
+        self.assertGreater(summary['estimated_bytes_saved'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,36 @@
+import unittest
+from snapshot_index import SnapshotIndex, timestamp_to_epoch
+
+HEADER = ['timestamp', 'original', 'digest']
+
+class TestSnapshotIndex(unittest.TestCase):
+    def test_nearest_uses_real_time_distance(self):
+        # 235900 on the previous day is one minute away from midnight, while a
+        # raw digit diff would make 001500 look closer
+        rows = [
+            HEADER,
+            ['20240410001500', 'https://www.cnn.com/', 'B'],
+            ['20240409235900', 'https://www.cnn.com/', 'A'],
+        ]
+        index = SnapshotIndex(rows)
+        self.assertEqual(index.nearest('20240410000000'), ('20240409235900', 'https://www.cnn.com/', 60))
+
+    def test_matches_linear_scan(self):
+        captures = ['20240410%02d%02d00' % (hour, minute) for hour in range(24) for minute in (7, 31, 52)]
+        rows = [HEADER] + [[ts, 'https://www.cnn.com/', ts] for ts in captures]
+        index = SnapshotIndex(rows)
+
+        for target in ['20240410%02d0000' % hour for hour in range(24)] + ['20240409120000', '20240411120000']:
+            expected = min(captures, key=lambda ts: abs(timestamp_to_epoch(ts) - timestamp_to_epoch(target)))
+            self.assertEqual(index.nearest(target)[0], expected)
+
+    def test_ties_prefer_earlier_capture(self):
+        rows = [HEADER, ['20240410055900', 'u', 'A'], ['20240410060100', 'u', 'B']]
+        self.assertEqual(SnapshotIndex(rows).nearest('20240410060000')[0], '20240410055900')
+
+    def test_empty_listing(self):
+        self.assertIsNone(SnapshotIndex([]).nearest('20240410060000'))
+        self.assertIsNone(SnapshotIndex([HEADER]).nearest('20240410060000'))
+
+if __name__ == '__main__':
+    unittest.main()
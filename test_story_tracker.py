@@ -0,0 +1,138 @@
+import json
+import os
+import tempfile
+import unittest
+
+import pipeline
+from story_tracker import StoryTracker, ingest_directory, minhash, normalize, similarity
+
+def headlines(*texts):
+    return [{'headline': text} for text in texts]
+
+class TestMinHash(unittest.TestCase):
+    def test_similar_wording_scores_higher(self):
+        original = minhash(normalize('Senate passes sweeping budget deal after all-night session'))
+        reworded = minhash(normalize('Senate passed sweeping budget deal after all-night session'))
+        unrelated = minhash(normalize('Storm knocks out power to thousands on the coast'))
+        self.assertGreater(similarity(original, reworded), 0.7)
+        self.assertLess(similarity(original, unrelated), 0.2)
+
+    def test_normalize_ignores_case_and_punctuation(self):
+        self.assertEqual(normalize('  Budget DEAL: what\u2019s next?'), normalize('budget deal what s next'))
+
+class TestStoryTracker(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.tracker = StoryTracker(os.path.join(self.tmpdir.name, 'stories.db'))
+
+    def tearDown(self):
+        self.tracker.close()
+        self.tmpdir.cleanup()
+
+    def test_change_events_between_captures(self):
+        first = headlines('Senate passes sweeping budget deal after all-night session',
+                          'Storm knocks out power to thousands on the coast',
+                          'Markets rally as inflation cools')
+        self.assertEqual(self.tracker.process('cnn.com', '20240410060000', first)['previous_timestamp'], None)
+
+        second = headlines('Storm knocks out power to thousands on the coast',
+                           'Senate passed sweeping budget deal after all-night session',
+                           'Eclipse draws crowds across the country')
+        changes = self.tracker.process('cnn.com', '20240410090000', second)
+        self.assertEqual(changes['previous_timestamp'], '20240410060000')
+        events = {e['headline']: e for e in changes['events']}
+        self.assertEqual({text: e['type'] for text, e in events.items()}, {
+            'Storm knocks out power to thousands on the coast': 'persisting',
+            'Senate passed sweeping budget deal after all-night session': 'reworded',
+            'Eclipse draws crowds across the country': 'new',
+            'Markets rally as inflation cools': 'dropped',
+        })
+        reworded = events['Senate passed sweeping budget deal after all-night session']
+        self.assertEqual(reworded['previous'], 'Senate passes sweeping budget deal after all-night session')
+        self.assertEqual(second[1]['story_id'], first[0]['story_id'])
+        self.assertEqual(events['Storm knocks out power to thousands on the coast']['previous_position'], 1)
+
+    def test_stories_cluster_across_sites(self):
+        cnn = headlines('Senate passes sweeping budget deal after all-night session')
+        fox = headlines('Senate passes sweeping budget deal after all night session!',
+                        'Border crossings fall for third month')
+        self.tracker.process('cnn.com', '20240410060000', cnn)
+        self.tracker.process('foxnews.com', '20240410060000', fox)
+        self.assertEqual(fox[0]['story_id'], cnn[0]['story_id'])
+        self.assertNotEqual(fox[1]['story_id'], cnn[0]['story_id'])
+        self.assertEqual([(s['site'], s['position']) for s in self.tracker.story(cnn[0]['story_id'])],
+                         [('cnn.com', 0), ('foxnews.com', 0)])
+
+    def test_captures_processed_out_of_order(self):
+        storm = 'Storm knocks out power to thousands on the coast'
+        later = headlines(storm)
+        self.tracker.process('foxnews.com', '20240410090000', later)
+        self.tracker.process('cnn.com', '20240410090000', headlines('Markets rally'))
+        earlier = self.tracker.process('cnn.com', '20240410060000', headlines(storm))
+        self.assertEqual([e['type'] for e in earlier['events']], ['new'])
+
+        # The 09:00 capture was diffed against nothing; now it follows 06:00
+        self.assertEqual(self.tracker.next_capture('cnn.com', '20240410060000'), '20240410090000')
+        self.assertIsNone(self.tracker.next_capture('cnn.com', '20240410090000'))
+        changes = self.tracker.changes('cnn.com', '20240410090000')
+        self.assertEqual(changes['previous_timestamp'], '20240410060000')
+        self.assertEqual([e['type'] for e in changes['events']], ['new', 'dropped'])
+        first = self.tracker._conn.execute('SELECT first_site, first_timestamp FROM stories WHERE id = ?',
+                                           (later[0]['story_id'],)).fetchone()
+        self.assertEqual(first, ('cnn.com', '20240410060000'))
+
+    def test_stories_stage_rewrites_later_slot_processed_first(self):
+        cwd = os.getcwd()
+        os.chdir(self.tmpdir.name)
+        self.addCleanup(os.chdir, cwd)
+        os.makedirs('screenshots')
+        stage = pipeline.make_stories_stage(self.tracker)
+        for timestamp, texts in (('20240410090000', ['Storm hits coast', 'Markets rally']),
+                                 ('20240410060000', ['Storm hits coast'])):
+            metadata = {'headlines': headlines(*texts)}
+            with open(f'screenshots/cnn.com_{timestamp}_metadata.json', 'w') as f:
+                json.dump(metadata, f)
+            stage({'site': 'cnn.com', 'timestamp': timestamp, 'metadata': metadata})
+
+        with open('screenshots/cnn.com_20240410090000_metadata.json') as f:
+            metadata = json.load(f)
+        self.assertEqual(metadata['changes']['previous_timestamp'], '20240410060000')
+        self.assertEqual([e['type'] for e in metadata['changes']['events']], ['persisting', 'new'])
+        self.assertTrue(all('story_id' in h for h in metadata['headlines']))
+
+    def test_ingest_directory_writes_changes_into_metadata(self):
+        directory = os.path.join(self.tmpdir.name, 'screenshots')
+        os.makedirs(directory)
+        for timestamp, texts in (('20240410060000', ['Storm hits coast']),
+                                 ('20240410090000', ['Storm hits coast', 'Markets rally'])):
+            with open(os.path.join(directory, f'cnn.com_{timestamp}_metadata.json'), 'w') as f:
+                json.dump({'headlines': headlines(*texts)}, f)
+
+        self.assertEqual(ingest_directory(self.tracker, directory), 2)
+        self.assertEqual(ingest_directory(self.tracker, directory), 0)
+        with open(os.path.join(directory, 'cnn.com_20240410090000_metadata.json')) as f:
+            metadata = json.load(f)
+        self.assertEqual([e['type'] for e in metadata['changes']['events']], ['persisting', 'new'])
+        self.assertTrue(all('story_id' in h for h in metadata['headlines']))
+
+        # An earlier capture added later is tracked, and the next one rediffed against it
+        with open(os.path.join(directory, 'cnn.com_20240410030000_metadata.json'), 'w') as f:
+            json.dump({'headlines': headlines('Markets rally')}, f)
+        self.assertEqual(ingest_directory(self.tracker, directory), 1)
+        with open(os.path.join(directory, 'cnn.com_20240410060000_metadata.json')) as f:
+            changes = json.load(f)['changes']
+        self.assertEqual(changes['previous_timestamp'], '20240410030000')
+        self.assertEqual([e['type'] for e in changes['events']], ['new', 'dropped'])
+
+    def test_capture_without_headlines_is_processed_once(self):
+        directory = os.path.join(self.tmpdir.name, 'screenshots')
+        os.makedirs(directory)
+        with open(os.path.join(directory, 'cnn.com_20240410060000_metadata.json'), 'w') as f:
+            json.dump({'headlines': []}, f)
+
+        self.assertEqual(ingest_directory(self.tracker, directory), 1)
+        self.assertTrue(self.tracker.is_processed('cnn.com', '20240410060000'))
+        self.assertEqual(ingest_directory(self.tracker, directory), 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,187 @@
+import json
+import os
+import tempfile
+import unittest
+
+from PIL import Image, ImageDraw
+
+import pipeline
+import visual_change
+from artifact_store import ArtifactStore
+
+def homepage(path: str, lead_stripes: int = 0, ad_pixel=(0, 0, 0)):
+    """A 1920x1080 page of grey text blocks around a lead image, plain or striped."""
+    img = Image.new('RGB', (1920, 1080), (255, 255, 255))
+    draw = ImageDraw.Draw(img)
+    for row in range(12):
+        for col in range(3):
+            shade = 40 + (row * 37 + col * 53) % 160
+            draw.rectangle((1300 + col * 200, 40 + row * 85, 1460 + col * 200, 90 + row * 85), fill=(shade,) * 3)
+    draw.rectangle((40, 40, 1200, 700), fill=(180, 40, 40))
+    for stripe in range(lead_stripes):
+        x = 40 + stripe * 1160 // lead_stripes
+        draw.rectangle((x, 40 + stripe * 20, x + 1160 // lead_stripes // 2, 700), fill=(20, 20, 60))
+    # A rotating ad ID: a few pixels that change on every capture
+    draw.rectangle((10, 1060, 14, 1064), fill=ad_pixel)
+    img.save(path)
+
+def full_page(path: str, lead_stripes: int = 0, ad_pixel=(0, 0, 0)):
+    """A four-screen page of grey story blocks, with a striped image on the
+    third screen if lead_stripes."""
+    img = Image.new('RGB', (1920, 4 * 1080), (255, 255, 255))
+    draw = ImageDraw.Draw(img)
+    for screen in range(4):
+        for row in range(10):
+            for col in range(4):
+                shade = 40 + (row * 37 + col * 53) % 160
+                top = screen * 1080 + 60 + row * 100
+                draw.rectangle((100 + col * 440, top, 480 + col * 440, top + 50), fill=(shade,) * 3)
+    for stripe in range(lead_stripes):
+        x = 100 + stripe * 840 // lead_stripes
+        draw.rectangle((x, 2220 + stripe * 20, x + 840 // lead_stripes // 2, 2760), fill=(20, 20, 60))
+    draw.rectangle((10, 4300, 14, 4304), fill=ad_pixel)
+    img.save(path)
+
+class TestVisualChange(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmpdir.name)
+        os.makedirs('screenshots')
+        self.index = visual_change.VisualIndex('cache/visual.db')
+
+    def tearDown(self):
+        self.index.close()
+        os.chdir(self.cwd)
+        self.tmpdir.cleanup()
+
+    def capture(self, timestamp, **kwargs):
+        homepage(f'screenshots/cnn.com_{timestamp}.png', **kwargs)
+        with open(f'screenshots/cnn.com_{timestamp}_metadata.json', 'w') as f:
+            json.dump({'headlines': []}, f)
+
+    def test_near_duplicates_become_references(self):
+        self.capture('20240410060000')
+        self.capture('20240410090000', ad_pixel=(255, 0, 255))
+        self.capture('20240410120000', lead_stripes=7)
+        self.capture('20240410150000', lead_stripes=7, ad_pixel=(0, 255, 0))
+
+        results = {}
+        for timestamp in ('20240410060000', '20240410090000', '20240410120000', '20240410150000'):
+            results[timestamp] = visual_change.compare_screenshots(self.index, 'cnn.com', timestamp)['screenshot']
+            visual_change.record_visual_change('cnn.com', timestamp, {'screenshot': results[timestamp]})
+
+        self.assertEqual({ts: r['duplicate_of'] for ts, r in results.items()}, {
+            '20240410060000': None,
+            '20240410090000': '20240410060000',
+            '20240410120000': None,
+            '20240410150000': '20240410120000',
+        })
+        self.assertIsNone(results['20240410060000']['change_score'])
+        self.assertLessEqual(results['20240410090000']['change_score'], visual_change.NEAR_DUPLICATE_THRESHOLD)
+        self.assertGreater(results['20240410120000']['change_score'], 0.05)
+        self.assertEqual(sorted(os.listdir('screenshots')), [
+            'cnn.com_20240410060000.png', 'cnn.com_20240410060000_metadata.json',
+            'cnn.com_20240410090000_metadata.json',
+            'cnn.com_20240410120000.png', 'cnn.com_20240410120000_metadata.json',
+            'cnn.com_20240410150000_metadata.json',
+        ])
+        with open('screenshots/cnn.com_20240410090000_metadata.json') as f:
+            self.assertEqual(json.load(f)['visual']['screenshot']['duplicate_of'], '20240410060000')
+
+        # Running again leaves the references recorded for images already removed
+        for timestamp in results:
+            visual = visual_change.compare_screenshots(self.index, 'cnn.com', timestamp)
+            visual_change.record_visual_change('cnn.com', timestamp, visual)
+        with open('screenshots/cnn.com_20240410090000_metadata.json') as f:
+            self.assertEqual(json.load(f)['visual']['screenshot']['duplicate_of'], '20240410060000')
+
+    def test_full_page_changed_below_the_fold_is_kept(self):
+        results = {}
+        for timestamp, kwargs in (('20240410060000', {}), ('20240410090000', {'ad_pixel': (255, 0, 255)}),
+                                  ('20240410120000', {'lead_stripes': 7})):
+            self.capture(timestamp)
+            full_page(f'screenshots/cnn.com_{timestamp}_full.png', **kwargs)
+            results[timestamp] = visual_change.compare_screenshots(self.index, 'cnn.com', timestamp)
+
+        self.assertEqual([len(r['full_page']['dhash'].split(',')) for r in results.values()], [4, 4, 4])
+        self.assertEqual(results['20240410090000']['full_page']['duplicate_of'], '20240410060000')
+        self.assertIsNone(results['20240410120000']['full_page']['duplicate_of'])
+        self.assertEqual(results['20240410120000']['screenshot']['duplicate_of'], '20240410060000')
+        self.assertTrue(os.path.exists('screenshots/cnn.com_20240410120000_full.png'))
+
+    def test_pipeline_rescores_captures_finished_out_of_order(self):
+        in_flight = set()
+        visual = pipeline.make_visual_stage(self.index, in_flight=in_flight)
+        order = pipeline.make_visual_order_stage(self.index, in_flight)
+        self.capture('20240410060000')
+        self.capture('20240410090000', lead_stripes=7)
+        self.capture('20240410120000', ad_pixel=(255, 0, 255))
+        jobs = {ts: {'site': 'cnn.com', 'timestamp': ts, 'metadata': {'headlines': []}}
+                for ts in ('20240410060000', '20240410090000', '20240410120000')}
+
+        order(visual(jobs['20240410060000']))
+        # 12:00 is compared with 06:00 and removed before 09:00 is recorded
+        order(visual(jobs['20240410120000']))
+        self.assertEqual(jobs['20240410120000']['visual']['screenshot']['duplicate_of'], '20240410060000')
+        order(visual(jobs['20240410090000']))
+
+        with open('screenshots/cnn.com_20240410120000_metadata.json') as f:
+            result = json.load(f)['visual']['screenshot']
+        self.assertEqual(result['previous_timestamp'], '20240410090000')
+        self.assertGreater(result['change_score'], 0.05)
+        # Its image is gone, so it still points at the one it matched
+        self.assertEqual(result['duplicate_of'], '20240410060000')
+        with open('screenshots/cnn.com_20240410090000_metadata.json') as f:
+            self.assertEqual(json.load(f)['visual']['screenshot']['previous_timestamp'], '20240410060000')
+        self.assertEqual(in_flight, set())
+
+    def test_unfinished_next_slot_rescores_itself(self):
+        in_flight = set()
+        visual = pipeline.make_visual_stage(self.index, in_flight=in_flight)
+        order = pipeline.make_visual_order_stage(self.index, in_flight)
+        self.capture('20240410060000')
+        self.capture('20240410090000', lead_stripes=7)
+        jobs = {ts: {'site': 'cnn.com', 'timestamp': ts, 'metadata': {'headlines': []}}
+                for ts in ('20240410060000', '20240410090000')}
+        visual(jobs['20240410090000'])
+        order(visual(jobs['20240410060000']))
+        order(jobs['20240410090000'])
+
+        self.assertEqual(jobs['20240410090000']['visual']['screenshot']['previous_timestamp'], '20240410060000')
+        with open('screenshots/cnn.com_20240410090000_metadata.json') as f:
+            self.assertEqual(json.load(f)['visual']['screenshot']['previous_timestamp'], '20240410060000')
+
+    def test_pipeline_stage_links_duplicates_in_store(self):
+        store = ArtifactStore('store')
+        stage = pipeline.store_screenshots(pipeline.make_visual_stage(self.index, store), store)
+        for timestamp, ad_pixel in (('20240410060000', (0, 0, 0)), ('20240410090000', (255, 0, 255))):
+            self.capture(timestamp, ad_pixel=ad_pixel)
+            stage({'site': 'cnn.com', 'timestamp': timestamp, 'metadata': {'headlines': []}})
+
+        first = store.get_artifact('cnn.com', '20240410060000', 'screenshot')
+        self.assertIsNotNone(first)
+        self.assertEqual(store.get_artifact('cnn.com', '20240410090000', 'screenshot'), first)
+        metadata = json.loads(store.get_artifact('cnn.com', '20240410090000', 'metadata'))
+        self.assertEqual(metadata['visual']['screenshot']['duplicate_of'], '20240410060000')
+        self.assertEqual(store.stats()['blobs'], 3)
+        store.close()
+
+    def test_pipeline_derivatives_for_a_kept_full_page(self):
+        self.capture('20240410060000')
+        self.capture('20240410090000', ad_pixel=(255, 0, 255))
+        homepage('screenshots/cnn.com_20240410090000_full.png', lead_stripes=7)
+        visual = pipeline.make_visual_stage(self.index)
+        derivatives = pipeline.make_derivatives_stage(full_page='downsample')
+        for timestamp in ('20240410060000', '20240410090000'):
+            job = derivatives(visual({'site': 'cnn.com', 'timestamp': timestamp, 'metadata': {'headlines': []}}))
+
+        self.assertEqual(job['visual']['screenshot']['duplicate_of'], '20240410060000')
+        self.assertEqual(job['images']['full_page']['width'], 1280)
+        with open('screenshots/cnn.com_20240410090000_metadata.json') as f:
+            metadata = json.load(f)
+        self.assertIn('visual', metadata)
+        self.assertEqual(metadata['images']['derivatives'], {})
+
+if __name__ == '__main__':
+    unittest.main()
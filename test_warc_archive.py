@@ -0,0 +1,105 @@
+import gzip
+import os
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+import process_first_url
+from reextract import extract_warc_page
+from test_pipeline import NYT_HTML
+from warc_archive import INDEX_FILE, WarcIndex, WarcWriter, iter_records
+
+class StubArchiveHandler(BaseHTTPRequestHandler):
+    """Redirects /web/<timestamp>/... to the capture at 060312 and serves it gzipped"""
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        if '060000' in self.path:
+            self.send_response(302)
+            self.send_header('Location', self.path.replace('060000', '060312'))
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        body = gzip.compress(NYT_HTML.encode('utf-8'))
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class TestWarcArchive(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.directory = os.path.join(self.tmpdir.name, 'warc')
+
+    def tearDown(self):
+        process_first_url.set_warc_writer(None)
+        process_first_url.set_warc_replay(None)
+        self.tmpdir.cleanup()
+
+    def test_records_are_indexed_and_can_be_reindexed(self):
+        writer = WarcWriter(self.directory)
+        writer.write_response('https://www.cnn.com/', 200, 'OK', [('Content-Type', 'text/html'),
+                                                                   ('Content-Encoding', 'gzip')],
+                              b'<html>cnn</html>', site='cnn.com', timestamp='20240410060000')
+        writer.write_response('https://www.cnn.com/style.css', 200, 'OK', [('Content-Type', 'text/css')],
+                              b'body {}')
+        writer.close()
+
+        paths = [os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                 if name.endswith('.warc.gz')]
+        self.assertEqual(len(paths), 1)
+        # Each record is a separate gzip member, so the file is also one valid gzip stream
+        with gzip.open(paths[0], 'rb') as f:
+            self.assertTrue(f.read().startswith(b'WARC/1.1\r\nWARC-Type: warcinfo'))
+        self.assertEqual([r.type for _, _, r in iter_records(paths[0])],
+                         ['warcinfo', 'response', 'request', 'response', 'request'])
+
+        os.remove(os.path.join(self.directory, INDEX_FILE))
+        index = WarcIndex(self.directory)
+        self.assertEqual(index.rebuild(), 2)
+        page = index.page('cnn.com', '20240410060000')
+        self.assertEqual((page.http_status, page.body), (200, b'<html>cnn</html>'))
+        self.assertNotIn('Content-Encoding', dict(page.http_headers))
+        self.assertEqual(index.lookup('https://www.cnn.com/style.css').content_type(), 'text/css')
+        self.assertIsNone(index.lookup('https://www.cnn.com/missing.js'))
+        self.assertEqual(index.stats(), {'responses': 2, 'captures': 1})
+        index.close()
+
+    def test_fetch_then_replay_offline(self):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), StubArchiveHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f'http://127.0.0.1:{server.server_port}/web/20240410060000/https://www.nytimes.com/'
+        writer = WarcWriter(self.directory)
+        process_first_url.set_warc_writer(writer)
+        try:
+            fetched = process_first_url.fetch_html(url, 'nytimes.com', '20240410060000')
+        finally:
+            process_first_url.set_warc_writer(None)
+            server.shutdown()
+            server.server_close()
+        writer.close()
+
+        index = WarcIndex(self.directory)
+        process_first_url.set_warc_replay(index)
+        # Found by capture, and by the URL requested before the archive redirected it
+        self.assertEqual(process_first_url.fetch_html(url, 'nytimes.com', '20240410060000'), fetched)
+        self.assertEqual(process_first_url.fetch_html(url), fetched)
+        with self.assertRaises(requests.exceptions.RequestException):
+            process_first_url.fetch_html(url.replace('nytimes', 'cnn'))
+
+        pages = index.pages()
+        self.assertEqual([page[:3] for page in pages], [('nytimes.com', '20240410060000', url)])
+        result = extract_warc_page(pages[0])
+        self.assertEqual(result['headlines'][0]['headline'], 'Pipeline Headline')
+        index.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,248 @@
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image
+
+from derivatives import find_screenshots, open_capture
+from process_first_url import VIEWPORT, screenshot_paths
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+DEFAULT_HASH_DB = 'cache/visual_hashes.db'
+
+# dHash over a 16x16 grid (256 bits); 8x8 is too coarse to notice a new lead
+# image on a 3840px-wide homepage
+HASH_SIZE = 16
+# Images are hashed in tiles of one viewport's height, so a story changing far
+# down a full-page capture counts as much as one changing above the fold
+TILE_ASPECT = VIEWPORT['height'] / VIEWPORT['width']
+# Score of a tile only one of two images has
+UNRELATED_SCORE = 0.5
+# Fraction of differing bits at or below which a screenshot counts as a
+# near-duplicate of the last one kept
+NEAR_DUPLICATE_THRESHOLD = 0.02
+
+# Screenshot kinds and their paths, in the order screenshot_paths returns them
+KINDS = ('screenshot', 'full_page')
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS hashes (
+        site TEXT NOT NULL,
+        timestamp TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        -- Comma-separated hex dHash of each viewport-high tile, top to bottom
+        dhash TEXT NOT NULL,
+        change_score REAL,
+        -- Timestamp of the kept image this one is stored as a reference to
+        duplicate_of TEXT,
+        PRIMARY KEY (site, timestamp, kind)
+    );
+'''
+
+def dhash(img, size: int = HASH_SIZE) -> int:
+    """Difference hash: whether each cell of a size x size grayscale thumbnail
+    is brighter than its right-hand neighbour."""
+    # BOX averages every source pixel into its cell and is much faster than Lanczos
+    pixels = img.resize((size + 1, size), Image.BOX).tobytes()
+    value = 0
+    for row in range(size):
+        for col in range(size):
+            left = pixels[row * (size + 1) + col]
+            right = pixels[row * (size + 1) + col + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+def tile_hashes(path: str, size: int = HASH_SIZE) -> List[int]:
+    """dHash of each viewport-high tile of an image, top to bottom; a viewport
+    screenshot is a single tile."""
+    with open_capture(path) as img:
+        gray = img.convert('L')
+    tile_height = max(1, round(gray.width * TILE_ASPECT))
+    return [dhash(gray.crop((0, top, gray.width, min(top + tile_height, gray.height))), size)
+            for top in range(0, gray.height, tile_height)]
+
+def change_score(first: List[int], second: List[int], size: int = HASH_SIZE) -> float:
+    """Fraction of hash bits that differ in the most changed tile: 0 for
+    identical images, about 0.5 for unrelated ones."""
+    scores = [(a ^ b).bit_count() / (size * size) for a, b in zip(first, second)]
+    if len(first) != len(second):
+        scores.append(UNRELATED_SCORE)
+    return max(scores)
+
+def parse_hashes(value: str) -> List[int]:
+    return [int(tile, 16) for tile in value.split(',')]
+
+def format_hashes(hashes: List[int], size: int = HASH_SIZE) -> str:
+    return ','.join(f'{tile:0{size * size // 4}x}' for tile in hashes)
+
+class VisualIndex:
+    """Perceptual hashes of every screenshot, compared slot to slot.
+
+    Each screenshot is scored against the previous slot of its site, and is a
+    near-duplicate when every tile is within threshold of the image that slot
+    uses (comparing with the kept image, not the previous reference, stops slow
+    drift from accumulating into a long chain of references).
+    """
+
+    def __init__(self, path: str = DEFAULT_HASH_DB, threshold: float = NEAR_DUPLICATE_THRESHOLD):
+        self.path = path
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode = WAL')
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    def _hash(self, site: str, timestamp: str, kind: str) -> Optional[List[int]]:
+        row = self._conn.execute('SELECT dhash FROM hashes WHERE site = ? AND timestamp = ? AND kind = ?',
+                                 (site, timestamp, kind)).fetchone()
+        return parse_hashes(row[0]) if row else None
+
+    def _match_previous(self, site: str, timestamp: str, kind: str,
+                        hashes: List[int]) -> Tuple[Optional[str], Optional[float], Optional[str]]:
+        """Return (previous timestamp, change score against it, kept image
+        matched) for a screenshot; the last is None unless it is a near-duplicate."""
+        previous = self._conn.execute('''
+            SELECT timestamp, dhash, duplicate_of FROM hashes
+            WHERE site = ? AND kind = ? AND timestamp < ? ORDER BY timestamp DESC LIMIT 1
+        ''', (site, kind, timestamp)).fetchone()
+        if not previous:
+            return None, None, None
+        previous_timestamp, previous_hash, previous_duplicate_of = previous
+        score = change_score(hashes, parse_hashes(previous_hash))
+        kept = previous_duplicate_of or previous_timestamp
+        kept_hash = self._hash(site, kept, kind) if previous_duplicate_of else parse_hashes(previous_hash)
+        if (kept_hash is not None and len(kept_hash) == len(hashes)
+                and change_score(hashes, kept_hash) <= self.threshold):
+            return previous_timestamp, score, kept
+        return previous_timestamp, score, None
+
+    def compare(self, site: str, timestamp: str, kind: str, hashes: List[int]) -> Dict:
+        """Record a screenshot's hash and return {'dhash', 'previous_timestamp',
+        'change_score', 'duplicate_of'}; duplicate_of is None unless the image
+        can be stored as a reference to that earlier capture's."""
+        with self._lock:
+            with self._conn:
+                previous_timestamp, score, duplicate_of = self._match_previous(site, timestamp, kind, hashes)
+                self._conn.execute('''
+                    INSERT OR REPLACE INTO hashes (site, timestamp, kind, dhash, change_score, duplicate_of)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (site, timestamp, kind, format_hashes(hashes), score, duplicate_of))
+        return comparison(hashes, previous_timestamp, score, duplicate_of)
+
+    def refresh(self, site: str, timestamp: str, kind: str) -> Optional[Dict]:
+        """Compare a recorded screenshot again with the slot now before it,
+        which differs once an earlier slot is recorded after it.
+
+        A kept image stays kept, since it may already be in the store or have
+        derivatives. A reference moves to the image the new previous slot uses
+        if it matches that one, and otherwise keeps the image it matched.
+        """
+        with self._lock:
+            with self._conn:
+                row = self._conn.execute('''
+                    SELECT dhash, duplicate_of FROM hashes WHERE site = ? AND timestamp = ? AND kind = ?
+                ''', (site, timestamp, kind)).fetchone()
+                if not row:
+                    return None
+                hashes, duplicate_of = parse_hashes(row[0]), row[1]
+                previous_timestamp, score, kept = self._match_previous(site, timestamp, kind, hashes)
+                if duplicate_of and kept:
+                    duplicate_of = kept
+                self._conn.execute('''
+                    UPDATE hashes SET change_score = ?, duplicate_of = ?
+                    WHERE site = ? AND timestamp = ? AND kind = ?
+                ''', (score, duplicate_of, site, timestamp, kind))
+        return comparison(hashes, previous_timestamp, score, duplicate_of)
+
+    def next_timestamp(self, site: str, timestamp: str) -> Optional[str]:
+        """The first slot of site after timestamp with a recorded screenshot."""
+        with self._lock:
+            row = self._conn.execute('SELECT MIN(timestamp) FROM hashes WHERE site = ? AND timestamp > ?',
+                                     (site, timestamp)).fetchone()
+        return row[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def comparison(hashes: List[int], previous_timestamp: Optional[str], score: Optional[float],
+               duplicate_of: Optional[str]) -> Dict:
+    return {'dhash': format_hashes(hashes),
+            'previous_timestamp': previous_timestamp,
+            'change_score': round(score, 4) if score is not None else None,
+            'duplicate_of': duplicate_of}
+
+def compare_screenshots(index: VisualIndex, site: str, timestamp: str, remove_duplicates: bool = True) -> Dict:
+    """Hash a capture's screenshots and compare them with the site's previous
+    slot, deleting near-duplicates (which the returned entries point to) if
+    remove_duplicates. Returns {kind: comparison} for the screenshots present."""
+    results = {}
+    for kind, path in zip(KINDS, screenshot_paths(site, timestamp)):
+        if not os.path.exists(path):
+            continue
+        results[kind] = index.compare(site, timestamp, kind, tile_hashes(path))
+        if remove_duplicates and results[kind]['duplicate_of']:
+            results[kind]['bytes_saved'] = os.path.getsize(path)
+            os.remove(path)
+    return results
+
+def refresh_screenshots(index: VisualIndex, site: str, timestamp: str) -> Dict:
+    """Compare a capture's recorded screenshots again with the slot now before
+    it. Returns {kind: comparison}."""
+    results = {}
+    for kind in KINDS:
+        result = index.refresh(site, timestamp, kind)
+        if result is not None:
+            results[kind] = result
+    return results
+
+def record_visual_change(site: str, timestamp: str, visual: Dict):
+    """Add the comparison to the capture's metadata file, if it has one. Kinds
+    not compared this time, such as images already replaced by references on an
+    earlier run, keep their recorded result."""
+    metadata_file = f'screenshots/{site}_{timestamp}_metadata.json'
+    if not os.path.exists(metadata_file):
+        return
+    with open(metadata_file, 'r') as f:
+        metadata = json.load(f)
+    metadata['visual'] = {**metadata.get('visual', {}), **visual}
+    with open(metadata_file, 'w') as f:
+        json.dump(metadata, f, indent=2)
+
+def main():
+    parser = argparse.ArgumentParser(description='Score visual change between slots and replace '
+                                                 'near-duplicate screenshots with references')
+    parser.add_argument('--db', default=DEFAULT_HASH_DB, help='Hash database path')
+    parser.add_argument('--threshold', type=float, default=NEAR_DUPLICATE_THRESHOLD,
+                        help='Largest fraction of differing hash bits treated as a near-duplicate')
+    parser.add_argument('--dry-run', action='store_true', help='Score captures without deleting anything')
+    args = parser.parse_args()
+
+    captures = find_screenshots()
+    if not captures:
+        raise FileNotFoundError("No screenshots found in screenshots/")
+
+    index = VisualIndex(args.db, args.threshold)
+    duplicates = saved = 0
+    # Oldest first, so each capture is compared with the slot before it
+    for site, timestamp in sorted(captures, key=lambda c: (c[1], c[0])):
+        visual = compare_screenshots(index, site, timestamp, remove_duplicates=not args.dry_run)
+        if not args.dry_run:
+            record_visual_change(site, timestamp, visual)
+        duplicates += sum(1 for result in visual.values() if result['duplicate_of'])
+        saved += sum(result.get('bytes_saved', 0) for result in visual.values())
+    index.close()
+    logging.info(f"Compared {len(captures)} captures: {duplicates} screenshots are near-duplicates"
+                 + ('' if args.dry_run else f", {saved / 1_000_000:.1f} MB freed"))
+
+if __name__ == '__main__':
+    main()
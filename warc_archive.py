@@ -0,0 +1,314 @@
+import argparse
+import base64
+import glob
+import gzip
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import uuid
+import zlib
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+DEFAULT_WARC_DIR = 'warc'
+INDEX_FILE = 'index.db'
+# Start a new WARC file once the current one reaches this size
+MAX_WARC_BYTES = 1024 * 1024 * 1024
+
+# Bodies are stored decoded, so headers describing the transfer encoding are dropped
+STRIPPED_HEADERS = {'content-encoding', 'transfer-encoding', 'content-length'}
+
+# Extension fields tying a page record to the capture it was fetched for
+SITE_FIELD = 'NewsLens-Site'
+CAPTURE_FIELD = 'NewsLens-Capture'
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS records (
+        id INTEGER PRIMARY KEY,
+        url TEXT NOT NULL,
+        site TEXT,
+        timestamp TEXT,
+        warc_date TEXT NOT NULL,
+        status INTEGER NOT NULL,
+        content_type TEXT,
+        path TEXT NOT NULL,
+        offset INTEGER NOT NULL,
+        length INTEGER NOT NULL,
+        UNIQUE (path, offset)
+    );
+    CREATE INDEX IF NOT EXISTS idx_records_url ON records (url);
+    CREATE INDEX IF NOT EXISTS idx_records_capture ON records (site, timestamp);
+'''
+
+class WarcRecord:
+    """A parsed WARC record; http_* fields are set for response records"""
+
+    def __init__(self, headers: Dict[str, str], block: bytes):
+        self.headers = headers
+        self.block = block
+        self.http_status: Optional[int] = None
+        self.http_headers: List[Tuple[str, str]] = []
+        self.body = block
+        if headers.get('WARC-Type') == 'response':
+            head, _, self.body = block.partition(b'\r\n\r\n')
+            lines = head.decode('iso-8859-1').split('\r\n')
+            self.http_status = int(lines[0].split(' ', 2)[1])
+            self.http_headers = [tuple(part.strip() for part in line.split(':', 1))
+                                 for line in lines[1:] if ':' in line]
+
+    @property
+    def type(self) -> str:
+        return self.headers.get('WARC-Type', '')
+
+    @property
+    def url(self) -> str:
+        return self.headers.get('WARC-Target-URI', '')
+
+    def content_type(self) -> Optional[str]:
+        return next((value for name, value in self.http_headers if name.lower() == 'content-type'), None)
+
+    def text(self) -> str:
+        """The body decoded with the charset of its Content-Type (default UTF-8)."""
+        charset = 'utf-8'
+        for param in (self.content_type() or '').split(';')[1:]:
+            name, _, value = param.strip().partition('=')
+            if name.lower() == 'charset' and value:
+                charset = value.strip('"\'')
+        try:
+            return self.body.decode(charset, errors='replace')
+        except LookupError:
+            return self.body.decode('utf-8', errors='replace')
+
+def warc_date(when: Optional[datetime] = None) -> str:
+    return (when or datetime.now(timezone.utc)).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+def payload_digest(body: bytes) -> str:
+    return 'sha1:' + base64.b32encode(hashlib.sha1(body).digest()).decode('ascii')
+
+def http_response_block(status: int, reason: str, headers: List[Tuple[str, str]], body: bytes) -> bytes:
+    lines = [f'HTTP/1.1 {status} {reason}'.rstrip()]
+    lines += [f'{name}: {value}' for name, value in headers if name.lower() not in STRIPPED_HEADERS]
+    lines.append(f'Content-Length: {len(body)}')
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('iso-8859-1', errors='replace') + body
+
+def http_request_block(url: str, headers: List[Tuple[str, str]]) -> bytes:
+    parts = urlsplit(url)
+    target = (parts.path or '/') + (f'?{parts.query}' if parts.query else '')
+    lines = [f'GET {target} HTTP/1.1']
+    if not any(name.lower() == 'host' for name, _ in headers):
+        lines.append(f'Host: {parts.netloc}')
+    lines += [f'{name}: {value}' for name, value in headers]
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('iso-8859-1', errors='replace')
+
+def encode_record(fields: List[Tuple[str, str]], block: bytes) -> bytes:
+    """One WARC/1.1 record as its own gzip member."""
+    head = ['WARC/1.1'] + [f'{name}: {value}' for name, value in fields] + [f'Content-Length: {len(block)}']
+    record = ('\r\n'.join(head) + '\r\n\r\n').encode('utf-8') + block + b'\r\n\r\n'
+    return gzip.compress(record, compresslevel=6)
+
+def parse_record(data: bytes) -> WarcRecord:
+    head, _, rest = data.partition(b'\r\n\r\n')
+    lines = head.decode('utf-8').split('\r\n')
+    headers = dict(tuple(part.strip() for part in line.split(':', 1)) for line in lines[1:] if ':' in line)
+    return WarcRecord(headers, rest[:int(headers.get('Content-Length', len(rest)))])
+
+def read_record(path: str, offset: int, length: int) -> WarcRecord:
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        return parse_record(gzip.decompress(f.read(length)))
+
+def iter_records(path: str) -> Iterator[Tuple[int, int, WarcRecord]]:
+    """Yield (offset, length, record) for each gzip member of a WARC file."""
+    with open(path, 'rb') as f:
+        data = memoryview(f.read())
+    offset = 0
+    while offset < len(data):
+        decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+        record = decompressor.decompress(data[offset:])
+        length = len(data) - offset - len(decompressor.unused_data)
+        yield offset, length, parse_record(record)
+        offset += length
+
+class WarcIndex:
+    """SQLite index of the response records in a directory of WARC files.
+
+    Pages fetched for a capture are also indexed by (site, timestamp), so
+    replay can find the exact document a capture was extracted from.
+    """
+
+    def __init__(self, directory: str = DEFAULT_WARC_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(directory, INDEX_FILE), check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode = WAL')
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    def add(self, record: WarcRecord, path: str, offset: int, length: int):
+        with self._lock:
+            with self._conn:
+                self._conn.execute('''
+                    INSERT OR IGNORE INTO records (url, site, timestamp, warc_date, status, content_type,
+                                                   path, offset, length)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (record.url, record.headers.get(SITE_FIELD), record.headers.get(CAPTURE_FIELD),
+                      record.headers.get('WARC-Date', ''), record.http_status, record.content_type(),
+                      os.path.relpath(path, self.directory), offset, length))
+
+    def _read(self, row: Optional[Tuple[str, int, int]]) -> Optional[WarcRecord]:
+        if row is None:
+            return None
+        path, offset, length = row
+        return read_record(os.path.join(self.directory, path), offset, length)
+
+    def lookup(self, url: str) -> Optional[WarcRecord]:
+        """The most recently written response for url."""
+        with self._lock:
+            row = self._conn.execute('SELECT path, offset, length FROM records WHERE url = ? ORDER BY id DESC LIMIT 1',
+                                     (url,)).fetchone()
+        return self._read(row)
+
+    def page(self, site: str, timestamp: str) -> Optional[WarcRecord]:
+        """The page fetched for one capture."""
+        with self._lock:
+            row = self._conn.execute('''
+                SELECT path, offset, length FROM records WHERE site = ? AND timestamp = ?
+                ORDER BY id DESC LIMIT 1
+            ''', (site, timestamp)).fetchone()
+        return self._read(row)
+
+    def pages(self) -> List[Tuple[str, str, str, str, int, int]]:
+        """(site, timestamp, url, path, offset, length) of every capture's page."""
+        with self._lock:
+            rows = self._conn.execute('''
+                SELECT site, timestamp, url, path, offset, length FROM records
+                WHERE id IN (SELECT MAX(id) FROM records WHERE site IS NOT NULL GROUP BY site, timestamp)
+                ORDER BY site, timestamp
+            ''').fetchall()
+        return [(site, timestamp, url, os.path.join(self.directory, path), offset, length)
+                for site, timestamp, url, path, offset, length in rows]
+
+    def rebuild(self) -> int:
+        """Re-index every WARC file in the directory, e.g. after copying files in."""
+        count = 0
+        for path in sorted(glob.glob(os.path.join(self.directory, '*.warc.gz'))):
+            for offset, length, record in iter_records(path):
+                if record.type == 'response':
+                    self.add(record, path, offset, length)
+                    count += 1
+        return count
+
+    def stats(self) -> Dict:
+        with self._lock:
+            records, pages = self._conn.execute(
+                'SELECT COUNT(*), COUNT(DISTINCT site || timestamp) FROM records').fetchone()
+        return {'responses': records, 'captures': pages}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+class WarcWriter:
+    """Appends request/response record pairs to gzipped WARC files and indexes them.
+
+    Safe to call from several threads. Bodies are written decoded, with the
+    Content-Encoding and Transfer-Encoding headers removed to match.
+    """
+
+    def __init__(self, directory: str = DEFAULT_WARC_DIR, max_bytes: int = MAX_WARC_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.index = WarcIndex(directory)
+        self._lock = threading.Lock()
+        self._serial = 0
+        self._path: Optional[str] = None
+
+    def _open_file(self):
+        self._serial += 1
+        started = datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')
+        self._path = os.path.join(self.directory, f'newslens-{started}-{os.getpid()}-{self._serial:05d}.warc.gz')
+        fields = 'software: newslens\r\nformat: WARC File Format 1.1\r\n'.encode('utf-8')
+        with open(self._path, 'ab') as f:
+            f.write(encode_record([('WARC-Type', 'warcinfo'), ('WARC-Date', warc_date()),
+                                   ('WARC-Filename', os.path.basename(self._path)),
+                                   ('WARC-Record-ID', f'<urn:uuid:{uuid.uuid4()}>'),
+                                   ('Content-Type', 'application/warc-fields')], fields))
+
+    def write_response(self, url: str, status: int, reason: str, headers: List[Tuple[str, str]], body: bytes,
+                       request_headers: List[Tuple[str, str]] = (), site: Optional[str] = None,
+                       timestamp: Optional[str] = None):
+        """Write a response record and its request record. site and timestamp
+        mark the page fetched for a capture."""
+        response_id = f'<urn:uuid:{uuid.uuid4()}>'
+        date = warc_date()
+        fields = [('WARC-Type', 'response'), ('WARC-Record-ID', response_id), ('WARC-Date', date),
+                  ('WARC-Target-URI', url), ('WARC-Payload-Digest', payload_digest(body)),
+                  ('Content-Type', 'application/http; msgtype=response')]
+        if site and timestamp:
+            fields += [(SITE_FIELD, site), (CAPTURE_FIELD, timestamp)]
+        response = encode_record(fields, http_response_block(status, reason, headers, body))
+        request = encode_record([('WARC-Type', 'request'), ('WARC-Record-ID', f'<urn:uuid:{uuid.uuid4()}>'),
+                                 ('WARC-Date', date), ('WARC-Target-URI', url),
+                                 ('WARC-Concurrent-To', response_id),
+                                 ('Content-Type', 'application/http; msgtype=request')],
+                                http_request_block(url, list(request_headers)))
+
+        with self._lock:
+            if self._path is None or os.path.getsize(self._path) >= self.max_bytes:
+                self._open_file()
+            with open(self._path, 'ab') as f:
+                offset = f.tell()
+                f.write(response + request)
+            path = self._path
+        self.index.add(parse_record(gzip.decompress(response)), path, offset, len(response))
+
+    def write_requests_response(self, response, body: bytes, site: Optional[str] = None,
+                                timestamp: Optional[str] = None, url: Optional[str] = None):
+        """Record a response fetched with requests, under url if given.
+
+        Passing the URL that was requested keeps a page replayable at that URL
+        even if the archive redirected it to a nearby capture.
+        """
+        self.write_response(url or response.url, response.status_code, response.reason or '',
+                            list(response.headers.items()), body, list(response.request.headers.items()),
+                            site, timestamp)
+
+    def close(self):
+        self.index.close()
+
+def main():
+    parser = argparse.ArgumentParser(description='Inspect and index WARC capture archives')
+    parser.add_argument('--dir', default=DEFAULT_WARC_DIR, help='WARC directory')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('reindex', help='Rebuild the index from the WARC files')
+    subparsers.add_parser('stats', help='Show how many responses and captures are archived')
+    export_parser = subparsers.add_parser('export', help='Write the page archived for a capture')
+    export_parser.add_argument('site')
+    export_parser.add_argument('timestamp')
+    export_parser.add_argument('output')
+    args = parser.parse_args()
+
+    index = WarcIndex(args.dir)
+    if args.command == 'reindex':
+        logging.info(f"Indexed {index.rebuild()} responses in {args.dir}")
+    elif args.command == 'stats':
+        stats = index.stats()
+        print(f"{stats['responses']} responses, {stats['captures']} captures")
+    elif args.command == 'export':
+        record = index.page(args.site, args.timestamp)
+        if record is None:
+            raise SystemExit(f"No page archived for {args.site} {args.timestamp}")
+        with open(args.output, 'wb') as f:
+            f.write(record.body)
+        logging.info(f"Wrote {record.url} to {args.output}")
+    index.close()
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,11 @@
-import requests
 from datetime import datetime, timedelta
 import json
-import time
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
 import logging
+from cdx_cache import CDXCache
+from instrumentation import METRICS
+from cdx_fetcher import CDXFetcher
+from snapshot_index import SnapshotIndex, timestamp_to_epoch
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -17,6 +19,38 @@ NEWS_SITES = [
     "usatoday.com"
 ]
 
+# Politeness budget for the CDX API: requests per second, burst size and
+# maximum number of in-flight requests
+CDX_RATE_LIMIT = 1.0
+CDX_BURST = 1
+CDX_CONCURRENCY = 4
+
+# Only request the CDX columns we use, and cap how many days one query spans
+CDX_FIELDS = "timestamp,original,digest"
+CDX_MAX_RANGE_DAYS = 7
+
+# Local cache of CDX listings; set to None to always query the API
+CDX_CACHE_PATH = 'cache/cdx_cache.db'
+
+def generate_timestamps(start_date: datetime, end_date: datetime, start_hour: int = 6,
+                        end_hour: int = 21, interval_hours: int = 3,
+                        until: Optional[datetime] = None) -> List[str]:
+    """Generate timestamps for each day from start_date to end_date (inclusive),
+    every interval_hours from start_hour to end_hour, stopping at until if given."""
+    timestamps = []
+    day = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
+    while day.date() <= end_date.date():
+        hour = start_hour
+        while hour <= end_hour:
+            timestamp = day + timedelta(hours=hour)
+            if until is not None and timestamp > until:
+                return timestamps
+            timestamps.append(timestamp.strftime("%Y%m%d%H%M%S"))
+            hour += interval_hours
+        day += timedelta(days=1)
+
+    return timestamps
+
 def get_timestamps() -> List[str]:
     """Generate timestamps for the last day at 3-hour intervals from 6 AM to 9 PM."""
     now = datetime.now()
@@ -24,69 +58,97 @@ def get_timestamps() -> List[str]:
     if now.hour < 6:
         start_time -= timedelta(days=1)
     
-    timestamps = []
-    for i in range(6):  # 6 snapshots
-        timestamp = start_time + timedelta(hours=i*3)
-        if timestamp > now:
-            break
-        timestamps.append(timestamp.strftime("%Y%m%d%H%M%S"))
-    
-    return timestamps
+    return generate_timestamps(start_time, start_time, until=now)
 
-def query_wayback_cdx(site: str, timestamp: str) -> List[Dict]:
-    """Query the Wayback Machine CDX API for a specific site and timestamp."""
-    url = f"https://web.archive.org/cdx/search/cdx"
-    params = {
+def build_cdx_params(site: str, start: str, end: str) -> Dict:
+    """Build the CDX query parameters for a site over a 14-digit timestamp range."""
+    return {
         "url": site,
-        "from": timestamp[:8],  # YYYYMMDD
-        "to": timestamp[:8],
+        "from": start,
+        "to": end,
         "output": "json",
+        "fl": CDX_FIELDS,
         "filter": "statuscode:200",
         "collapse": "digest"
     }
-    
-    headers = {
-        "User-Agent": "NewsLensBot/0.1 (+https://github.com/yourusername/newslens; contact: your@email.com)"
-    }
-    
-    try:
-        response = requests.get(url, params=params, headers=headers)
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        logging.error(f"Error querying Wayback CDX for {site} at {timestamp}: {e}")
-        return []
-
-def process_snapshots():
+
+def plan_date_ranges(timestamps: List[str], max_days: int = CDX_MAX_RANGE_DAYS) -> List[Tuple[str, str, List[str]]]:
+    """Group target timestamps into CDX query ranges spanning at most max_days days.
+
+    Returns (from, to, targets) tuples where from/to cover whole days at
+    full 14-digit precision, so each capture listing is fetched only once.
+    """
+    ranges = []
+    current: List[str] = []
+    for timestamp in sorted(timestamps):
+        if current:
+            first_day = datetime.strptime(current[0][:8], "%Y%m%d")
+            day = datetime.strptime(timestamp[:8], "%Y%m%d")
+            if (day - first_day).days >= max_days:
+                ranges.append(current)
+                current = []
+        current.append(timestamp)
+    if current:
+        ranges.append(current)
+
+    return [(group[0][:8] + "000000", group[-1][:8] + "235959", group) for group in ranges]
+
+def create_fetcher() -> CDXFetcher:
+    """Create a CDX fetcher using the configured politeness budget and cache."""
+    cache = CDXCache(CDX_CACHE_PATH) if CDX_CACHE_PATH else None
+    return CDXFetcher(rate=CDX_RATE_LIMIT, burst=CDX_BURST, per_host=CDX_CONCURRENCY,
+                      max_workers=CDX_CONCURRENCY, cache=cache)
+
+def query_wayback_cdx(site: str, start: str, end: str, fetcher: Optional[CDXFetcher] = None) -> List[List[str]]:
+    """Query the Wayback Machine CDX API for all captures of a site in a timestamp range."""
+    fetcher = fetcher or create_fetcher()
+    return fetcher.fetch(build_cdx_params(site, start, end))
+
+def resolve_snapshots(rows: List[List[str]], timestamps: List[str]) -> Dict[str, Dict]:
+    """Resolve each target timestamp to its closest capture in a CDX listing."""
+    index = SnapshotIndex(rows)
+    results = {}
+    for timestamp in timestamps:
+        pos = index.nearest_position(timestamp_to_epoch(timestamp))
+        if pos is None:
+            continue
+        capture_ts = index.timestamps[pos]
+        results[timestamp] = {
+            "url": f"https://web.archive.org/web/{capture_ts}/{index.originals[pos]}",
+            "timestamp": capture_ts,
+            # Content digest of the capture, used downstream to skip unchanged pages
+            "digest": index.digests[pos]
+        }
+    return results
+
+def process_snapshots(fetcher: Optional[CDXFetcher] = None, timestamps: Optional[List[str]] = None):
     """Process snapshots for all news sites at specified timestamps."""
-    timestamps = get_timestamps()
+    timestamps = timestamps or get_timestamps()
+    fetcher = fetcher or create_fetcher()
+
+    date_ranges = plan_date_ranges(timestamps)
+    logging.info(f"Querying {len(NEWS_SITES) * len(date_ranges)} CDX ranges "
+                 f"for {len(timestamps)} timestamps across {len(NEWS_SITES)} sites")
+    jobs = {
+        (site, start, end): build_cdx_params(site, start, end)
+        for site in NEWS_SITES
+        for start, end, _ in date_ranges
+    }
+    responses = fetcher.fetch_many(jobs)
+
     results = {}
-    
     for site in NEWS_SITES:
-        logging.info(f"Processing snapshots for {site}")
         site_results = {}
-        
-        for timestamp in timestamps:
-            logging.info(f"Querying timestamp {timestamp}")
-            snapshots = query_wayback_cdx(site, timestamp)
-            
-            if snapshots and len(snapshots) > 1:  # First row is headers
-                # Find the closest snapshot to our target timestamp
-                closest_snapshot = min(snapshots[1:], key=lambda x: abs(int(x[1]) - int(timestamp)))
-                site_results[timestamp] = {
-                    "url": f"https://web.archive.org/web/{closest_snapshot[1]}/{closest_snapshot[2]}",
-                    "timestamp": closest_snapshot[1]
-                }
-            
-            time.sleep(1)  # Be polite to the API
-        
-        results[site] = site_results
+        for start, end, targets in date_ranges:
+            site_results.update(resolve_snapshots(responses[(site, start, end)], targets))
+        # Keep the output ordered like the requested timestamps
+        results[site] = {ts: site_results[ts] for ts in timestamps if ts in site_results}
     
     return results
 
-def save_results(results: Dict):
+def save_results(results: Dict, filename: Optional[str] = None):
     """Save the results to a JSON file."""
-    filename = f"wayback_snapshots_{datetime.now().strftime('%Y%m%d')}.json"
+    filename = filename or f"wayback_snapshots_{datetime.now().strftime('%Y%m%d')}.json"
     with open(filename, 'w') as f:
         json.dump(results, f, indent=2)
     logging.info(f"Results saved to {filename}")
@@ -96,6 +158,7 @@ def main():
     results = process_snapshots()
     save_results(results)
     logging.info("Scraping complete")
+    METRICS.log_summary()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file